@@ -0,0 +1,193 @@
+"""
+后台自动总结
+会话 token 总量超过模型上下文的一定比例（autoSummarize.threshold）时，在后台把最早的一段消息
+总结进 State.summary 并删除这些消息，使剩余消息回落到目标比例（autoSummarize.target）以内。
+
+与流式传输的协调：
+- 流式运行图期间持有会话写锁（stream_interrupt_manager.thread_lock），后台任务只在锁内读取快照和写回结果，
+  调用总结模型在锁外进行，不阻塞用户的下一轮对话
+- 写回前在锁内重新校验：摘要未变化、待删除的消息仍在、没有等待确认的中断，任一不满足则放弃本次总结
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
+
+from backend.settings.settings import settings
+from backend.ai_agent.models.multi_model_adapter import MultiModelAdapter
+from backend.ai_agent.models.stream_interrupt_manager import stream_interrupt_manager
+from backend.ai_agent.core.summarizer import summarize_incremental, summary_chunk_tokens, unsummarized_start
+from backend.ai_agent.utils.token_utils import count_message_tokens, get_calibration
+
+logger = logging.getLogger(__name__)
+
+# 默认触发比例与目标比例（相对 max_tokens）
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_TARGET = 0.5
+
+
+def _auto_summarize_config() -> Dict:
+    config = settings.get_config("autoSummarize", default={}) or {}
+    return {
+        "enabled": bool(config.get("enabled", False)),
+        "threshold": float(config.get("threshold", DEFAULT_THRESHOLD)),
+        "target": float(config.get("target", DEFAULT_TARGET)),
+    }
+
+
+def _select_segment(messages: Sequence[BaseMessage], keep_tokens: float) -> List[BaseMessage]:
+    """
+    选出需要总结的最早一段消息
+
+    从末尾向前累计 token，保留的消息不超过 keep_tokens，且保留部分必须从 human 消息开始
+    （工具调用与其结果不会被拆开）；最后一条 human 消息及其之后的内容始终保留
+
+    Returns:
+        需要总结的消息（可能为空）
+    """
+    # 候选切分点：除开头以外的 human 消息位置
+    cut_points = [i for i, message in enumerate(messages) if i > 0 and isinstance(message, HumanMessage)]
+    if not cut_points:
+        return []
+
+    suffix_tokens = [0] * (len(messages) + 1)
+    for i in range(len(messages) - 1, -1, -1):
+        suffix_tokens[i] = suffix_tokens[i + 1] + count_message_tokens(messages[i])
+
+    # 取保留部分不超预算的最早切分点，都超出时只保留最后一轮
+    cut = cut_points[-1]
+    for index in cut_points:
+        if suffix_tokens[index] <= keep_tokens:
+            cut = index
+            break
+    return list(messages[:cut])
+
+
+class AutoSummarizer:
+    """自动总结调度器，每个会话同一时间最多运行一个总结任务"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def maybe_schedule(self, thread_id: Optional[str], total_tokens: float, max_tokens: Optional[int]) -> bool:
+        """
+        会话 token 总量（已校准）超过阈值时调度后台总结
+
+        Args:
+            thread_id: 会话ID
+            total_tokens: 会话当前的 token 总量（含系统提示词等固定部分）
+            max_tokens: 模式配置的上下文长度
+
+        Returns:
+            是否调度了新的总结任务
+        """
+        if not thread_id or not max_tokens:
+            return False
+        config = _auto_summarize_config()
+        if not config["enabled"] or total_tokens <= config["threshold"] * max_tokens:
+            return False
+        task = self._tasks.get(thread_id)
+        if task is not None and not task.done():
+            return False
+
+        logger.info(f"会话 {thread_id} token 总量 {total_tokens:.0f} 超过阈值，调度后台自动总结")
+        task = asyncio.create_task(self._run(thread_id, total_tokens, max_tokens, config["target"]))
+        self._tasks[thread_id] = task
+        task.add_done_callback(lambda done: self._forget(thread_id, done))
+        return True
+
+    def _forget(self, thread_id: str, task: asyncio.Task) -> None:
+        # 只移除自己，避免误删同一会话随后调度的新任务
+        if self._tasks.get(thread_id) is task:
+            del self._tasks[thread_id]
+
+    async def stop(self) -> None:
+        """服务关闭时取消未完成的总结任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self, thread_id: str, total_tokens: float, max_tokens: int, target: float) -> None:
+        # 延迟导入，graph_builder 在调用模型节点中调度本模块
+        from backend.ai_agent.core.graph_builder import get_graph
+        from backend.ai_agent.core.persistence import sqlite_persistence
+
+        try:
+            graph = await get_graph()
+            checkpointer, store = await sqlite_persistence.get()
+            graph = graph.copy(update={"checkpointer": checkpointer, "store": store})
+            config: RunnableConfig = {"configurable": {"thread_id": thread_id}}
+            thread_lock = stream_interrupt_manager.thread_lock(thread_id)
+
+            # 1. 锁内读取快照（等待当前流式传输结束）
+            async with thread_lock:
+                snapshot = await graph.aget_state(config)
+            if snapshot.next:
+                logger.info(f"会话 {thread_id} 存在等待确认的中断，跳过自动总结")
+                return
+            messages = snapshot.values.get("messages", [])
+            summary = snapshot.values.get("summary", "")
+            watermark = snapshot.values.get("summary_watermark", "")
+
+            selected_model = settings.get_config("selectedModel")
+            calibration = get_calibration(selected_model)
+            # 固定部分（系统提示词、环境信息、工具定义）不随总结减少，从目标中扣除
+            history_tokens = sum(count_message_tokens(message) for message in messages) * calibration
+            fixed_tokens = max(total_tokens - history_tokens, 0)
+            keep_tokens = max(target * max_tokens - fixed_tokens, 0) / calibration
+            segment = _select_segment(messages, keep_tokens)
+            if not segment:
+                logger.info(f"会话 {thread_id} 没有可总结的消息段")
+                return
+
+            # 2. 锁外调用总结模型，只总结水位线之后的部分（之前的已在摘要中）
+            start = unsummarized_start(messages, watermark)
+            new_messages = segment[start:]
+            # 水位线在保留部分中时整段都已纳入摘要，水位线保持不变
+            new_watermark = segment[-1].id if start <= len(segment) else watermark
+            new_summary = await self._summarize(new_messages, summary, selected_model, max_tokens)
+
+            # 3. 锁内校验后写回
+            async with thread_lock:
+                current = await graph.aget_state(config)
+                current_ids = {message.id for message in current.values.get("messages", [])}
+                if (
+                    current.next
+                    or current.values.get("summary", "") != summary
+                    or current.values.get("summary_watermark", "") != watermark
+                    or any(message.id not in current_ids for message in segment)
+                ):
+                    logger.info(f"会话 {thread_id} 在总结期间已变化，放弃本次自动总结")
+                    return
+                await graph.aupdate_state(config, {
+                    "summary": new_summary,
+                    "summary_watermark": new_watermark,
+                    "messages": [RemoveMessage(id=message.id) for message in segment]
+                })
+            logger.info(f"会话 {thread_id} 自动总结完成，已归纳 {len(segment)} 条消息")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"会话 {thread_id} 自动总结失败: {type(e).__name__}: {e}")
+
+    async def _summarize(self, new_messages: List[BaseMessage], summary: str, selected_model: str, max_tokens: int) -> str:
+        """调用总结模型（不绑定工具）把新消息合并进摘要"""
+        if not new_messages:
+            return summary
+        selected_provider = settings.get_config("selectedProvider")
+        mode = settings.get_config("currentMode", default="管家agent")
+        model = MultiModelAdapter.create_model(
+            model = selected_model,
+            provider = selected_provider,
+            temperature = settings.get_config("mode", mode, "temperature"),
+            timeout = 300,
+        )
+        return await summarize_incremental(model, new_messages, summary, summary_chunk_tokens(max_tokens, selected_model))
+
+
+# 全局单例
+auto_summarizer = AutoSummarizer()
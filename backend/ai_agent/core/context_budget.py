@@ -0,0 +1,301 @@
+"""
+上下文预算分配
+按模式配置（mode.<模式>.contextBudget）限制环境信息的 token 数：
+- total: 环境信息总预算占 max_tokens 的比例
+- sections: 各部分上限占总预算的比例（未列出的部分不单独限制）
+
+超出预算时按优先级降级：
+1. RAG 检索结果：从相似度最低的一条开始减少条数
+2. 文件树：折叠为只含文件夹，再折叠为只含顶层
+3. 已加载文件：按段落截取首尾窗口（多个文件公平分配预算）
+
+稳定部分（提示词缓存前缀）单独计算预算：只有稳定部分自身超出总预算时才截取已加载文件，
+易变部分的大小变化不会改变稳定部分的内容；易变部分使用稳定部分剩余的预算
+
+其余部分（Skills、知识库列表、过往消息总结等）只在配置了单独上限时截断。
+被裁剪的内容生成预算说明，随易变上下文发送给模型，让模型知道哪些内容没有显示
+"""
+import logging
+from typing import Collection, Dict, List, Optional, Sequence, Tuple, Union
+
+from backend.settings.settings import settings
+from backend.ai_agent.utils.file_utils import RenderedFile
+from backend.ai_agent.utils.token_utils import estimate_text_tokens, get_calibration
+
+logger = logging.getLogger(__name__)
+
+# 默认总预算比例与各部分上限比例
+DEFAULT_TOTAL_RATIO = 0.5
+DEFAULT_SECTION_RATIOS = {
+    "loaded_files": 0.6,
+    "rag": 0.2,
+    "file_tree": 0.15,
+}
+# 超出总预算时的降级顺序（易变部分、稳定部分各自独立）
+VOLATILE_DEGRADE_ORDER = ("rag", "file_tree")
+STABLE_DEGRADE_ORDER = ("loaded_files",)
+
+SECTION_TITLES = {
+    "skills": "Skills 列表",
+    "knowledge_bases": "知识库列表",
+    "loaded_skills": "已加载 Skill",
+    "summary": "过往消息总结",
+    "loaded_files": "已加载文件",
+    "file_tree": "文件树",
+    "tab_state": "标签栏状态",
+    "rag": "RAG检索结果",
+}
+# 返回结果中已加载文件变化描述的键（附加在易变上下文中）
+LOADED_FILES_DELTA = "loaded_files_delta"
+BUDGET_NOTICE_HEADER = "【上下文预算说明】以下内容因超出上下文预算未完整显示："
+
+
+def context_budget_config(mode: Optional[str]) -> Dict:
+    config = settings.get_config("mode", mode, "contextBudget", default={}) or {}
+    return {
+        "total": float(config.get("total", DEFAULT_TOTAL_RATIO)),
+        "sections": {**DEFAULT_SECTION_RATIOS, **(config.get("sections") or {})},
+    }
+
+
+def _truncate_text(text: str, tokens: int, budget: int) -> str:
+    """按 token 比例截断文本"""
+    chars = max(int(len(text) * budget / tokens) if tokens else 0, 0)
+    return f"{text[:chars]}\n……（已截断）"
+
+
+class TextSection:
+    """普通文本部分，超出上限时截断"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = estimate_text_tokens(text)
+
+    def fit(self, budget: int) -> Tuple[str, Optional[str]]:
+        if self.tokens <= budget:
+            return self.text, None
+        return _truncate_text(self.text, self.tokens, budget), f"已截断为约 {budget} tokens（原约 {self.tokens} tokens）"
+
+
+class LoadedFilesSection:
+    """已加载文件，超出预算时按段落截取首尾窗口"""
+
+    HEADER = "[额外文件内容]:\n\n"
+
+    def __init__(
+        self,
+        files: Sequence[Tuple[str, RenderedFile]],
+        delta: str = "",
+        current: Optional[Sequence[Tuple[str, RenderedFile]]] = None,
+    ):
+        self.files = list(files)
+        # 本轮中相对 files（基准渲染）的变化，附加在易变上下文中，与基准一起计入已加载文件的预算
+        self.delta = delta
+        # 文件的当前渲染：基准加变化超出预算时改为发送当前内容（不附加变化）
+        self.current = list(current) if current is not None else self.files
+        self.file_headers = [f"[额外文件 - {path}]:\n" for path, _ in self.files]
+        self.header_tokens = [estimate_text_tokens(header) for header in self.file_headers]
+        self.base_tokens = estimate_text_tokens(self.HEADER) + sum(
+            header_tokens + rendered.tokens
+            for header_tokens, (_, rendered) in zip(self.header_tokens, self.files)
+        )
+        self.tokens = self.base_tokens + (estimate_text_tokens(delta) if delta else 0)
+        self.text = self._join([rendered.formatted for _, rendered in self.files])
+
+    def _join(self, bodies: List[str]) -> str:
+        return f"{self.HEADER}{'\n\n'.join(header + body for header, body in zip(self.file_headers, bodies))}"
+
+    def fit(self, budget: int) -> Tuple[str, Optional[str]]:
+        text, _, note = self.fit_with_delta(budget)
+        return text, note
+
+    def fit_with_delta(self, budget: int) -> Tuple[str, str, Optional[str]]:
+        """
+        按预算裁剪，变化描述与基准一起计入预算
+
+        Returns:
+            (已加载文件文本, 附加的变化描述（未使用时为空字符串）, 裁剪说明)
+        """
+        if self.tokens <= budget:
+            return self.text, self.delta, None
+        if self.delta:
+            # 基准加变化超出预算：不再发送变化，改为发送按预算截取的当前内容
+            text, note = LoadedFilesSection(self.current).fit(budget)
+            return text, "", "本轮变化描述超出预算，改为发送当前内容" + (f"；{note}" if note else "")
+        text, note = self._fit_base(budget)
+        return text, "", note
+
+    def _fit_base(self, budget: int) -> Tuple[str, Optional[str]]:
+        # 公平分配：从最小的文件开始，每个文件最多分到剩余预算的平均值，用不完的留给后面的文件
+        allowances: Dict[int, int] = {}
+        remaining = max(budget - estimate_text_tokens(self.HEADER), 0)
+        order = sorted(range(len(self.files)), key=lambda i: self.files[i][1].tokens)
+        for position, index in enumerate(order):
+            share = remaining // (len(order) - position)
+            allowance = max(min(self.files[index][1].tokens, share - self.header_tokens[index]), 0)
+            allowances[index] = allowance
+            remaining -= allowance + self.header_tokens[index]
+
+        bodies = []
+        notes = []
+        for index, (path, rendered) in enumerate(self.files):
+            body, note = self._window(rendered, allowances[index])
+            bodies.append(body)
+            if note:
+                notes.append(f"{path} {note}")
+        return self._join(bodies), "；".join(notes) or None
+
+    @staticmethod
+    def _window(rendered: RenderedFile, allowance: int) -> Tuple[str, Optional[str]]:
+        """截取首尾段落（前 2/3 预算给开头，后 1/3 给结尾），标明省略的段落范围"""
+        if rendered.tokens <= allowance or not rendered.line_tokens:
+            return rendered.formatted, None
+        count = len(rendered.line_tokens)
+        head_budget = allowance * 2 // 3
+        head = 0
+        used = 0
+        while head < count and used + rendered.line_tokens[head] <= head_budget:
+            used += rendered.line_tokens[head]
+            head += 1
+        tail_budget = allowance - used
+        tail = count
+        while tail > head and rendered.line_tokens[tail - 1] <= tail_budget:
+            tail_budget -= rendered.line_tokens[tail - 1]
+            tail -= 1
+
+        lines = rendered.formatted.split("\n")
+        omitted = f"……（第 {head + 1}-{tail} 段未显示，共 {count} 段）"
+        body = "\n".join(lines[:head] + [omitted] + lines[tail:])
+        return body, f"仅显示 {head + count - tail}/{count} 段，第 {head + 1}-{tail} 段未显示"
+
+
+class RagSection:
+    """RAG 检索结果（按相似度从高到低），超出预算时减少条数"""
+
+    def __init__(self, hits: Sequence[str]):
+        self.hits = list(hits)
+        self.hit_tokens = [estimate_text_tokens(hit) + 1 for hit in self.hits]
+        self.tokens = sum(self.hit_tokens)
+        self.text = "\n\n".join(self.hits)
+
+    def fit(self, budget: int) -> Tuple[str, Optional[str]]:
+        if self.tokens <= budget:
+            return self.text, None
+        kept = 0
+        used = 0
+        while kept < len(self.hits) and used + self.hit_tokens[kept] <= budget:
+            used += self.hit_tokens[kept]
+            kept += 1
+        if kept == 0 and budget > 0:
+            # 单条就超出预算时保留截断后的最相关一条
+            return _truncate_text(self.hits[0], self.hit_tokens[0], budget), f"仅保留相似度最高的 1 条并截断（共 {len(self.hits)} 条）"
+        return "\n\n".join(self.hits[:kept]), f"仅保留相似度最高的 {kept} 条（共 {len(self.hits)} 条）"
+
+
+class FileTreeSection:
+    """文件树，超出预算时逐级折叠"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = estimate_text_tokens(text)
+        # format_tree_for_prompt 的统计信息与路径列表以空行分隔
+        header, separator, body = text.partition("\n\n")
+        self.header = header if separator else ""
+        self.paths = body.split("\n") if separator else text.split("\n")
+
+    def _render(self, paths: List[str]) -> str:
+        return f"{self.header}\n\n{'\n'.join(paths)}" if self.header else "\n".join(paths)
+
+    def fit(self, budget: int) -> Tuple[str, Optional[str]]:
+        if self.tokens <= budget:
+            return self.text, None
+        folders = [path for path in self.paths if path.endswith("/")]
+        text = self._render(folders)
+        if estimate_text_tokens(text) <= budget:
+            return text, f"已折叠为只含文件夹（{len(folders)}/{len(self.paths)} 项）"
+        top_level = [path for path in folders if "/" not in path[:-1]]
+        text = self._render(top_level)
+        if estimate_text_tokens(text) <= budget:
+            return text, f"已折叠为只含顶层文件夹（{len(top_level)}/{len(self.paths)} 项）"
+        return _truncate_text(text, estimate_text_tokens(text), budget), "已折叠为顶层文件夹并截断"
+
+
+Section = Union[TextSection, LoadedFilesSection, RagSection, FileTreeSection]
+
+
+def _degrade(budgets: Dict[str, int], order: Sequence[str], overflow: int) -> int:
+    """按降级顺序压缩各部分预算，返回仍未消化的超出量"""
+    for name in order:
+        if overflow <= 0:
+            break
+        if name in budgets:
+            reduce = min(overflow, budgets[name])
+            budgets[name] -= reduce
+            overflow -= reduce
+    return overflow
+
+
+def allocate_context_budget(
+    sections: Sequence[Tuple[str, Union[str, Section]]],
+    stable_names: Collection[str],
+    mode: Optional[str],
+    model: Optional[str],
+) -> Tuple[Dict[str, str], str]:
+    """
+    按预算裁剪各部分内容
+
+    Args:
+        sections: (部分名称, 内容) 列表，内容为字符串或可降级的部分对象
+        stable_names: 属于稳定部分的名称（预算不受易变部分影响）
+        mode: 对话模式（读取 max_tokens 与 contextBudget）
+        model: 当前模型（按校准系数把预算换算为估算 token）
+
+    Returns:
+        ({部分名称: 裁剪后的文本}, 预算说明)，未超出预算时预算说明为空字符串；
+        已加载文件的变化描述（计入已加载文件的预算）在 LOADED_FILES_DELTA 键中
+    """
+    parsed: Dict[str, Section] = {}
+    for name, content in sections:
+        if isinstance(content, str):
+            content = FileTreeSection(content) if name == "file_tree" else TextSection(content)
+        parsed[name] = content
+
+    max_tokens = settings.get_config("mode", mode, "max_tokens")
+    if not max_tokens:
+        texts = {name: section.text for name, section in parsed.items()}
+        loaded_files = parsed.get("loaded_files")
+        if isinstance(loaded_files, LoadedFilesSection):
+            texts[LOADED_FILES_DELTA] = loaded_files.delta
+        return texts, ""
+
+    config = context_budget_config(mode)
+    total_budget = int(max_tokens * config["total"] / get_calibration(model))
+    # 各部分先受单独上限约束
+    budgets = {
+        name: min(section.tokens, int(total_budget * config["sections"][name]))
+        if name in config["sections"] else section.tokens
+        for name, section in parsed.items()
+    }
+    # 稳定部分只按自身大小压缩，保证易变部分的变化不会改变缓存前缀
+    stable_overflow = sum(budget for name, budget in budgets.items() if name in stable_names) - total_budget
+    _degrade(budgets, STABLE_DEGRADE_ORDER, stable_overflow)
+    # 易变部分使用剩余预算，仍超出时按降级顺序压缩
+    overflow = _degrade(budgets, VOLATILE_DEGRADE_ORDER, sum(budgets.values()) - total_budget)
+    if overflow > 0:
+        logger.warning(f"环境信息超出总预算约 {overflow} tokens（已压缩可降级部分），请检查过往消息总结与 Skill 的长度")
+
+    texts: Dict[str, str] = {}
+    notes: List[str] = []
+    for name, section in parsed.items():
+        if isinstance(section, LoadedFilesSection):
+            texts[name], texts[LOADED_FILES_DELTA], note = section.fit_with_delta(budgets[name])
+        else:
+            texts[name], note = section.fit(budgets[name])
+        if note:
+            notes.append(f"- {SECTION_TITLES.get(name, name)}：{note}")
+
+    if not notes:
+        return texts, ""
+    used = sum(estimate_text_tokens(text) for text in texts.values())
+    logger.info(f"环境信息按预算裁剪：预算 {total_budget}，裁剪后约 {used} tokens；{' '.join(notes)}")
+    return texts, "\n".join([BUDGET_NOTICE_HEADER, *notes])
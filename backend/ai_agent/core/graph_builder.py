@@ -1,224 +1,303 @@
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langgraph.prebuilt import tools_condition
-from langgraph.store.sqlite.aio import AsyncSqliteStore
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.types import interrupt
-from langchain_core.messages import ToolMessage, SystemMessage, HumanMessage, RemoveMessage
-from langchain_core.messages.utils import (
-    trim_messages,
-    count_tokens_approximately
-)
+from langchain_core.messages import ToolMessage, HumanMessage, RemoveMessage
+from langgraph.graph.state import CompiledStateGraph
 from typing import Callable, Any
+from collections import OrderedDict
 from backend.settings.settings import settings
 from backend.ai_agent.models.multi_model_adapter import MultiModelAdapter
 from backend.ai_agent.core.tool_load import import_tools
-from backend.ai_agent.core.system_prompt_builder import SystemPromptBuilder
-import uuid
+from backend.ai_agent.core.system_prompt_builder import SystemPromptBuilder, assemble_messages
+from backend.ai_agent.core.persistence import sqlite_persistence
+from backend.ai_agent.core.memory import memory_service
+from backend.ai_agent.core.auto_summarizer import auto_summarizer
+from backend.ai_agent.core.summarizer import summarize_incremental, summary_chunk_tokens, unsummarized_start
+from backend.file.file_service import normalize_to_absolute
+from backend.ai_agent.utils.trace_utils import trace, describe_messages, prompt_snapshot_writer
+from backend.ai_agent.utils.token_utils import (
+    estimate_text_tokens,
+    count_messages_tokens,
+    trim_messages_to_budget,
+    get_calibration,
+    record_usage
+)
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 class State(MessagesState):
     """包含消息的状态,不包括系统提示词"""
     summary: str
+    # 摘要水位线：最后一条已纳入摘要的消息ID，之后的消息为待总结的新消息
+    summary_watermark: str
 
 
-def with_graph_builder(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+# 已编译图缓存（LRU）：{缓存键: 编译后的图（未绑定checkpointer/store）}
+_graph_cache: "OrderedDict[tuple, CompiledStateGraph]" = OrderedDict()
+# 缓存的图数量上限（不同模式/模型组合各占一项）
+GRAPH_CACHE_SIZE = 8
+
+
+def _config_hash(value: Any) -> str:
+    """计算配置内容的摘要，用于缓存键"""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def _graph_cache_key(mode: str, provider: str, model: str, temperature: Any, tool_dict: dict) -> tuple:
     """
-    图构建装饰器函数，用于接收外界传入的操作函数
-    
-    Args:
-        func: 外界传入的操作函数，接收编译后的图作为参数
-             可以是普通异步函数或异步生成器函数
-        
-    Returns:
-        包装后的异步函数或异步生成器函数
+    计算图缓存键：(模式, 提供商, 模型, 温度, 工具集指纹, MCP配置摘要, 提供商连接摘要)
+
+    工具对象被缓存的图持有，存活期间 id 不会被复用，可直接作为工具集指纹；
+    提供商连接摘要覆盖 url 与 API Key，修改密钥后重新构建模型实例
     """
-    async def wrapper(*args, **kwargs):
-        # 从配置文件获取当前模式
-        mode = settings.get_config("currentMode", default="管家agent")
-
-        # 导入所有工具（包括MCP工具和内置工具）
-        tool_dict = await import_tools(mode=mode)
-        # 每次都创建新的store实例，避免线程冲突
-        store_db_path = str(settings.DB_DIR) + "/store.db"
-        store = AsyncSqliteStore.from_conn_string(store_db_path)
-
-        # 使用 SystemPromptBuilder 构建完整的系统提示词（每次创建新实例避免并发问题）
-        prompt_builder = SystemPromptBuilder()
-
-        print(f"[INFO] 构建图实例 - 模式: {mode}, 工具数量: {len(tool_dict)}")
-        # 从配置中获取当前选择的模型和提供商
-        selected_model = settings.get_config("selectedModel")
-        selected_provider = settings.get_config("selectedProvider")
-        temperature = settings.get_config("mode", mode, "temperature")
-        max_tokens = settings.get_config("mode", mode, "max_tokens")
+    tool_fingerprint = tuple(sorted((name, id(tool)) for name, tool in tool_dict.items()))
+    mcp_hash = _config_hash(settings.get_config("mcpServers", default={}))
+    provider_hash = _config_hash([
+        settings.get_config("provider", provider, "url", default=""),
+        settings.get_provider_key(provider),
+    ])
+    return (mode, provider, model, temperature, tool_fingerprint, mcp_hash, provider_hash)
 
-        print(f"构建图实例 - 模型: {selected_model}, 提供商: {selected_provider}, 模式: {mode}")
 
-        # 使用多模型适配器创建模型实例,max_tokens不传，让提供商使用默认的**单轮回复**最大输出长度
-        llm = MultiModelAdapter.create_model(
-            model = selected_model,
-            provider = selected_provider,
-            temperature = temperature,
-            timeout = 300,
-        )
+# 工具并发执行上限
+TOOL_CONCURRENCY = 4
+# 会修改文件的工具，同一路径上的调用需按顺序串行执行
+FILE_MUTATING_TOOLS = {"manage_file", "insert_line", "delete_line", "replace_line", "load_unload_file"}
 
-        # 统一使用bind_tools绑定工具
-        if tool_dict:
-            llm_with_tools = llm.bind_tools(list(tool_dict.values()))
-            print(f"[INFO] 已绑定 {len(tool_dict)} 个工具到模型")
+
+def _format_tool_args(args: dict) -> dict:
+    """格式化参数用于中断展示（截断过长的字符串）"""
+    formatted_args = {}
+    for key, value in args.items():
+        if isinstance(value, str) and len(value) > 100:
+            formatted_args[key] = value[:100] + "..."
         else:
-            llm_with_tools = llm
-            print(f"[WARNING] 没有可用的工具绑定到模型")
-        
-        # 创建独立的总结模型实例（不绑定工具）
-        llm_summarization = MultiModelAdapter.create_model(
-            model = selected_model,
-            provider = selected_provider,
-            temperature = temperature,
-            timeout = 300,
+            formatted_args[key] = value
+    return formatted_args
+
+
+def _tool_serial_key(tool_name: str, args: dict) -> str | None:
+    """
+    获取工具调用的串行键，键相同的调用按原顺序串行执行，None 表示可与其他调用并发
+
+    - 修改文件的工具、带替换的 search_text：按文件路径串行（未指定路径的替换作用于整个项目）
+    - execute_command：命令之间可能有先后依赖，全部串行
+    - load_unload_skill：按 skill 名串行
+    """
+    if tool_name in FILE_MUTATING_TOOLS:
+        path = args.get("path") or args.get("file_path")
+        return f"file:{normalize_to_absolute(path)}" if path else "file:*"
+    if tool_name == "search_text" and args.get("replace") is not None:
+        path = args.get("path")
+        return f"file:{normalize_to_absolute(path)}" if path else "file:*"
+    if tool_name == "execute_command":
+        return "command"
+    if tool_name == "load_unload_skill":
+        return f"skill:{args.get('skill_name')}"
+    return None
+
+
+def _build_graph(mode: str, selected_provider: str, selected_model: str, temperature: Any, tool_dict: dict) -> CompiledStateGraph:
+    """
+    构建并编译图（不绑定checkpointer/store，由调用方按请求绑定）
+
+    节点中只捕获与缓存键对应的构建参数，stream_id、user_id 等请求级参数均从 config 中读取
+    """
+    # 使用 SystemPromptBuilder 构建完整的系统提示词
+    # 缓存的图被多个会话共用：构建器的本轮状态（@路径同步、上下文快照）按会话ID区分，
+    # 每个构建器只保留最近 TURN_STATE_SIZE 个会话，图缓存最多 GRAPH_CACHE_SIZE 个，长期运行不会无限增长
+    prompt_builder = SystemPromptBuilder()
+
+    logger.info(f"构建图实例 - 模型: {selected_model}, 提供商: {selected_provider}, 模式: {mode}, 工具数量: {len(tool_dict)}")
+
+    # 使用多模型适配器创建模型实例,max_tokens不传，让提供商使用默认的**单轮回复**最大输出长度
+    llm = MultiModelAdapter.create_model(
+        model = selected_model,
+        provider = selected_provider,
+        temperature = temperature,
+        timeout = 300,
+    )
+
+    # 统一使用bind_tools绑定工具
+    if tool_dict:
+        llm_with_tools = llm.bind_tools(list(tool_dict.values()))
+        logger.info(f"已绑定 {len(tool_dict)} 个工具到模型")
+    else:
+        llm_with_tools = llm
+        logger.warning("没有可用的工具绑定到模型")
+    
+    # 创建独立的总结模型实例（不绑定工具）
+    llm_summarization = MultiModelAdapter.create_model(
+        model = selected_model,
+        provider = selected_provider,
+        temperature = temperature,
+        timeout = 300,
+    )
+    # 不绑定工具，确保AI不会尝试调用工具
+    summarization_model = llm_summarization
+
+    # 创建工具名称映射
+    tools_by_name = {tool.name: tool for tool in tool_dict.values()}
+    # 工具定义随每次请求发送，同样占用上下文
+    tools_tokens = estimate_text_tokens(json.dumps(getattr(llm_with_tools, "tools_schema", None) or [], ensure_ascii=False))
+
+    # 创建模型节点
+    async def call_llm(state: State, config):
+        """调用LLM生成响应"""
+        thread_id = config.get("configurable", {}).get("thread_id")
+        # 调试转储完整state（包括summary字段），未开启调试时不做格式化
+        trace(thread_id, "完整state", state)
+
+        # 获取stream_id用于中断控制
+        stream_id = config.get("configurable", {}).get("stream_id")
+
+        # 获取当前消息列表
+        current_messages = state["messages"]
+
+        # 本轮用户输入：最后一条用户消息（工具循环中最后一条消息是工具结果，不能作为检索查询）
+        # 其ID作为本轮对话标识，@路径同步与两步RAG每轮只执行一次
+        turn_message = next((message for message in reversed(current_messages) if isinstance(message, HumanMessage)), None)
+        user_input = str(turn_message.content) if turn_message is not None else None
+        turn_id = turn_message.id if turn_message is not None else None
+
+        # 获取过往消息总结
+        summary = state.get("summary", "")
+
+        # 检索长期记忆与构建提示词并发进行，检索受超时限制，不会拖住本轮生成；每轮只检索一次
+        user_id = config.get("configurable", {}).get("user_id", "default")
+        memory_task = asyncio.create_task(memory_service.recall_for_turn(user_id, user_input or "", thread_id, turn_id))
+
+        # 异步获取系统提示词和上下文（稳定部分/易变部分）
+        system_prompt, stable_context, volatile_context = await prompt_builder.build_prompts(
+            mode=mode,
+            user_input=user_input,
+            summary=summary,
+            thread_id=thread_id,
+            turn_id=turn_id
         )
-        # 不绑定工具，确保AI不会尝试调用工具
-        summarization_model = llm_summarization
-
-        # 创建工具名称映射
-        tools_by_name = {tool.name: tool for tool in tool_dict.values()}
-
-        # 创建模型节点
-        async def call_llm(state: State, config):
-            """调用LLM生成响应"""
-            # 打印完整state，包括summary字段
-            print(f"[STATE] 完整state: {state}")
-            
-            # 获取stream_id用于中断控制
-            stream_id = config.get("configurable", {}).get("stream_id")
-            
-            # 获取当前消息列表
-            current_messages = state["messages"]
-            
-            # 获取用户输入（最后一条消息）
-            user_input = None
-            if current_messages:
-                last_message = current_messages[-1]
-                if hasattr(last_message, 'content'):
-                    user_input = str(last_message.content)
-            
-            # 获取过往消息总结
-            summary = state.get("summary", "")
-            
-            # 异步获取系统提示词和上下文消息
-            system_prompt, context_message = await prompt_builder.build_prompts(
-                mode=mode,
-                user_input=user_input,
-                summary=summary
-            )
-            
-            # 如果有store可用，检索长期记忆
-            memory_context = ""
-            if store is not None:
-                try:
-                    # 从config中获取user_id
-                    user_id = config.get("configurable", {}).get("user_id", "default")
-                    namespace = ("memories", user_id)
-                    
-                    # 搜索相关记忆
-                    last_message = current_messages[-1] if current_messages else None
-                    if last_message:
-                        query = str(last_message.content) if hasattr(last_message, 'content') else ""
-                        if query:
-                            memories = store.search(namespace, query=query, limit=5)
-                            if memories:
-                                memory_context = "\n".join([d.value.get("data", "") for d in memories])
-                                print(f"[MEMORY] 检索到 {len(memories)} 条记忆")
-                except Exception as e:
-                    print(f"[MEMORY] 检索记忆时出错: {e}")
-            
-            # 将记忆上下文添加到上下文消息中
-            if memory_context:
-                context_message = f"{context_message}\n\n【长期记忆】\n{memory_context}" if context_message else f"【长期记忆】\n{memory_context}"
-            
-            # 修剪消息历史，避免超出上下文限制，include_system不填，默认去除提示词
-            current_messages = trim_messages(
-                current_messages,
-                strategy="last",  # 保留最新的消息
-                token_counter=count_tokens_approximately,
-                max_tokens=max_tokens,
-                start_on="human",  # 从human消息开始保留
-                end_on=("human", "tool"),  # 在human或tool消息结束
-            )
-            print("max_tokens:",max_tokens)
-            
-            # 构建发送给AI的消息列表：
-            # SystemMessage(系统提示词) + 历史消息 + HumanMessage(系统环境信息)
-            messages_for_ai = [SystemMessage(content=system_prompt)] + current_messages
-            
-            # 如果有上下文消息，作为末尾HumanMessage附加（明确标记为系统生成）
-            if context_message:
-                messages_for_ai.append(HumanMessage(content=f"【系统环境信息 - 此消息由系统自动生成，并非用户发送】\n\n{context_message}\n\n"))
-            
-            # 调用模型生成响应
-            print("发送给ai的信息：", messages_for_ai)
-            
-            # 统一调用方式，传入stream_id用于中断控制
-            response = await llm_with_tools.ainvoke(
-                messages_for_ai,
-                config={"configurable": {"stream_id": stream_id}} if stream_id else {}
+
+        memories = await memory_task
+        memory_context = "\n".join(memories)
+        if memories:
+            logger.info(f"检索到 {len(memories)} 条长期记忆")
+
+        # 将记忆上下文添加到易变上下文中（检索结果随用户输入变化）
+        if memory_context:
+            volatile_context = f"{volatile_context}\n\n【长期记忆】\n{memory_context}" if volatile_context else f"【长期记忆】\n{memory_context}"
+
+        # 修剪消息历史，避免超出上下文限制（提示词、环境信息、工具定义都计入 max_tokens）
+        # 每次调用时读取，修改上下文长度无需重建图
+        max_tokens = settings.get_config("mode", mode, "max_tokens")
+        fixed_tokens = (
+            estimate_text_tokens(system_prompt) + estimate_text_tokens(stable_context)
+            + estimate_text_tokens(volatile_context) + tools_tokens
+        )
+        history_budget = max(int(max_tokens - fixed_tokens * get_calibration(selected_model)), 0) if max_tokens else None
+        current_messages = trim_messages_to_budget(
+            current_messages,
+            history_budget,
+            thread_id=thread_id,
+            model=selected_model,
+        )
+        logger.debug(f"max_tokens: {max_tokens}, 历史消息预算: {history_budget}")
+
+        # 构建发送给AI的消息列表（开启 promptCaching 时稳定内容在前、易变内容在后，并标记缓存断点）
+        messages_for_ai = assemble_messages(
+            system_prompt,
+            stable_context,
+            current_messages,
+            volatile_context,
+            cache_aware=settings.get_config("promptCaching", default=True)
+        )
+
+        # 调用模型生成响应（完整消息只在调试转储和提示词快照中输出）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"发送给AI的消息: {describe_messages(messages_for_ai)}")
+        trace(thread_id, "发送给AI的消息", messages_for_ai)
+        prompt_snapshot_writer.record(thread_id, selected_model, messages_for_ai)
+
+        # 统一调用方式，传入stream_id用于中断控制
+        response = await llm_with_tools.ainvoke(
+            messages_for_ai,
+            config={"configurable": {"stream_id": stream_id}} if stream_id else {}
+        )
+
+        trace(thread_id, "模型响应", response)
+
+        # 用实际输入 token 数校准估算
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            record_usage(selected_model, fixed_tokens + count_messages_tokens(current_messages), usage.get("input_tokens"))
+            # 输出提示词缓存命中情况，便于确认缓存友好布局的效果
+            cache_details = usage.get("input_token_details") or {}
+            logger.info(
+                f"输入 {usage.get('input_tokens')} tokens，"
+                f"缓存命中 {cache_details.get('cache_read', 0)}，缓存写入 {cache_details.get('cache_creation', 0)}"
             )
-            
-            print(f"response长什么样{response}")
-            
-            # 检测用户是否要求记住某些信息，并存储到长期记忆
-            if store is not None and current_messages:
-                try:
-                    last_message = current_messages[-1]
-                    if hasattr(last_message, 'content') and last_message.content:
-                        content = last_message.content.lower()
-                        # 检测记住指令
-                        if "记住" in content or "remember" in content or "记录" in content:
-                            user_id = config.get("configurable", {}).get("user_id", "default")
-                            namespace = ("memories", user_id)
-                            # 提取需要记住的内容（简单实现，可以根据需要改进）
-                            memory_content = last_message.content
-                            # 存储记忆
-                            memory_id = str(uuid.uuid4())
-                            store.put(namespace, memory_id, {"data": memory_content})
-                            print(f"[MEMORY] 已存储记忆: {memory_id}")
-                except Exception as e:
-                    print(f"[MEMORY] 存储记忆时出错: {e}")
-            
-            # 直接返回response，使用operator.add自动追加到状态中
-            return {"messages": [response]}
-
-        # 自定义工具节点（0.3的预构建组件在1.0教程并未提及，故按照langgraph官方文档，手动处理tool_node）
-        async def tool_node(state: State):
-            """执行工具调用"""
-            result = []
-            # 处理最后一条消息中的工具调用
-            for tool_call in state["messages"][-1].tool_calls:
+
+        # 会话总量（含本次回复）超过阈值时在后台自动总结最早的消息，不阻塞本轮对话
+        thread_tokens = (fixed_tokens + count_messages_tokens(state["messages"]) + count_messages_tokens([response])) * get_calibration(selected_model)
+        auto_summarizer.maybe_schedule(thread_id, thread_tokens, max_tokens)
+
+        # 检测用户是否要求记住某些信息，写入长期记忆（后台批量嵌入写入，不等待）
+        # 只检查本轮用户消息且每轮只提交一次，工具结果中的关键词不会触发
+        if user_input:
+            memory_id = memory_service.remember_turn(user_id, user_input, thread_id, turn_id)
+            if memory_id:
+                logger.info(f"已提交长期记忆: {memory_id}")
+
+        # 直接返回response，使用operator.add自动追加到状态中
+        return {"messages": [response]}
+
+    # 自定义工具节点（0.3的预构建组件在1.0教程并未提及，故按照langgraph官方文档，手动处理tool_node）
+    async def tool_node(state: State):
+        """执行工具调用：一次中断批量确认所有调用，确认后并发执行，结果按原 tool_call 顺序返回"""
+        tool_calls = state["messages"][-1].tool_calls
+
+        # 所有待执行的调用放在同一个中断中，用户只需确认一次
+        pending_calls = [
+            {
+                "id": tool_call["id"],
+                "tool_name": tool_call["name"],
+                "parameters": _format_tool_args(tool_call["args"])
+            }
+            for tool_call in tool_calls
+        ]
+        interrupt_data = {
+            # 首个调用的信息保留在顶层，便于只展示单个工具的界面
+            "tool_name": pending_calls[0]["tool_name"],
+            "parameters": pending_calls[0]["parameters"],
+            "tool_calls": pending_calls
+        }
+
+        user_choice = interrupt(interrupt_data)
+        choice_action = user_choice.get("choice_action", "2")
+        choice_data = user_choice.get("choice_data", "")
+        # 用户对各调用建议内容的修改: {tool_call_id: diff}
+        user_diffs = user_choice.get("user_diffs") or {}
+        logger.debug(f"用户修改了 {len(user_diffs)} 个调用的建议内容")
+
+        if choice_action == "1":
+            semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+            serial_locks: dict[str, asyncio.Lock] = {}
+            serial_keys = [_tool_serial_key(tool_call["name"], tool_call["args"]) for tool_call in tool_calls]
+            # 存在作用于整个项目的文件修改时，所有文件修改都与其串行
+            if "file:*" in serial_keys:
+                serial_keys = ["file:*" if key and key.startswith("file:") else key for key in serial_keys]
+
+            async def run_tool_call(tool_call, serial_key) -> ToolMessage:
                 tool_name = tool_call["name"]
-                tool = tools_by_name[tool_name]
-
-                # 格式化参数显示
-                args = tool_call["args"]
-                formatted_args = {}
-                for key, value in args.items():
-                    if isinstance(value, str) and len(value) > 100:
-                        formatted_args[key] = value[:100] + "..."
-                    else:
-                        formatted_args[key] = value
-
-                interrupt_data = {
-                    "tool_name": tool_name,
-                    "parameters": formatted_args
-                }
-
-                user_choice = interrupt(interrupt_data)
-                choice_action = user_choice.get("choice_action", "2")
-                choice_data = user_choice.get("choice_data", "")
-                user_diff = user_choice.get("user_diff", "")
-                print(f"用户修改:{user_diff}")
-
-                if choice_action == "1":
+                # 同一文件的修改按原顺序串行（任务按顺序创建，锁的等待队列先进先出）
+                serial_lock = serial_locks.setdefault(serial_key, asyncio.Lock()) if serial_key else None
+                async with serial_lock or contextlib.nullcontext(), semaphore:
                     try:
+                        tool = tools_by_name[tool_name]
                         observation = await tool.ainvoke(tool_call["args"])
 
                         # 确保observation是字符串类型
@@ -228,143 +307,177 @@ def with_graph_builder(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
                         # 构建工具结果消息
                         tool_content = str(observation)
                         # 如果有用户diff，附加到工具结果中
+                        user_diff = user_diffs.get(tool_call["id"], "")
                         if user_diff:
                             tool_content += f"\n\n[用户修改了文件内容]：\n{user_diff}"
-
-                        # 将工具结果放入ToolMessage
-                        result.append(ToolMessage(content=tool_content, tool_call_id=tool_call["id"]))
-
-                        # WebSocket推送工具执行结果
-                        try:
-                            from backend.websocket import ws_manager
-                            await ws_manager.send({
-                                "type": "tool_result",
-                                "payload": {
-                                    "tool_call_id": tool_call["id"],
-                                    "tool_name": tool_name,
-                                    "result": tool_content[:2000]  # 限制长度
-                                }
-                            })
-                        except Exception as e:
-                            print(f"[WebSocket] 推送工具结果失败: {e}")
-
-                        # 将用户附加信息放入HumanMessage（如果有内容）
-                        if choice_data:
-                            result.append(HumanMessage(content=choice_data))
                     except Exception as e:
                         # 构造错误信息字符串
-                        error_message = f"工具执行失败: {str(e)}"
-                        result.append(ToolMessage(content=error_message, tool_call_id=tool_call["id"]))
-
-                        # 将用户附加信息放入HumanMessage（如果有内容）
-                        if choice_data:
-                            result.append(HumanMessage(content=choice_data))
-                else:
-                    # 用户拒绝执行工具
-                    cancel_message = "用户取消了工具请求"
-                    result.append(ToolMessage(content=cancel_message, tool_call_id=tool_call["id"]))
-
-                    # 将用户附加信息放入HumanMessage（如果有内容）
-                    if choice_data:
-                        result.append(HumanMessage(content=choice_data))
-            # 直接返回result，使用operator.add自动追加到状态中
-            return {"messages": result}
-
-        # 创建总结节点，使用官方1.0推荐的总结机制
-        async def summarize_conversation(state: State):
-            """总结对话历史，使用LangGraph 1.0官方推荐的方式"""
-            # 首先，我们获取任何现有摘要
-            summary = state.get("summary", "")
-
-            # 创建我们的摘要提示
-            if summary:
-                # 已经存在摘要，扩展摘要
-                summary_message = (
-                    f"This is a summary of the conversation to date: {summary}\n\n"
-                    "Extend the summary by taking into account the new messages above:"
-                )
-            else:
-                # 创建新的摘要
-                summary_message = "Create a summary of the conversation above:"
-
-            # 将提示添加到我们的历史记录中
-            messages = state["messages"] + [HumanMessage(content=summary_message)]
-            
-            print(f"[DEBUG] summarize节点 - 准备调用总结模型，消息数量: {len(messages)}")
-            # 调用总结模型
-            response = await summarization_model.ainvoke(messages)
-            
-            print(f"[DEBUG] summarize节点 - 总结模型返回: '{response.content}'")
-            
-            # 只保留倒数第2条消息，删除其他所有消息
-            delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]] + [RemoveMessage(id=state["messages"][-1].id)]
-            
-            # 返回新的摘要和要删除的消息
-            return {"summary": response.content, "messages": delete_messages}
-
-        # 构建图
-        builder = StateGraph(State)
-
-        # 添加节点
-        builder.add_node("call_llm", call_llm)
-        builder.add_node("tools", tool_node)  # 使用自定义工具节点函数
-        builder.add_node("summarize", summarize_conversation)  # 添加总结节点
-
-        # 定义路由函数：根据用户输入决定进入哪个节点
-        def route_based_on_input(state: State):
-            """根据用户输入决定路由"""
-            # 获取最后一条消息
-            messages = state["messages"]
-            if not messages:
-                return "call_llm"
-            
-            last_message = messages[-1]
-            if hasattr(last_message, 'content'):
-                content = str(last_message.content).strip()
-                # 检查是否是总结指令
-                if content == "@summarize":
-                    return "summarize"
-            
+                        return ToolMessage(content=f"工具执行失败: {str(e)}", tool_call_id=tool_call["id"])
+
+                # WebSocket推送工具执行结果
+                try:
+                    from backend.websocket import ws_manager
+                    await ws_manager.send({
+                        "type": "tool_result",
+                        "payload": {
+                            "tool_call_id": tool_call["id"],
+                            "tool_name": tool_name,
+                            "result": tool_content[:2000]  # 限制长度
+                        }
+                    })
+                except Exception as e:
+                    logger.warning(f"推送工具结果失败: {e}")
+
+                # 将工具结果放入ToolMessage
+                return ToolMessage(content=tool_content, tool_call_id=tool_call["id"])
+
+            # gather 按传入顺序返回结果，保持 tool_call_id 顺序
+            result = list(await asyncio.gather(*(
+                run_tool_call(tool_call, serial_key) for tool_call, serial_key in zip(tool_calls, serial_keys)
+            )))
+        else:
+            # 用户拒绝执行工具
+            result = [ToolMessage(content="用户取消了工具请求", tool_call_id=tool_call["id"]) for tool_call in tool_calls]
+
+        # 将用户附加信息放入HumanMessage（如果有内容）
+        if choice_data:
+            result.append(HumanMessage(content=choice_data))
+        # 直接返回result，使用operator.add自动追加到状态中
+        return {"messages": result}
+
+    # 创建总结节点：只总结水位线之后的新消息并合并进已有摘要，新消息过多时分块并发总结
+    async def summarize_conversation(state: State):
+        """总结对话历史（增量、分块），完成后只保留倒数第2条消息"""
+        summary = state.get("summary", "")
+        watermark = state.get("summary_watermark", "")
+
+        # 最后一条是 @summarize 指令本身，不参与总结
+        history = state["messages"][:-1]
+        new_messages = history[unsummarized_start(history, watermark):]
+
+        logger.info(f"summarize节点 - 待总结的新消息数量: {len(new_messages)}")
+        chunk_tokens = summary_chunk_tokens(settings.get_config("mode", mode, "max_tokens"), selected_model)
+        summary = await summarize_incremental(summarization_model, new_messages, summary, chunk_tokens)
+
+        logger.debug(f"summarize节点 - 总结长度: {len(summary)}")
+
+        # 只保留倒数第2条消息，删除其他所有消息
+        delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]] + [RemoveMessage(id=state["messages"][-1].id)]
+
+        # 保留的消息已纳入摘要，作为新的水位线
+        return {
+            "summary": summary,
+            "summary_watermark": history[-1].id if history else watermark,
+            "messages": delete_messages
+        }
+
+    # 构建图
+    builder = StateGraph(State)
+
+    # 添加节点
+    builder.add_node("call_llm", call_llm)
+    builder.add_node("tools", tool_node)  # 使用自定义工具节点函数
+    builder.add_node("summarize", summarize_conversation)  # 添加总结节点
+
+    # 定义路由函数：根据用户输入决定进入哪个节点
+    def route_based_on_input(state: State):
+        """根据用户输入决定路由"""
+        # 获取最后一条消息
+        messages = state["messages"]
+        if not messages:
             return "call_llm"
 
-        # 添加边
-        builder.add_conditional_edges(
-            START,
-            route_based_on_input,
-            {
-                "call_llm": "call_llm",
-                "summarize": "summarize"
-            }
-        )
-        builder.add_edge("tools", "call_llm")
-        builder.add_conditional_edges(
-            "call_llm",
-            tools_condition,
-        )
-        # 总结节点执行后结束，避免触发后续节点
-        builder.add_edge("summarize", END)
+        last_message = messages[-1]
+        if hasattr(last_message, 'content'):
+            content = str(last_message.content).strip()
+            # 检查是否是总结指令
+            if content == "@summarize":
+                return "summarize"
+
+        return "call_llm"
+
+    # 添加边
+    builder.add_conditional_edges(
+        START,
+        route_based_on_input,
+        {
+            "call_llm": "call_llm",
+            "summarize": "summarize"
+        }
+    )
+    builder.add_edge("tools", "call_llm")
+    builder.add_conditional_edges(
+        "call_llm",
+        tools_condition,
+    )
+    # 总结节点执行后结束，避免触发后续节点
+    builder.add_edge("summarize", END)
+
+    return builder.compile()
+
+
+async def get_graph() -> CompiledStateGraph:
+    """
+    获取当前配置对应的已编译图，配置未变化时复用缓存
+
+    模式、模型、提供商、温度、工具集或MCP配置变化时缓存键随之变化，自动重新构建
+    """
+    # 从配置文件获取当前模式
+    mode = settings.get_config("currentMode", default="管家agent")
+
+    # 导入所有工具（包括MCP工具和内置工具）
+    tool_dict = await import_tools(mode=mode)
+
+    # 从配置中获取当前选择的模型和提供商
+    selected_model = settings.get_config("selectedModel")
+    selected_provider = settings.get_config("selectedProvider")
+    temperature = settings.get_config("mode", mode, "temperature")
+
+    key = _graph_cache_key(mode, selected_provider, selected_model, temperature, tool_dict)
+    graph = _graph_cache.get(key)
+    if graph is not None:
+        _graph_cache.move_to_end(key)
+        logger.debug(f"复用已编译的图 - 模式: {mode}, 模型: {selected_model}")
+        return graph
+
+    graph = _build_graph(mode, selected_provider, selected_model, temperature, tool_dict)
+    _graph_cache[key] = graph
+    while len(_graph_cache) > GRAPH_CACHE_SIZE:
+        _graph_cache.popitem(last=False)
+    return graph
+
 
-        # 创建SQLite检查点数据库路径
-        checkpoint_db_path = str(settings.DB_DIR) + "/checkpoints.db"
+def with_graph_builder(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """
+    图构建装饰器函数，用于接收外界传入的操作函数
+    
+    Args:
+        func: 外界传入的操作函数，接收编译后的图作为参数
+             可以是普通异步函数或异步生成器函数
         
-        # 使用异步上下文管理器创建checkpointer和store
-        async with AsyncSqliteSaver.from_conn_string(checkpoint_db_path) as checkpointer, \
-                    AsyncSqliteStore.from_conn_string(store_db_path) as store:
-            # 编译图，使用checkpointer和store（长期记忆）
-            compiled_graph = builder.compile(checkpointer=checkpointer, store=store)
-            
-            # 调用外界传入的函数，传入编译后的图
-            result = func(compiled_graph, *args, **kwargs)
-            
-            # 检查是否是异步生成器
-            if hasattr(result, '__aiter__'):
-                # 如果是异步生成器，遍历并 yield
-                async for item in result:
-                    yield item
-            else:
-                # 如果是普通异步函数，await 并返回结果
-                result = await result
-                # 对于异步生成器函数，我们不能使用 return，所以将结果包装为单个元素的生成器
-                yield result
+    Returns:
+        包装后的异步函数或异步生成器函数
+    """
+    async def wrapper(*args, **kwargs):
+        graph = await get_graph()
+
+        # 使用进程级共享的checkpointer和store（由FastAPI生命周期打开）
+        checkpointer, store = await sqlite_persistence.get()
+        # 复制缓存的图并绑定checkpointer和store（浅拷贝，不会重新编译）
+        compiled_graph = graph.copy(update={"checkpointer": checkpointer, "store": store})
+        
+        # 调用外界传入的函数，传入编译后的图
+        result = func(compiled_graph, *args, **kwargs)
+        
+        # 检查是否是异步生成器
+        if hasattr(result, '__aiter__'):
+            # 如果是异步生成器，遍历并 yield
+            async for item in result:
+                yield item
+        else:
+            # 如果是普通异步函数，await 并返回结果
+            result = await result
+            # 对于异步生成器函数，我们不能使用 return，所以将结果包装为单个元素的生成器
+            yield result
     
     return wrapper
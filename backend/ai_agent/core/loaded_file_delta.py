@@ -0,0 +1,167 @@
+"""
+已加载文件增量上下文
+同一轮对话（最后一条用户消息不变）的工具循环中，稳定上下文里的已加载文件保持本轮第一次调用时的渲染（基准），
+之后的调用只在易变上下文中附加段落级变化：被删除/替换的原段落范围、新段落的 "段落号-短哈希|内容"、段落序号偏移。
+稳定前缀逐字节不变，可持续命中提示词缓存，AI 改动一段后也无需重新发送并重新处理整个文件。
+
+基准按会话记录；新一轮对话开始、或变化量超过完整渲染的 DELTA_MAX_RATIO 时，以当前内容作为新的基准
+变化描述与基准一起计入已加载文件的上下文预算（见 context_budget.LoadedFilesSection），两者合计超出预算时本次改为发送当前内容
+"""
+import difflib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.settings.settings import settings
+from backend.ai_agent.utils.file_utils import RenderedFile
+from backend.ai_agent.utils.token_utils import estimate_text_tokens
+
+logger = logging.getLogger(__name__)
+
+# 变化量超过完整渲染的该比例时直接发送完整内容
+DELTA_MAX_RATIO = 0.5
+# 记录基准的会话数上限
+THREAD_BASE_SIZE = 32
+
+DELTA_HEADER = (
+    "【已加载文件变化】以下为本轮对话中已加载文件相对上方 [额外文件内容] 的变化，段落ID以此为准："
+    "未列出的段落内容不变，序号按“序号变化”换算（哈希不变）"
+)
+
+
+class _ThreadBase:
+    """会话当前轮次的基准渲染"""
+
+    __slots__ = ("turn_id", "files")
+
+    def __init__(self, turn_id: str):
+        self.turn_id = turn_id
+        self.files: Dict[str, RenderedFile] = {}
+
+
+def _format_lines(rendered: RenderedFile, start: int, end: int) -> List[str]:
+    return [f"{i + 1}-{rendered.hashes[i]}|{rendered.paragraphs[i]}" for i in range(start, end)]
+
+
+def _paragraph_range(start: int, end: int) -> str:
+    return f"第 {start + 1} 段" if end - start == 1 else f"第 {start + 1}-{end} 段"
+
+
+def render_delta(path: str, base: RenderedFile, current: RenderedFile) -> str:
+    """
+    生成文件相对基准的段落级变化
+
+    Returns:
+        变化描述文本，内容相同时返回空字符串
+    """
+    old, new = base.paragraphs, current.paragraphs
+    # 先去掉相同的首尾，只对中间部分做差异比较（单段修改时几乎没有开销）
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > prefix and new_end > prefix and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    if prefix == old_end and prefix == new_end:
+        return ""
+
+    matcher = difflib.SequenceMatcher(None, old[prefix:old_end], new[prefix:new_end], autojunk=False)
+    lines = [f"[额外文件变化 - {path}]（原 {len(old)} 段，现 {len(new)} 段）:"]
+    shifts = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        i1, i2, j1, j2 = i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+        if tag == "equal":
+            if i1 != j1:
+                shifts.append((i1, i2, j1, j2))
+        elif tag == "delete":
+            lines.append(f"删除原{_paragraph_range(i1, i2)}")
+        elif tag == "insert":
+            lines.append(f"在原第 {i1} 段之后插入：" if i1 else "在开头插入：")
+            lines.extend(_format_lines(current, j1, j2))
+        else:
+            lines.append(f"原{_paragraph_range(i1, i2)}替换为：")
+            lines.extend(_format_lines(current, j1, j2))
+    # 相同的结尾部分序号也可能偏移
+    if old_end < len(old) and old_end != new_end:
+        shifts.append((old_end, len(old), new_end, len(new)))
+    if shifts:
+        lines.append("序号变化：" + "，".join(
+            f"原{_paragraph_range(i1, i2)} → 现{_paragraph_range(j1, j2)}" for i1, i2, j1, j2 in shifts
+        ))
+    return "\n".join(lines)
+
+
+class LoadedFileBaseTracker:
+    """按会话记录已加载文件的基准渲染"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads: "OrderedDict[str, _ThreadBase]" = OrderedDict()
+
+    def _entry(self, thread_id: str, turn_id: str) -> _ThreadBase:
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            if entry is None or entry.turn_id != turn_id:
+                # 新一轮对话：以当前内容重新建立基准
+                entry = self._threads[thread_id] = _ThreadBase(turn_id)
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > THREAD_BASE_SIZE:
+                self._threads.popitem(last=False)
+            return entry
+
+    def resolve(
+        self,
+        thread_id: Optional[str],
+        turn_id: Optional[str],
+        files: Sequence[Tuple[str, RenderedFile]],
+    ) -> Tuple[List[Tuple[str, RenderedFile]], str]:
+        """
+        确定本次调用发送的已加载文件
+
+        Args:
+            thread_id: 会话ID
+            turn_id: 本轮对话标识（最后一条用户消息的ID）
+            files: 已加载文件的当前渲染
+
+        Returns:
+            (放入稳定上下文的渲染（基准或当前内容）, 变化描述（无变化时为空字符串）)
+        """
+        if not thread_id or not turn_id or not settings.get_config("loadedFilesDelta", default=True):
+            return list(files), ""
+
+        entry = self._entry(thread_id, turn_id)
+        result = []
+        deltas = []
+        for path, current in files:
+            base = entry.files.get(path)
+            # 渲染缓存命中时为同一对象，文件未变化
+            if base is None or base is current:
+                entry.files[path] = current
+                result.append((path, current))
+                continue
+            delta = render_delta(path, base, current)
+            if delta and estimate_text_tokens(delta) > current.tokens * DELTA_MAX_RATIO:
+                # 变化太大，增量不再划算，以当前内容作为新的基准
+                entry.files[path] = current
+                result.append((path, current))
+                continue
+            result.append((path, base))
+            if delta:
+                deltas.append(delta)
+
+        # 已卸载的文件不再保留基准
+        loaded_paths = {path for path, _ in files}
+        for path in [path for path in entry.files if path not in loaded_paths]:
+            del entry.files[path]
+
+        if not deltas:
+            return result, ""
+        logger.debug(f"会话 {thread_id} 已加载文件使用增量上下文：{len(deltas)} 个文件有变化")
+        return result, "\n\n".join([DELTA_HEADER, *deltas])
+
+
+# 全局单例
+loaded_file_tracker = LoadedFileBaseTracker()
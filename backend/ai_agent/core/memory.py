@@ -0,0 +1,303 @@
+"""
+长期记忆
+记忆保存在共享的 AsyncSqliteStore（store.db）中，使用 longTermMemory.knowledgeBase 指定知识库的嵌入模型
+（通过 prepare_emb 创建）生成向量，由 store 内置的 sqlite-vec 索引做向量检索。
+
+- 写入：remember 只入队不等待，后台按批次（batchSize / flushInterval）合并写入，
+  同一批次的记忆在 store 中只调用一次嵌入模型
+- 检索：recall_for_turn 受 searchTimeout 限制，超时或出错时返回空结果，不会拖住本轮生成
+- 按轮次：同一轮对话（最后一条用户消息不变）的工具循环中，检索结果复用第一次成功检索的结果，
+  记住指令只提交一次
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import PutOp
+
+from backend.settings.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 默认检索条数、检索超时（秒）、写入批大小与最长等待时间（秒）
+DEFAULT_SEARCH_LIMIT = 5
+DEFAULT_SEARCH_TIMEOUT = 1.5
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_FLUSH_INTERVAL = 1.0
+# 向量维度仅用于索引配置说明，sqlite-vec 按实际向量长度存储
+DEFAULT_DIMS = 1024
+# 记录本轮状态的会话数上限
+TURN_STATE_SIZE = 32
+# 触发写入长期记忆的关键词
+REMEMBER_KEYWORDS = ("记住", "记录", "remember")
+
+
+def _memory_config() -> Dict[str, Any]:
+    config = settings.get_config("longTermMemory", default={}) or {}
+    return {
+        "knowledgeBase": config.get("knowledgeBase"),
+        "searchLimit": int(config.get("searchLimit", DEFAULT_SEARCH_LIMIT)),
+        "searchTimeout": float(config.get("searchTimeout", DEFAULT_SEARCH_TIMEOUT)),
+        "batchSize": max(int(config.get("batchSize", DEFAULT_BATCH_SIZE)), 1),
+        "flushInterval": float(config.get("flushInterval", DEFAULT_FLUSH_INTERVAL)),
+    }
+
+
+def _embedding_config() -> Optional[Dict[str, Any]]:
+    """获取记忆使用的知识库嵌入配置，未配置时返回 None"""
+    kb_id = _memory_config()["knowledgeBase"]
+    kb_config = settings.get_config("knowledgeBase", kb_id) if kb_id else None
+    if not kb_config:
+        return None
+    return {"provider": kb_config.get("provider", ""), "model": kb_config.get("model", "")}
+
+
+# 部分 Python 发行版的 sqlite3 不支持加载扩展，此时无法使用 sqlite-vec，记忆只保存不做向量检索
+VECTOR_SEARCH_AVAILABLE = hasattr(sqlite3.Connection, "enable_load_extension")
+
+
+def embedding_signature() -> Optional[str]:
+    """当前记忆嵌入模型的标识（提供商/模型），随记忆一起保存，检索时只匹配同一模型生成的向量
+
+    未配置记忆知识库或不支持向量检索时返回 None
+    """
+    if not VECTOR_SEARCH_AVAILABLE:
+        return None
+    config = _embedding_config()
+    return f"{config['provider']}/{config['model']}" if config else None
+
+
+class MemoryEmbeddings(Embeddings):
+    """按当前配置延迟创建嵌入模型的代理，切换记忆知识库无需重新打开 store"""
+
+    def __init__(self):
+        self._embeddings: Optional[Embeddings] = None
+        self._signature: Optional[str] = None
+
+    def _get(self) -> Embeddings:
+        config = _embedding_config()
+        if config is None:
+            raise RuntimeError("未配置长期记忆使用的知识库（longTermMemory.knowledgeBase）")
+        signature = f"{config['provider']}/{config['model']}"
+        if self._embeddings is None or self._signature != signature:
+            from backend.ai_agent.embedding.emb_service import prepare_emb
+
+            provider = config["provider"]
+            provider_config = settings.get_config("provider", provider, default={})
+            self._embeddings = prepare_emb(
+                provider=provider,
+                model_id=config["model"],
+                embedding_url=provider_config.get("url", ""),
+                embedding_api_key=settings.get_provider_key(provider)
+            )
+            self._signature = signature
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._get().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._get().embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # 创建嵌入模型（本地模型需加载文件）和嵌入计算都可能阻塞，放到线程中执行
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+def memory_index_config() -> Optional[Dict[str, Any]]:
+    """共享 store 的向量索引配置，只索引记忆的 data 字段（不支持向量检索时返回 None）"""
+    if not VECTOR_SEARCH_AVAILABLE:
+        logger.warning("当前 Python 的 sqlite3 不支持加载扩展，长期记忆将不进行向量检索")
+        return None
+    return {
+        "dims": DEFAULT_DIMS,
+        "embed": MemoryEmbeddings(),
+        "text_fields": ["data"],
+    }
+
+
+class _MemoryTurn:
+    """会话当前轮次的记忆状态"""
+
+    __slots__ = ("turn_id", "content", "memories", "remembered")
+
+    def __init__(self, turn_id: str, content: str = ""):
+        self.turn_id = turn_id
+        # 编辑消息后重新生成时消息ID不变，需同时比较内容判断是否为新的一轮
+        self.content = content
+        # 本轮成功检索到的记忆（None 表示尚未成功检索）
+        self.memories: Optional[List[str]] = None
+        self.remembered = False
+
+
+class MemoryService:
+    """长期记忆读写：后台批量写入，限时检索"""
+
+    def __init__(self):
+        self._queue: "asyncio.Queue[Tuple[Tuple[str, ...], str, Dict[str, Any]]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # 后台任务正在攒批/写入的记忆，关闭服务时与队列剩余部分一起写入（按记忆ID覆盖写，重复写入无副作用）
+        self._batch: List[Tuple[Tuple[str, ...], str, Dict[str, Any]]] = []
+        # 按会话记录本轮状态（缓存的图被多个会话共用，状态按会话ID区分，数量有上限）
+        self._turns: "OrderedDict[str, _MemoryTurn]" = OrderedDict()
+
+    def _get_turn(self, thread_id: Optional[str], turn_id: Optional[str], content: str) -> _MemoryTurn:
+        """获取会话本轮状态，新一轮对话开始（消息ID或内容变化）时重新创建；缺少会话或轮次标识时返回不保留的临时状态"""
+        if not thread_id or not turn_id:
+            return _MemoryTurn("", content)
+        turn = self._turns.get(thread_id)
+        if turn is None or turn.turn_id != turn_id or turn.content != content:
+            turn = self._turns[thread_id] = _MemoryTurn(turn_id, content)
+        self._turns.move_to_end(thread_id)
+        while len(self._turns) > TURN_STATE_SIZE:
+            self._turns.popitem(last=False)
+        return turn
+
+    def remember(self, user_id: str, content: str) -> str:
+        """
+        记录一条记忆（只入队，不等待嵌入和写入）
+
+        Returns:
+            记忆ID
+        """
+        memory_id = str(uuid.uuid4())
+        value = {"data": content, "embedding": embedding_signature()}
+        self._queue.put_nowait((("memories", user_id), memory_id, value))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+        return memory_id
+
+    async def recall_for_turn(self, user_id: str, query: str, thread_id: Optional[str], turn_id: Optional[str]) -> List[str]:
+        """
+        检索本轮的记忆：每轮对话只在第一次成功检索时查询，工具循环中复用
+
+        Args:
+            user_id: 用户ID
+            query: 本轮用户输入
+            thread_id: 会话ID
+            turn_id: 本轮对话标识（最后一条用户消息的ID）
+        """
+        turn = self._get_turn(thread_id, turn_id, query)
+        if turn.memories is None:
+            # 超时或出错时不缓存，下次调用重新检索
+            turn.memories = await self._search(user_id, query)
+        return turn.memories or []
+
+    def remember_turn(self, user_id: str, content: str, thread_id: Optional[str], turn_id: Optional[str]) -> Optional[str]:
+        """
+        本轮用户输入包含记住指令时写入长期记忆，每轮只提交一次
+
+        Args:
+            user_id: 用户ID
+            content: 本轮用户输入（最后一条用户消息，不能是工具结果）
+            thread_id: 会话ID
+            turn_id: 本轮对话标识（最后一条用户消息的ID）
+
+        Returns:
+            记忆ID，未提交时返回 None
+        """
+        lowered = content.lower()
+        if not any(keyword in lowered for keyword in REMEMBER_KEYWORDS):
+            return None
+        turn = self._get_turn(thread_id, turn_id, content)
+        if turn.remembered:
+            return None
+        turn.remembered = True
+        return self.remember(user_id, content)
+
+    async def _search(self, user_id: str, query: str) -> Optional[List[str]]:
+        """检索记忆，超时或出错时返回 None"""
+        signature = embedding_signature()
+        if not query or signature is None:
+            return []
+        config = _memory_config()
+        # 延迟导入，persistence 打开 store 时引用本模块的索引配置
+        from backend.ai_agent.core.persistence import sqlite_persistence
+
+        start = time.perf_counter()
+        try:
+            _, store = await sqlite_persistence.get()
+            items = await asyncio.wait_for(
+                store.asearch(("memories", user_id), query=query, filter={"embedding": signature}, limit=config["searchLimit"]),
+                timeout=config["searchTimeout"]
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"检索长期记忆超时（{config['searchTimeout']} 秒），本次不使用记忆")
+            return None
+        except Exception as e:
+            logger.warning(f"检索长期记忆出错: {type(e).__name__}: {e}")
+            return None
+        logger.debug(f"检索到 {len(items)} 条记忆，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+        return [item.value.get("data", "") for item in items]
+
+    async def stop(self) -> None:
+        """服务关闭时写入队列中剩余的记忆"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        batch, self._batch = self._batch, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=60)
+            except asyncio.TimeoutError:
+                # 长时间没有新记忆，结束后台任务，下次写入时重新启动
+                return
+            config = _memory_config()
+            batch = self._batch = [item]
+            deadline = time.monotonic() + config["flushInterval"]
+            # 攒批：达到批大小或等待超过 flushInterval 后写入
+            while len(batch) < config["batchSize"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+            self._batch = []
+
+    async def _write(self, batch: List[Tuple[Tuple[str, ...], str, Dict[str, Any]]]) -> None:
+        """批量写入记忆；嵌入失败时不建立向量索引，保证记忆内容不丢失"""
+        # 延迟导入，persistence 打开 store 时引用本模块的索引配置
+        from backend.ai_agent.core.persistence import sqlite_persistence
+
+        _, store = await sqlite_persistence.get()
+        ops = [
+            PutOp(namespace, key, value, index=None if value.get("embedding") else False)
+            for namespace, key, value in batch
+        ]
+        try:
+            await store.abatch(ops)
+            logger.info(f"已写入 {len(ops)} 条长期记忆")
+        except Exception as e:
+            logger.warning(f"写入长期记忆时嵌入失败，改为不建立向量索引: {type(e).__name__}: {e}")
+            try:
+                await store.abatch([
+                    PutOp(namespace, key, {**value, "embedding": None}, index=False)
+                    for namespace, key, value in batch
+                ])
+            except Exception as e:
+                logger.error(f"写入长期记忆失败: {type(e).__name__}: {e}")
+
+
+# 全局单例
+memory_service = MemoryService()
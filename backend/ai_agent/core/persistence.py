@@ -0,0 +1,88 @@
+"""
+进程级 SQLite 持久化连接
+检查点库（checkpoints.db）与长期记忆库（store.db）在进程内各保持一个连接，
+由 FastAPI 生命周期打开与关闭，所有请求共享，避免每次请求重新建立连接和争抢文件锁
+"""
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Optional, Tuple
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.store.sqlite.aio import AsyncSqliteStore
+
+from backend.settings.settings import settings
+from backend.ai_agent.core.memory import memory_index_config
+
+logger = logging.getLogger(__name__)
+
+# 写锁等待时间（毫秒），同步查询（history_api）与图写入并发时等待而不是直接报 database is locked
+BUSY_TIMEOUT_MS = 5000
+
+
+class SqlitePersistence:
+    """共享的 AsyncSqliteSaver / AsyncSqliteStore
+
+    两者内部都持有 asyncio.Lock，同一连接上的并发请求会被串行化；
+    连接开启 WAL 模式，读（状态查询、历史列表）不会被写阻塞
+    """
+
+    def __init__(self):
+        self._stack: Optional[AsyncExitStack] = None
+        self._checkpointer: Optional[AsyncSqliteSaver] = None
+        self._store: Optional[AsyncSqliteStore] = None
+        self._open_lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        """打开连接并完成建表（重复调用无副作用）"""
+        async with self._open_lock:
+            if self._stack is not None:
+                return
+            checkpoint_db_path = str(settings.DB_DIR) + "/checkpoints.db"
+            store_db_path = str(settings.DB_DIR) + "/store.db"
+
+            stack = AsyncExitStack()
+            try:
+                checkpointer = await stack.enter_async_context(AsyncSqliteSaver.from_conn_string(checkpoint_db_path))
+                # 长期记忆向量索引，嵌入模型在首次写入/检索时按配置创建
+                store = await stack.enter_async_context(
+                    AsyncSqliteStore.from_conn_string(store_db_path, index=memory_index_config())
+                )
+                for conn in (checkpointer.conn, store.conn):
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+                await checkpointer.setup()
+                await store.setup()
+            except BaseException:
+                await stack.aclose()
+                raise
+
+            self._stack = stack
+            self._checkpointer = checkpointer
+            self._store = store
+            logger.info("已打开检查点与长期记忆数据库连接")
+
+    async def close(self) -> None:
+        """关闭连接（服务关闭时调用）"""
+        async with self._open_lock:
+            if self._stack is None:
+                return
+            await self._stack.aclose()
+            self._stack = None
+            self._checkpointer = None
+            self._store = None
+            logger.info("已关闭检查点与长期记忆数据库连接")
+
+    async def get(self) -> Tuple[AsyncSqliteSaver, AsyncSqliteStore]:
+        """获取共享的 checkpointer 和 store，未打开时自动打开
+
+        Returns:
+            (checkpointer, store)
+        """
+        if self._stack is None:
+            await self.open()
+        return self._checkpointer, self._store
+
+
+# 全局单例
+sqlite_persistence = SqlitePersistence()
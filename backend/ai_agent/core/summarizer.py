@@ -0,0 +1,156 @@
+"""
+增量分层总结
+只总结摘要水位线（State.summary_watermark，最后一条已纳入摘要的消息ID）之后的新消息，并合并进已有摘要；
+新消息超过单次总结的 token 预算时按消息边界分块，各块并发总结（map），再逐层合并为一份摘要（reduce），
+单次请求的长度始终受预算约束，重复总结的开销只与新增消息数量相关
+"""
+import asyncio
+import json
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.constants import TAG_NOSTREAM
+
+from backend.ai_agent.utils.token_utils import count_message_tokens, estimate_text_tokens, get_calibration
+
+# 单次总结请求的输入预算占上下文长度的比例（剩余部分留给提示词与输出）
+SUMMARY_CHUNK_RATIO = 0.5
+# 单次总结请求的输入预算下限
+MIN_CHUNK_TOKENS = 2000
+# 分块总结的并发数
+SUMMARY_CONCURRENCY = 4
+
+EXTEND_SUMMARY_PROMPT = (
+    "This is a summary of the conversation to date: {summary}\n\n"
+    "Extend the summary by taking into account the new messages above:"
+)
+CREATE_SUMMARY_PROMPT = "Create a summary of the conversation above:"
+CHUNK_SUMMARY_PROMPT = (
+    "The above is one excerpt of a longer conversation. "
+    "Summarize this excerpt, keeping every fact, decision and open task it contains:"
+)
+MERGE_SUMMARIES_PROMPT = (
+    "The above are summaries of consecutive parts of a conversation, in order. "
+    "Merge them into a single summary, keeping every fact, decision and open task:"
+)
+
+
+def summary_chunk_tokens(max_tokens: Optional[int], model: Optional[str]) -> int:
+    """根据模式的上下文长度计算单次总结请求的输入预算（估算 token，已按模型校准）"""
+    if not max_tokens:
+        return MIN_CHUNK_TOKENS
+    budget = max_tokens * SUMMARY_CHUNK_RATIO / get_calibration(model)
+    return max(int(budget), MIN_CHUNK_TOKENS)
+
+
+def unsummarized_start(messages: Sequence[BaseMessage], watermark: Optional[str]) -> int:
+    """
+    获取尚未纳入摘要的第一条消息的下标
+
+    水位线消息已被删除（如自动总结删除了已总结的消息）或不存在时，全部消息都视为新消息
+    """
+    if watermark:
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index].id == watermark:
+                return index + 1
+    return 0
+
+
+def _render_message(message: BaseMessage) -> str:
+    """把消息渲染为对话记录中的一段文本（工具调用与结果也以文本形式呈现，避免分块后消息顺序不合法）"""
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(
+            block if isinstance(block, str) else block.get("text", "")
+            for block in content
+            if isinstance(block, str) or (isinstance(block, dict) and block.get("type") == "text")
+        )
+    text = str(content or "")
+    if isinstance(message, HumanMessage):
+        return f"[用户]: {text}"
+    if isinstance(message, ToolMessage):
+        return f"[工具结果 {message.name or ''}]: {text}"
+    if isinstance(message, AIMessage):
+        parts = [f"[AI]: {text}"] if text else []
+        for call in message.tool_calls:
+            parts.append(f"[AI 调用工具 {call['name']}]: {json.dumps(call['args'], ensure_ascii=False)}")
+        return "\n".join(parts)
+    return f"[{message.type}]: {text}"
+
+
+def _chunk_texts(texts: Sequence[str], token_counts: Sequence[int], chunk_tokens: int) -> List[str]:
+    """按顺序把文本段打包为不超过预算的块；单段超出预算时截断（按最坏情况每字符 1 token）"""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text, tokens in zip(texts, token_counts):
+        if tokens > chunk_tokens:
+            text = text[:chunk_tokens] + "\n……（内容过长，已截断）"
+            tokens = chunk_tokens
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def _map_chunks(model, chunks: Sequence[str], prompt: str) -> List[str]:
+    """并发总结各块，结果保持原顺序；中间结果不进入流式输出"""
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def summarize_chunk(chunk: str) -> str:
+        async with semaphore:
+            response = await model.ainvoke(
+                [HumanMessage(content=chunk), HumanMessage(content=prompt)],
+                config={"tags": [TAG_NOSTREAM]}
+            )
+            return str(response.content)
+
+    return list(await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks)))
+
+
+async def summarize_incremental(
+    model,
+    new_messages: Sequence[BaseMessage],
+    summary: str,
+    chunk_tokens: int,
+) -> str:
+    """
+    把新消息合并进已有摘要
+
+    Args:
+        model: 总结模型（不绑定工具）
+        new_messages: 水位线之后的新消息
+        summary: 已有摘要（可为空）
+        chunk_tokens: 单次总结请求的输入预算
+
+    Returns:
+        合并后的摘要
+    """
+    if not new_messages:
+        return summary
+
+    texts = [_render_message(message) for message in new_messages]
+    token_counts = [count_message_tokens(message) for message in new_messages]
+    # 已有摘要与新内容一起发送，预算中扣除摘要部分
+    content_budget = max(chunk_tokens - estimate_text_tokens(summary), MIN_CHUNK_TOKENS // 2)
+    chunks = _chunk_texts(texts, token_counts, content_budget)
+
+    # map：新消息超出单次预算时分块并发总结；reduce：逐层合并分块摘要直到能放进一次请求
+    if len(chunks) > 1:
+        partials = await _map_chunks(model, chunks, CHUNK_SUMMARY_PROMPT)
+        chunks = _chunk_texts(partials, [estimate_text_tokens(text) for text in partials], content_budget)
+        while len(chunks) > 1:
+            partials = await _map_chunks(model, chunks, MERGE_SUMMARIES_PROMPT)
+            merged = _chunk_texts(partials, [estimate_text_tokens(text) for text in partials], content_budget)
+            if len(merged) >= len(chunks):
+                # 合并后没有缩短，直接拼成一块（超出预算的部分截断），避免无限循环
+                merged = _chunk_texts(["\n\n".join(partials)], [content_budget + 1], content_budget)
+            chunks = merged
+
+    prompt = EXTEND_SUMMARY_PROMPT.format(summary=summary) if summary else CREATE_SUMMARY_PROMPT
+    response = await model.ainvoke([HumanMessage(content=chunks[0]), HumanMessage(content=prompt)])
+    return str(response.content)
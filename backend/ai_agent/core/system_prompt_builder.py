@@ -4,33 +4,104 @@
 
 架构说明：
 - 系统提示词 (SystemMessage): 静态核心指令，变化极少
-- 上下文消息 (HumanMessage): 动态环境信息，拼接到消息列表末尾
+- 稳定上下文: 内容不变时逐字节一致的环境信息，缓存友好布局下紧跟系统提示词，构成可缓存的前缀
+- 易变上下文 (HumanMessage): 每轮都可能变化的环境信息，拼接到消息列表末尾
 """
 
+import asyncio
 import os
 import re
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, List, Tuple, Union
 import logging
 
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+
 from backend.settings.settings import settings
-from backend.file.file_service import get_file_tree_for_ai, read_file, resolve_file_path, normalize_to_absolute
+from backend.file.file_service import get_file_tree_for_ai, resolve_file_path, normalize_to_absolute
+from backend.file.ai_file_tree_cache import ai_file_tree_cache
 from backend.ai_agent.embedding import get_all_knowledge_bases, asearch_emb, get_two_step_rag_config
 from backend.ai_agent.skill import get_skill_loader
-from backend.ai_agent.utils.file_utils import split_paragraphs, format_file_with_hashes
-from backend.websocket.handlers.tab_handler import request_tab_state, format_tab_state_for_prompt
+from backend.ai_agent.utils.file_utils import RenderedFile, get_file_signature, get_render_generation, get_rendered_file
+from backend.ai_agent.core.context_budget import LOADED_FILES_DELTA, LoadedFilesSection, RagSection, Section, allocate_context_budget
+from backend.ai_agent.core.loaded_file_delta import loaded_file_tracker
+from backend.websocket.handlers.tab_handler import get_tab_state, get_tab_state_version, format_tab_state_for_prompt
 
 logger = logging.getLogger(__name__)
 
+# 提示词缓存断点标记（Anthropic 格式，LiteLLM 转换为各提供商的缓存参数）
+CACHE_CONTROL = {"type": "ephemeral"}
+CONTEXT_MESSAGE_HEADER = "【系统环境信息 - 此消息由系统自动生成，并非用户发送】"
+STABLE_CONTEXT_HEADER = "【系统环境信息 - 以下内容由系统自动生成】"
+
+# 上下文各部分的超时时间（秒），超时后本轮使用降级内容，不拖慢首个 token
+SECTION_TIMEOUTS = {
+    "skills": 2.0,
+    "knowledge_bases": 2.0,
+    "loaded_skills": 3.0,
+    "loaded_files": 5.0,
+    "file_tree": 5.0,
+    "rag": 8.0,
+}
+DEFAULT_SECTION_TIMEOUT = 5.0
+# 超时或出错时的降级内容（未列出的部分直接省略）
+SECTION_FALLBACKS = {
+    "loaded_files": "[额外文件内容]:\n(读取已加载文件超时或出错，本次省略)",
+    "file_tree": "[当前工作区文件结构]:\n(获取文件树超时或出错，本次省略)",
+}
+# 记录本轮状态的会话数上限
+TURN_STATE_SIZE = 32
+
+# 各部分的本轮快照命中/重新构建次数（所有构建器共享）：{名称: [命中, 重新构建]}
+_section_stats: Dict[str, List[int]] = {}
+
+
+def get_context_section_stats() -> Dict[str, Dict[str, Any]]:
+    """获取上下文各部分的本轮快照命中统计"""
+    return {
+        name: {"hits": hits, "misses": misses, "hitRate": hits / (hits + misses) if hits + misses else 0.0}
+        for name, (hits, misses) in _section_stats.items()
+    }
+
+
+class _TurnState:
+    """会话当前轮次（最后一条用户消息）的上下文快照
+
+    各部分连同构建时的依赖指纹一起保存，同一轮的后续调用中指纹不变的部分直接复用
+    """
+
+    __slots__ = ("turn_id", "user_input", "at_paths_synced", "sections")
+
+    def __init__(self, turn_id: str, user_input: Optional[str] = None):
+        self.turn_id = turn_id
+        # 编辑消息后重新生成时消息ID不变，需同时比较内容判断是否为新的一轮
+        self.user_input = user_input
+        self.at_paths_synced = False
+        # {名称: (依赖指纹, 内容)}，只保存成功构建的内容
+        self.sections: Dict[str, Tuple[Hashable, Union[str, Section]]] = {}
+
 
 class SystemPromptBuilder:
     """系统提示词构建器"""
     
     def __init__(self):
         self.data_dir = settings.DATA_DIR
-        self.file_tree_cache = None
-        self.last_cache_time = None
-        self.cache_timeout = 30  # 缓存30秒
+        # 按会话记录本轮状态：@路径同步每轮只执行一次，上下文各部分在依赖未变化时复用本轮快照
+        self._turns: "OrderedDict[str, _TurnState]" = OrderedDict()
+    
+    def _get_turn_state(self, thread_id: Optional[str], turn_id: Optional[str], user_input: Optional[str]) -> _TurnState:
+        """获取会话本轮状态，新一轮对话开始（消息ID或内容变化）时重新创建；缺少会话或轮次标识时返回不保留的临时状态"""
+        if not thread_id or not turn_id:
+            return _TurnState("", user_input)
+        state = self._turns.get(thread_id)
+        if state is None or state.turn_id != turn_id or state.user_input != user_input:
+            state = self._turns[thread_id] = _TurnState(turn_id, user_input)
+        self._turns.move_to_end(thread_id)
+        while len(self._turns) > TURN_STATE_SIZE:
+            self._turns.popitem(last=False)
+        return state
     
     def _extract_at_paths(self, user_input: str) -> List[str]:
         """从用户输入中提取 @+路径 模式的路径列表
@@ -98,19 +169,22 @@ class SystemPromptBuilder:
                 logger.info(f"没有有效的 @路径 需要添加到 {mode} 模式")
                 return
             
-            # 获取当前模式的 additionalInfo
-            additional_files = settings.get_config("mode", mode, "additionalInfo", default=[])
-            
-            if not isinstance(additional_files, list):
-                additional_files = []
-            
-            # 过滤出不在 additionalInfo 中的新路径
-            new_paths = [p for p in existing_abs_paths if p not in additional_files]
+            # 在同一个配置事务中读取并追加 additionalInfo，避免覆盖并发写入
+            with settings.config_transaction() as config:
+                mode_config = config.setdefault("mode", {}).setdefault(mode, {})
+                additional_files = mode_config.get("additionalInfo")
+                
+                if not isinstance(additional_files, list):
+                    additional_files = []
+                
+                # 过滤出不在 additionalInfo 中的新路径
+                new_paths = [p for p in existing_abs_paths if p not in additional_files]
+                
+                if new_paths:
+                    # 将新路径添加到 additionalInfo
+                    mode_config["additionalInfo"] = additional_files + new_paths
             
             if new_paths:
-                # 将新路径添加到 additionalInfo
-                updated_list = additional_files + new_paths
-                settings.update_config(updated_list, "mode", mode, "additionalInfo")
                 logger.info(f"已将 @路径 添加到 {mode} 模式的 additionalInfo: {new_paths}")
             else:
                 logger.info(f"所有 @路径 已存在于 {mode} 模式的 additionalInfo 中")
@@ -118,51 +192,53 @@ class SystemPromptBuilder:
         except Exception as e:
             logger.error(f"同步 @路径 到 additionalInfo 失败: {e}")
     
-    async def _get_loaded_files_content(self, mode: str) -> str:
+    async def _get_loaded_files_content(
+        self,
+        mode: str,
+        thread_id: Optional[str] = None,
+        turn_id: Optional[str] = None
+    ) -> Union[str, LoadedFilesSection]:
         """获取已加载文件的内容（用于末尾附加消息）
         
+        同一轮对话的后续调用中，文件保持本轮的基准渲染，变化部分以增量形式附加到易变上下文
+        
         Args:
             mode: 模式名称
+            thread_id: 会话ID
+            turn_id: 本轮对话标识（最后一条用户消息的ID）
             
         Returns:
-            格式化的文件内容字符串（带段落编号）
+            已加载文件（带段落编号，由预算分配决定是否截取窗口），没有文件时返回提示字符串
         """
-        try:
-            # 从配置中获取当前模式的 additionalInfo 文件列表
-            loaded_files = settings.get_config("mode", mode, "additionalInfo", default=[])
-            
-            # 如果没有加载的文件，返回空字符串
-            if not loaded_files or not isinstance(loaded_files, list):
-                return "[额外文件内容]:\n暂未加载文件"
-            
-            # 构建格式化的文件内容
-            file_contents = []
-            
-            for file_path in loaded_files:
-                if not isinstance(file_path, str):
-                    continue
-                
-                try:
-                    # 使用 file_service 的 read_file 读取文件内容
-                    content = await read_file(file_path)
-                    
-                    if content:
-                        # 使用 format_file_with_hashes 格式化内容
-                        formatted_content = format_file_with_hashes(content)
-                        
-                        file_contents.append(f"[额外文件 - {file_path}]:\n{formatted_content}")
-                    else:
-                        logger.warning(f"文件内容为空或文件不存在: {file_path}")
-                except Exception as e:
-                    logger.error(f"读取文件失败 {file_path}: {e}")
-            
-            if file_contents:
-                return f"[额外文件内容]:\n\n{'\n\n'.join(file_contents)}"
-            else:
-                return "[额外文件内容]:\n暂未加载文件"
+        # 从配置中获取当前模式的 additionalInfo 文件列表
+        loaded_files = settings.get_config("mode", mode, "additionalInfo", default=[])
+        
+        # 如果没有加载的文件，返回空字符串
+        if not loaded_files or not isinstance(loaded_files, list):
+            return "[额外文件内容]:\n暂未加载文件"
+        
+        async def load_file(file_path: str) -> Optional[Tuple[str, RenderedFile]]:
+            try:
+                # 文件未变化时直接使用缓存的 "段落号-短哈希|内容" 文本
+                rendered = await get_rendered_file(file_path)
                 
-        except Exception as e:
-            logger.error(f"获取 additionalInfo 文件内容失败: {e}")
+                if rendered.size:
+                    return file_path, rendered
+                logger.warning(f"文件内容为空或文件不存在: {file_path}")
+            except Exception as e:
+                logger.error(f"读取文件失败 {file_path}: {e}")
+            return None
+        
+        # 并发读取各文件，结果保持 additionalInfo 中的顺序
+        results = await asyncio.gather(*(
+            load_file(file_path) for file_path in loaded_files if isinstance(file_path, str)
+        ))
+        loaded = [result for result in results if result]
+        
+        if loaded:
+            files, delta = loaded_file_tracker.resolve(thread_id, turn_id, loaded)
+            return LoadedFilesSection(files, delta)
+        else:
             return "[额外文件内容]:\n暂未加载文件"
     
     def _get_skills_info(self, mode: str) -> str:
@@ -174,26 +250,21 @@ class SystemPromptBuilder:
         Returns:
             格式化的 Skills 简要信息字符串
         """
-        try:
-            # 从配置中获取当前模式的 skills 列表
-            skill_names = settings.get_config("mode", mode, "skills", default=[])
-            
-            if not skill_names or not isinstance(skill_names, list):
-                return ""
-            
-            # 使用 SkillLoader 加载并过滤 Skills
-            skill_loader = get_skill_loader()
-            skills = skill_loader.filter_skills(skill_names)
-            
-            if not skills:
-                return ""
-            
-            # 格式化 Skills 简要信息（只显示名称和描述）
-            return skill_loader.format_skills_for_prompt(skills)
-            
-        except Exception as e:
-            logger.error(f"获取 Skills 信息失败: {e}")
+        # 从配置中获取当前模式的 skills 列表
+        skill_names = settings.get_config("mode", mode, "skills", default=[])
+        
+        if not skill_names or not isinstance(skill_names, list):
+            return ""
+        
+        # 使用 SkillLoader 加载并过滤 Skills
+        skill_loader = get_skill_loader()
+        skills = skill_loader.filter_skills(skill_names)
+        
+        if not skills:
             return ""
+        
+        # 格式化 Skills 简要信息（只显示名称和描述）
+        return skill_loader.format_skills_for_prompt(skills)
     
     async def _get_loaded_skills_content(self, mode: str) -> str:
         """获取已加载 Skill 的内容（用于末尾附加消息）
@@ -204,53 +275,41 @@ class SystemPromptBuilder:
         Returns:
             格式化的 Skill 内容字符串（格式：[Skill directory: path/] + content）
         """
-        try:
-            # 从配置中获取当前模式的 skillPaths 列表
-            skill_paths = settings.get_config("mode", mode, "skillPaths", default=[])
-            
-            # 如果没有加载的 Skill，返回空字符串
-            if not skill_paths or not isinstance(skill_paths, list):
-                return "未加载任何skill"
-            
-            # 加载所有可用的 skills
-            skill_loader = get_skill_loader()
-            all_skills = skill_loader.load_all_skills()
-            
-            # 构建 skill_path 到 skill 对象的映射（通过 file_path 匹配）
-            skill_by_path = {}
-            for skill in all_skills.values():
-                skill_file_path = str(skill.file_path.resolve())
-                skill_by_path[skill_file_path] = skill
-            
-            # 构建格式化的 Skill 内容
-            skill_contents = []
+        # 从配置中获取当前模式的 skillPaths 列表
+        skill_paths = settings.get_config("mode", mode, "skillPaths", default=[])
+        
+        # 如果没有加载的 Skill，返回空字符串
+        if not skill_paths or not isinstance(skill_paths, list):
+            return "未加载任何skill"
+        
+        # Skill 注册表（按 SKILL.md 路径直接查找，未变化时不重新读取）
+        skill_loader = get_skill_loader()
+        
+        # 构建格式化的 Skill 内容
+        skill_contents = []
+        
+        for skill_path in skill_paths:
+            if not isinstance(skill_path, str):
+                continue
             
-            for skill_path in skill_paths:
-                if not isinstance(skill_path, str):
-                    continue
+            try:
+                # 通过路径查找对应的 skill 对象
+                skill = skill_loader.get_skill_by_path(skill_path)
                 
-                try:
-                    # 通过路径查找对应的 skill 对象
-                    skill = skill_by_path.get(skill_path)
+                if skill:
+                    skill_dir = str(skill.base_dir.resolve())
+                    content = skill.content
                     
-                    if skill:
-                        skill_dir = str(skill.base_dir.resolve())
-                        content = skill.content
-                        
-                        # 格式：[Skill directory: path/] + content
-                        skill_contents.append(f"[Skill directory: {skill_dir}/]\n\n{content}")
-                    else:
-                        logger.warning(f"未找到 Skill 对象: {skill_path}")
-                except Exception as e:
-                    logger.error(f"读取 Skill 失败 {skill_path}: {e}")
-            
-            if skill_contents:
-                return f"[额外 Skill 内容]:\n\n{'\n\n'.join(skill_contents)}"
-            else:
-                return ""
-                
-        except Exception as e:
-            logger.error(f"获取已加载 Skill 内容失败: {e}")
+                    # 格式：[Skill directory: path/] + content
+                    skill_contents.append(f"[Skill directory: {skill_dir}/]\n\n{content}")
+                else:
+                    logger.warning(f"未找到 Skill 对象: {skill_path}")
+            except Exception as e:
+                logger.error(f"读取 Skill 失败 {skill_path}: {e}")
+        
+        if skill_contents:
+            return f"[额外 Skill 内容]:\n\n{'\n\n'.join(skill_contents)}"
+        else:
             return ""
     
     def _get_knowledge_bases_info(self) -> str:
@@ -259,79 +318,69 @@ class SystemPromptBuilder:
         Returns:
             格式化的知识库列表信息字符串
         """
-        try:
-            knowledge_bases = get_all_knowledge_bases()
-            
-            if not knowledge_bases:
-                return ""
-            
-            # 构建格式化的知识库列表
-            kb_parts = []
-            for kb_id, kb_config in knowledge_bases.items():
-                name = kb_config.get("name", "")
-                
-                if name:
-                    kb_parts.append(f"id: {kb_id}\nname: {name}")
+        knowledge_bases = get_all_knowledge_bases()
+        
+        if not knowledge_bases:
+            return ""
+        
+        # 构建格式化的知识库列表
+        kb_parts = []
+        for kb_id, kb_config in knowledge_bases.items():
+            name = kb_config.get("name", "")
             
-            if kb_parts:
-                return "\n\n".join(kb_parts)
-            else:
-                return ""
-                
-        except Exception as e:
-            logger.error(f"获取知识库列表信息失败: {e}")
+            if name:
+                kb_parts.append(f"id: {kb_id}\nname: {name}")
+        
+        if kb_parts:
+            return "\n\n".join(kb_parts)
+        else:
             return ""
     
-    async def _perform_rag_search(self, user_input: str) -> str:
+    async def _perform_rag_search(self, user_input: str) -> Union[str, RagSection]:
         """执行RAG检索，获取相关文档内容
         
         Args:
             user_input: 用户输入文本，作为检索查询
             
         Returns:
-            格式化的RAG检索结果字符串
+            RAG检索结果（按相似度从高到低，由预算分配决定保留条数），未检索到时返回空字符串；
+            检索出错时抛出异常（由 _run_section 降级，且不写入本轮快照）
         """
-        try:
-            # 获取两步RAG配置
-            rag_config = get_two_step_rag_config()
-            kb_id = rag_config.get("id")
-            kb_name = rag_config.get("name")
-            
-            if not kb_id:
-                logger.info("未配置两步RAG知识库，跳过RAG检索")
-                return ""
-            
-            # 验证知识库是否存在
-            knowledge_bases = get_all_knowledge_bases()
-            if kb_id not in knowledge_bases:
-                logger.warning(f"配置的知识库 {kb_name} (ID: {kb_id}) 不存在，跳过RAG检索")
-                return ""
-            logger.info(f"使用配置的知识库进行RAG检索: {kb_name} (ID: {kb_id})")
+        # 获取两步RAG配置
+        rag_config = get_two_step_rag_config()
+        kb_id = rag_config.get("id")
+        kb_name = rag_config.get("name")
+        
+        if not kb_id:
+            logger.info("未配置两步RAG知识库，跳过RAG检索")
+            return ""
+        
+        # 验证知识库是否存在
+        knowledge_bases = get_all_knowledge_bases()
+        if kb_id not in knowledge_bases:
+            logger.warning(f"配置的知识库 {kb_name} (ID: {kb_id}) 不存在，跳过RAG检索")
+            return ""
+        logger.info(f"使用配置的知识库进行RAG检索: {kb_name} (ID: {kb_id})")
 
-            # 执行异步检索
-            results = await asearch_emb(
-                collection_name=kb_id,
-                search_input=user_input
-            )
-            
-            if not results:
-                logger.info("RAG检索未返回结果")
-                return ""
-            
-            # 格式化检索结果
-            rag_parts = []
-            for doc, score in results:
-                filename = doc.metadata.get('original_filename', '未知文件')
-                rag_parts.append(f"[来源: {filename}, 相似度: {score:.4f}]\n{doc.page_content}")
-            
-            rag_content = "\n\n".join(rag_parts)
-            logger.info(f"RAG检索完成，共找到 {len(results)} 条相关文档")
-            
-            return rag_content
-            
-        except Exception as e:
-            logger.error(f"RAG检索失败: {e}")
+        # 执行异步检索
+        results = await asearch_emb(
+            collection_name=kb_id,
+            search_input=user_input
+        )
+        
+        if not results:
+            logger.info("RAG检索未返回结果")
             return ""
+        
+        # 格式化检索结果
+        rag_parts = []
+        for doc, score in results:
+            filename = doc.metadata.get('original_filename', '未知文件')
+            rag_parts.append(f"[来源: {filename}, 相似度: {score:.4f}]\n{doc.page_content}")
+        
+        logger.info(f"RAG检索完成，共找到 {len(results)} 条相关文档")
+        
+        return RagSection(rag_parts)
     
     async def get_file_tree_content(self) -> str:
         """获取格式化的文件树内容
@@ -345,30 +394,32 @@ class SystemPromptBuilder:
               - 文件2.txt
             - 文件2.txt
             ```
-        """
-        try:
-            # 获取data目录路径
-            data_path = self.data_dir
-            
-            # 确保data目录存在
-            os.makedirs(data_path, exist_ok=True)
             
-            # 获取文件树（返回 FileTreeResult 对象，包含统计信息）
-            from backend.file.smart_file_tree import format_tree_for_prompt
-            file_tree_result = await get_file_tree_for_ai(data_path, data_path)
-            
-            # 格式化文件树为文本，包含统计信息让AI了解显示范围
-            tree_text = format_tree_for_prompt(file_tree_result, data_path)
-            
-            # 如果文件树为空，显示"暂无文件"
-            if not file_tree_result.tree:
-                tree_text = "[当前工作区文件结构]:\n暂无文件"
-            
-            return tree_text
-            
-        except Exception as e:
-            logger.error(f"获取文件树内容时出错: {e}")
-            return "[当前工作区文件结构]:\n(获取文件树出错)"
+        出错时抛出异常，由 _run_section 使用降级内容（不写入本轮快照，下次调用重新生成）
+        """
+        # 文件监控运行时使用进程级缓存，文件树变化时由文件监控使其失效
+        return await ai_file_tree_cache.get(self._build_file_tree_content)
+    
+    async def _build_file_tree_content(self) -> str:
+        """遍历工作区生成格式化的文件树内容"""
+        # 获取data目录路径
+        data_path = self.data_dir
+        
+        # 确保data目录存在
+        os.makedirs(data_path, exist_ok=True)
+        
+        # 获取文件树（返回 FileTreeResult 对象，包含统计信息）
+        from backend.file.smart_file_tree import format_tree_for_prompt
+        file_tree_result = await get_file_tree_for_ai(data_path, data_path)
+        
+        # 格式化文件树为文本，包含统计信息让AI了解显示范围
+        tree_text = format_tree_for_prompt(file_tree_result, data_path)
+        
+        # 如果文件树为空，显示"暂无文件"
+        if not file_tree_result.tree:
+            tree_text = "[当前工作区文件结构]:\n暂无文件"
+        
+        return tree_text
     
     def _format_tree_to_text(self, nodes: list, indent: int = 0) -> str:
         """将文件树节点格式化为文本
@@ -423,7 +474,7 @@ class SystemPromptBuilder:
             logger.error(f"构建系统提示词时出错: {e}")
             return settings.get_config("mode", mode, "prompt", default="你是一个AI助手，负责为用户解决各种需求。")
     
-    async def build_context_message(
+    async def build_context_segments(
         self,
         mode: Optional[str] = None,
         include_file_tree: bool = True,
@@ -432,11 +483,16 @@ class SystemPromptBuilder:
         include_skills: bool = True,
         user_input: Optional[str] = None,
         enable_rag: bool = True,
-        summary: Optional[str] = None
-    ) -> str:
-        """构建上下文消息内容（将作为末尾HumanMessage附加）
+        summary: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        turn_id: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """构建上下文内容，按变化频率分为稳定部分和易变部分
+        
+        稳定部分（Skills列表、知识库列表、已加载Skill、过往消息总结、已加载文件）在内容不变时逐字节一致，
+        可放在提示词前缀中命中提供商的前缀缓存；易变部分（文件树、标签栏、RAG检索结果）每轮都可能变化，放在末尾
         
-        这部分内容变化频繁，包含动态环境信息
+        同一轮对话（工具循环）中，各部分按依赖指纹复用本轮快照，只重新构建依赖发生变化的部分
         
         Args:
             mode: 对话模式
@@ -444,102 +500,228 @@ class SystemPromptBuilder:
             include_knowledge_bases: 是否包含知识库列表信息
             include_loaded_files: 是否包含已加载文件内容
             include_skills: 是否包含 Skills 信息
-            user_input: 用户输入文本，用于RAG检索
+            user_input: 本轮用户输入文本（最后一条用户消息），用于@路径同步与RAG检索
             enable_rag: 是否启用RAG检索
             summary: 过往消息总结
+            thread_id: 会话ID（用于已加载文件的增量上下文与本轮状态）
+            turn_id: 本轮对话标识（最后一条用户消息的ID）
             
         Returns:
-            上下文消息内容字符串
+            (稳定上下文, 易变上下文) 元组
         """
-        try:
-            context_parts = []
-            
-            # 添加过往消息总结
-            if summary:
-                context_parts.append(f"【过往消息总结】\n{summary}")
-            
-            # 添加 Skills 信息
-            if include_skills:
-                skills_info = self._get_skills_info(mode or "")
-                if skills_info:
-                    context_parts.append(skills_info)
-            
-            # 添加知识库列表信息
-            if include_knowledge_bases:
-                knowledge_bases_info = self._get_knowledge_bases_info()
-                if knowledge_bases_info:
-                    context_parts.append(f"【可用知识库】\n{knowledge_bases_info}")
-            
-            # 添加文件树结构
-            if include_file_tree:
-                file_tree_content = await self.get_file_tree_content()
-                if file_tree_content:
-                    context_parts.append(f"【当前工作区文件结构】\n{file_tree_content}")
-            
-            # 请求并添加标签栏状态
-            tab_state = await request_tab_state()
-            tab_state_content = format_tab_state_for_prompt(tab_state)
-            if tab_state_content:
-                context_parts.append(tab_state_content)
-            
-            # 处理 @路径 同步（如果用户输入中包含 @路径）
-            if user_input and mode:
-                at_paths = self._extract_at_paths(user_input)
-                if at_paths:
-                    self._sync_at_paths_to_additional_info(at_paths, mode)
-            
-            # 添加已加载文件内容
-            if include_loaded_files:
-                loaded_files_content = await self._get_loaded_files_content(mode or "")
-                if loaded_files_content:
-                    context_parts.append(loaded_files_content)
-            
-            # 添加已加载 Skill 内容
-            loaded_skills_content = await self._get_loaded_skills_content(mode or "")
-            if loaded_skills_content:
-                context_parts.append(loaded_skills_content)
-            
-            # 执行RAG检索并添加结果
-            if enable_rag and user_input:
-                rag_content = await self._perform_rag_search(user_input)
-                if rag_content:
-                    context_parts.append(f"【RAG检索结果】\n{rag_content}")
-            
-            # 合并所有部分
-            if context_parts:
-                context_message = "\n\n".join(context_parts)
-                logger.info(f"上下文消息构建完成，包含部分: {len(context_parts)}")
-                return context_message
+        turn = self._get_turn_state(thread_id, turn_id, user_input)
+        # @路径同步会修改 additionalInfo，需在读取已加载文件之前完成；每轮只同步一次，
+        # 工具循环中AI卸载的文件不会被重新加载
+        if user_input and mode and not turn.at_paths_synced:
+            at_paths = self._extract_at_paths(user_input)
+            if at_paths:
+                self._sync_at_paths_to_additional_info(at_paths, mode)
+            turn.at_paths_synced = True
+        
+        # 依赖指纹：配置版本号、Skill 注册表版本号、已加载文件的 mtime/大小、文件监控版本号、标签栏状态版本号
+        config_version = settings.get_config_version()
+        skill_generation = get_skill_loader().get_generation()
+        
+        # 各部分相互独立，并发构建；列表顺序即最终拼接顺序（稳定部分按变化频率由低到高排列）
+        # (名称, 是否属于稳定部分, 依赖指纹（None 表示无法判断，每次重新构建）, 构建函数, 标题前缀)
+        sections = []
+        if include_skills:
+            sections.append(("skills", True, (config_version, skill_generation),
+                             lambda: asyncio.to_thread(self._get_skills_info, mode or ""), ""))
+        if include_knowledge_bases:
+            sections.append(("knowledge_bases", True, (config_version,),
+                             lambda: asyncio.to_thread(self._get_knowledge_bases_info), "【可用知识库】\n"))
+        sections.append(("loaded_skills", True, (config_version, skill_generation),
+                         lambda: self._get_loaded_skills_content(mode or ""), ""))
+        if summary:
+            sections.append(("summary", True, (summary,), lambda: self._resolved(summary), "【过往消息总结】\n"))
+        # 已加载文件在AI编辑文件后会变化，放在稳定部分的最后
+        if include_loaded_files:
+            sections.append(("loaded_files", True, self._loaded_files_fingerprint(mode or "", config_version),
+                             lambda: self._get_loaded_files_content(mode or "", thread_id, turn_id), ""))
+        if include_file_tree:
+            # 文件监控未运行时无法感知文件树变化，每次重新生成
+            tree_generation = ai_file_tree_cache.generation()
+            sections.append(("file_tree", False, None if tree_generation is None else (tree_generation,),
+                             self.get_file_tree_content, "【当前工作区文件结构】\n"))
+        # 标签栏状态由前端推送，直接读取内存中的最新状态
+        sections.append(("tab_state", False, (get_tab_state_version(),),
+                         lambda: self._resolved(format_tab_state_for_prompt(get_tab_state())), ""))
+        if enable_rag and user_input:
+            # 两步RAG每轮只检索一次：工具循环中的配置写入（如加载文件）不会触发重新检索
+            sections.append(("rag", False, (user_input,),
+                             lambda: self._perform_rag_search(user_input), "【RAG检索结果】\n"))
+        
+        start = time.perf_counter()
+        contents: Dict[str, Union[str, Section]] = {}
+        pending = []
+        for name, _, fingerprint, build, _ in sections:
+            stats = _section_stats.setdefault(name, [0, 0])
+            cached = turn.sections.get(name)
+            if fingerprint is not None and cached is not None and cached[0] == fingerprint:
+                contents[name] = cached[1]
+                stats[0] += 1
             else:
-                return ""
-                
+                pending.append((name, fingerprint, build))
+                stats[1] += 1
+        
+        results = await asyncio.gather(*(
+            self._run_section(name, build()) for name, _, build in pending
+        ))
+        
+        timings = {name: "复用" for name in contents}
+        for (name, fingerprint, _), (content, elapsed_ms, status) in zip(pending, results):
+            contents[name] = content
+            timings[name] = f"{elapsed_ms:.0f}ms" + ("" if status == "ok" else f"({status})")
+            # 超时或出错的降级内容不写入快照，下次调用重新构建
+            if status == "ok" and fingerprint is not None:
+                turn.sections[name] = (fingerprint, content)
+            else:
+                turn.sections.pop(name, None)
+        
+        # 按模式的上下文预算裁剪（RAG → 文件树 → 已加载文件依次降级，稳定部分单独计算），裁剪说明随易变部分发送
+        texts, budget_notice = allocate_context_budget(
+            [(name, contents[name]) for name, *_ in sections if contents[name]],
+            {name for name, is_stable, *_ in sections if is_stable},
+            mode,
+            settings.get_config("selectedModel")
+        )
+        
+        stable_parts = []
+        volatile_parts = []
+        for name, is_stable, _, _, prefix in sections:
+            if texts.get(name):
+                (stable_parts if is_stable else volatile_parts).append(f"{prefix}{texts[name]}")
+        # 已加载文件在本轮中的变化（稳定部分保持本轮基准，变化已计入已加载文件的预算）
+        if texts.get(LOADED_FILES_DELTA):
+            volatile_parts.append(texts[LOADED_FILES_DELTA])
+        if budget_notice:
+            volatile_parts.append(budget_notice)
+        
+        logger.info(
+            f"上下文构建完成，耗时 {(time.perf_counter() - start) * 1000:.0f} ms，"
+            f"稳定部分: {len(stable_parts)}，易变部分: {len(volatile_parts)}，复用本轮快照 {len(sections) - len(pending)}/{len(sections)}；"
+            f"各部分: {', '.join(f'{name}={timings[name]}' for name, *_ in sections)}"
+        )
+        return "\n\n".join(stable_parts), "\n\n".join(volatile_parts)
+    
+    def _loaded_files_fingerprint(self, mode: str, config_version: int) -> Optional[Hashable]:
+        """已加载文件的依赖指纹：配置版本号（additionalInfo 变化）、渲染缓存失效次数（工具写入文件）与各文件的 mtime/大小
+
+        mtime 精度较粗时等长修改可能不改变签名，工具写入文件后的主动失效保证快照不会复用旧内容
+        """
+        try:
+            loaded_files = settings.get_config("mode", mode, "additionalInfo", default=[])
+            if not isinstance(loaded_files, list):
+                return (config_version,)
+            return (config_version, get_render_generation(), tuple(
+                get_file_signature(file_path) for file_path in loaded_files if isinstance(file_path, str)
+            ))
         except Exception as e:
-            logger.error(f"构建上下文消息时出错: {e}")
-            return ""
+            logger.warning(f"计算已加载文件指纹失败，本次重新读取: {e}")
+            return None
+    
+    @staticmethod
+    async def _resolved(value: str) -> str:
+        return value
+    
+    async def _run_section(self, name: str, coro: Awaitable[Union[str, Section]]) -> Tuple[Union[str, Section], float, str]:
+        """执行单个上下文部分，超时或出错时使用降级内容
+        
+        Returns:
+            (内容, 耗时毫秒, 状态 ok/timeout/error)
+        """
+        start = time.perf_counter()
+        timeout = SECTION_TIMEOUTS.get(name, DEFAULT_SECTION_TIMEOUT)
+        try:
+            content, status = await asyncio.wait_for(coro, timeout=timeout), "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"构建上下文部分 {name} 超时（{timeout} 秒），本轮使用降级内容")
+            content, status = SECTION_FALLBACKS.get(name, ""), "timeout"
+        except Exception as e:
+            logger.error(f"构建上下文部分 {name} 失败: {e}")
+            content, status = SECTION_FALLBACKS.get(name, ""), "error"
+        return content, (time.perf_counter() - start) * 1000, status
     
     async def build_prompts(
         self,
         mode: Optional[str] = None,
         user_input: Optional[str] = None,
-        summary: Optional[str] = None
-    ) -> Tuple[str, str]:
-        """同时构建系统提示词和上下文消息（便捷方法）
+        summary: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        turn_id: Optional[str] = None
+    ) -> Tuple[str, str, str]:
+        """同时构建系统提示词和上下文（便捷方法）
         
         Args:
             mode: 对话模式
-            user_input: 用户输入文本
+            user_input: 本轮用户输入文本（最后一条用户消息）
             summary: 过往消息总结
+            thread_id: 会话ID
+            turn_id: 本轮对话标识（最后一条用户消息的ID）
             
         Returns:
-            (system_prompt, context_message) 元组
+            (system_prompt, stable_context, volatile_context) 元组
         """
         system_prompt = await self.build_system_prompt(mode=mode)
-        context_message = await self.build_context_message(
+        stable_context, volatile_context = await self.build_context_segments(
             mode=mode,
             user_input=user_input,
-            summary=summary
+            summary=summary,
+            thread_id=thread_id,
+            turn_id=turn_id
         )
-        return system_prompt, context_message
+        return system_prompt, stable_context, volatile_context
+
+
+def assemble_messages(
+    system_prompt: str,
+    stable_context: str,
+    history: List[BaseMessage],
+    volatile_context: str,
+    cache_aware: bool = True
+) -> List[BaseMessage]:
+    """组装发送给AI的消息列表
+    
+    缓存友好布局：SystemMessage(系统提示词 + 稳定上下文) + 历史消息 + HumanMessage(易变上下文)，
+    在稳定前缀末尾和历史消息末尾打上 cache_control 标记（不支持的提供商由适配器去除），
+    两轮之间只要稳定上下文不变，前缀即可命中提供商的提示词缓存
+    
+    普通布局：SystemMessage(系统提示词) + 历史消息 + HumanMessage(全部上下文)
+    
+    Args:
+        system_prompt: 系统提示词
+        stable_context: 稳定上下文
+        history: 修剪后的历史消息
+        volatile_context: 易变上下文
+        cache_aware: 是否使用缓存友好布局
+        
+    Returns:
+        消息列表
+    """
+    if not cache_aware:
+        context_message = "\n\n".join(part for part in (stable_context, volatile_context) if part)
+        messages = [SystemMessage(content=system_prompt)] + history
+        if context_message:
+            messages.append(HumanMessage(content=f"{CONTEXT_MESSAGE_HEADER}\n\n{context_message}\n\n"))
+        return messages
+    
+    system_blocks = [{"type": "text", "text": system_prompt}]
+    if stable_context:
+        system_blocks.append({"type": "text", "text": f"{STABLE_CONTEXT_HEADER}\n\n{stable_context}"})
+    system_blocks[-1]["cache_control"] = CACHE_CONTROL
+    messages = [SystemMessage(content=system_blocks)] + history
+    
+    # 历史消息末尾作为第二个缓存断点，下一轮只需新写入本轮新增的消息
+    if history and isinstance(history[-1].content, str) and history[-1].content:
+        last = history[-1]
+        messages[-1] = last.model_copy(update={
+            "content": [{"type": "text", "text": last.content, "cache_control": CACHE_CONTROL}]
+        })
+    
+    if volatile_context:
+        messages.append(HumanMessage(content=f"{CONTEXT_MESSAGE_HEADER}\n\n{volatile_context}\n\n"))
+    return messages
 
 
 # 创建全局实例
@@ -1,3 +1,5 @@
+import logging
+
 from backend.settings.settings import settings
 from backend.ai_agent.tool.rag_tool.rag_search import rag_search
 from backend.ai_agent.tool.rag_tool.rag_list_files import rag_list_files
@@ -12,6 +14,8 @@ from backend.ai_agent.tool.operation_tool.execute_command import execute_command
 from backend.ai_agent.tool.skill_tool.load_unload_skill import load_unload_skill
 from backend.ai_agent.mcp.mcp_manager import get_mcp_tools_as_objects
 
+logger = logging.getLogger(__name__)
+
 
 async def import_tools(mode: str = None):
     """导入所有工具，包括内置工具和MCP工具
@@ -42,7 +46,7 @@ async def import_tools(mode: str = None):
     if mode:
         # 获取模式启用的工具列表
         enabled_tools = settings.get_config("mode", mode, "tools", default=[])
-        print(f"[INFO] 模式 '{mode}' 启用的工具: {enabled_tools}")
+        logger.debug(f"模式 '{mode}' 启用的工具: {enabled_tools}")
         # 只保留启用的内置工具
         builtin_tools = {tool_name: builtin_tools[tool_name] for tool_name in enabled_tools if tool_name in builtin_tools}
     
@@ -51,8 +55,5 @@ async def import_tools(mode: str = None):
     tools.update(builtin_tools)
     tools.update(mcp_tools)
     
-    for tool_name in tools:
-        print(f"[OK] 已导入工具: {tool_name}")
-    
-    print(f"[INFO] 总共导入 {len(tools)} 个工具 (MCP: {len(mcp_tools)}, 内置: {len(builtin_tools)})")
+    logger.debug(f"总共导入 {len(tools)} 个工具 (MCP: {len(mcp_tools)}, 内置: {len(builtin_tools)})")
     return tools
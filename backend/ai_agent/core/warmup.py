@@ -0,0 +1,149 @@
+"""
+后台预热
+服务启动后在后台并发预加载首轮对话会用到的重型组件（配置、MCP工具、LiteLLM、两步RAG嵌入模型），
+让首条消息直接获得稳定状态下的延迟。通过 store.yaml 中的 warmup 开关启用，各组件状态可在 /health 查看
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.settings.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SkipWarmup(Exception):
+    """组件无需预热（如未配置两步RAG），异常信息为跳过原因"""
+
+
+async def _warm_config():
+    """解析配置并读取当前提供商的密钥，填充配置缓存与环境变量缓存"""
+    def load():
+        settings.get_config()
+        provider = settings.get_config("selectedProvider")
+        if provider:
+            settings.get_provider_key(provider)
+
+    await asyncio.to_thread(load)
+
+
+async def _warm_mcp():
+    """连接所有激活的MCP服务器获取工具，结果进入MCP工具缓存"""
+    from backend.ai_agent.mcp.mcp_manager import get_mcp_tools_as_objects
+
+    if not settings.get_config("mcpServers", default={}):
+        raise SkipWarmup("未配置MCP服务器")
+    tools = await get_mcp_tools_as_objects()
+    return f"{len(tools)} 个工具"
+
+
+async def _warm_litellm():
+    """导入 litellm（首次导入需加载大量提供商模块）"""
+    await asyncio.to_thread(importlib.import_module, "litellm")
+
+
+async def _warm_embeddings():
+    """加载两步RAG知识库的嵌入模型与向量库（本地 GGUF 模型会常驻进程）"""
+    from backend.ai_agent.embedding.emb_service import prepare_emb, load
+
+    kb_id = settings.get_config("two-step-rag", default=None)
+    kb_config = settings.get_config("knowledgeBase", kb_id) if kb_id else None
+    if not kb_config:
+        raise SkipWarmup("未配置两步RAG")
+
+    provider = kb_config.get("provider", "")
+    provider_config = settings.get_config("provider", provider, default={})
+
+    def load_embeddings():
+        embeddings = prepare_emb(
+            provider=provider,
+            model_id=kb_config.get("model", ""),
+            embedding_url=provider_config.get("url", ""),
+            embedding_api_key=settings.get_provider_key(provider)
+        )
+        load(embeddings, kb_id)
+
+    await asyncio.to_thread(load_embeddings)
+    return f"{provider}/{kb_config.get('model', '')}"
+
+
+class WarmupManager:
+    """后台预热管理器，负责并发执行各组件预热并记录状态"""
+
+    def __init__(self):
+        self._components: Dict[str, Callable[[], Awaitable[Any]]] = {
+            "config": _warm_config,
+            "mcp": _warm_mcp,
+            "litellm": _warm_litellm,
+            "embeddings": _warm_embeddings,
+        }
+        self.enabled: bool = False
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """在当前事件循环中启动后台预热（不阻塞服务启动）"""
+        self.enabled = bool(settings.get_config("warmup", default=False))
+        if not self.enabled or self._task is not None:
+            return
+        self._status = {name: {"state": "pending"} for name in self._components}
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """服务关闭时取消未完成的预热"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """获取预热状态
+
+        Returns:
+            Dict: {"enabled": bool, "ready": bool, "components": {组件名: {"state": ..., ...}}}
+            state 取值: pending / running / ready / skipped / failed
+        """
+        return {
+            "enabled": self.enabled,
+            "ready": all(item["state"] in ("ready", "skipped", "failed") for item in self._status.values()),
+            "components": {name: dict(item) for name, item in self._status.items()},
+        }
+
+    async def _run(self) -> None:
+        # 让出一次事件循环，让 lifespan 先返回；这并不等待服务开始监听，预热可能与启动流程并行，
+        # 因此重型工作均在线程中执行，不阻塞启动和请求处理
+        await asyncio.sleep(0)
+        logger.info("开始后台预热")
+        start = time.perf_counter()
+        await asyncio.gather(*(self._run_component(name, func) for name, func in self._components.items()))
+        logger.info(f"后台预热完成，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    async def _run_component(self, name: str, func: Callable[[], Awaitable[Any]]) -> None:
+        status = self._status[name]
+        status["state"] = "running"
+        start = time.perf_counter()
+        try:
+            detail = await func()
+            status["state"] = "ready"
+            if detail:
+                status["detail"] = detail
+        except SkipWarmup as e:
+            status["state"] = "skipped"
+            status["detail"] = str(e)
+        except asyncio.CancelledError:
+            status["state"] = "pending"
+            raise
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = f"{type(e).__name__}: {e}"
+            logger.warning(f"预热组件 {name} 失败: {type(e).__name__}: {e}")
+        status["elapsed_ms"] = round((time.perf_counter() - start) * 1000)
+
+
+# 全局单例
+warmup_manager = WarmupManager()
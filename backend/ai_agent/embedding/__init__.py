@@ -11,6 +11,7 @@ from .emb_service import (
     get_two_step_rag_config, 
     set_two_step_rag_config
 )
+from .query_cache import get_query_embedding_cache_stats
 
 __all__ = [
     "create_collection",
@@ -23,5 +24,6 @@ __all__ = [
     "asearch_emb",
     "get_all_knowledge_bases",
     "get_two_step_rag_config",
-    "set_two_step_rag_config"
+    "set_two_step_rag_config",
+    "get_query_embedding_cache_stats"
 ]
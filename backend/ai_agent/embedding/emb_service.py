@@ -1,31 +1,33 @@
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
 import os
 from typing import Optional
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import DashScopeEmbeddings
-from langchain_ollama import OllamaEmbeddings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from backend.settings.settings import settings
-import chromadb
 from uuid import uuid4
 import asyncio
+import threading
 from functools import partial
 
-# 导入本地嵌入模型支持
-from backend.ai_agent.embedding.llama_cpp_embeddings import LlamaCppEmbeddings
 from backend.websocket.manager import ws_manager
+from backend.ai_agent.embedding.query_cache import CachedQueryEmbeddings
 
 DB_PATH = settings.CHROMADB_PERSIST_DIR
 
+# 本地 GGUF 模型加载耗时长，进程内按模型名复用同一个实例
+_local_embeddings = {}
+_local_embeddings_lock = threading.Lock()
+
 """
 由于litellm的嵌入板块,文档不详尽,只有少量提供商提及embedding模型
 故大部分嵌入使用langchain集成包
+
+各提供商的嵌入类、chromadb、langchain_chroma、llama_cpp 都很重，
+统一在首次使用时才导入，避免拖慢后端启动
 """
 
 
 def prepare_doc(orgfile_path, chunk_size, chunk_overlap):
+    from langchain_community.document_loaders import TextLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     # 初始化documents列表
     documents = []
     loader = TextLoader(orgfile_path, encoding='utf-8')
@@ -56,12 +58,18 @@ def prepare_doc(orgfile_path, chunk_size, chunk_overlap):
 def prepare_emb(provider, model_id,embedding_url,embedding_api_key=None):
     # 本地内置模型支持
     if provider == "local":
-        print(f"准备本地嵌入模型: {model_id}")
-        embeddings = LlamaCppEmbeddings(model_name=model_id)
-        print("本地嵌入模型准备就绪")
+        from backend.ai_agent.embedding.llama_cpp_embeddings import LlamaCppEmbeddings
+        with _local_embeddings_lock:
+            embeddings = _local_embeddings.get(model_id)
+            if embeddings is None:
+                print(f"准备本地嵌入模型: {model_id}")
+                embeddings = LlamaCppEmbeddings(model_name=model_id)
+                _local_embeddings[model_id] = embeddings
+                print("本地嵌入模型准备就绪")
         return embeddings
 
     elif provider == "dashscope":
+        from langchain_community.embeddings import DashScopeEmbeddings
         embeddings = DashScopeEmbeddings(
             model=model_id,
             dashscope_api_key=embedding_api_key
@@ -70,6 +78,7 @@ def prepare_emb(provider, model_id,embedding_url,embedding_api_key=None):
         return embeddings
 
     elif provider == "ollama":
+        from langchain_ollama import OllamaEmbeddings
         embeddings = OllamaEmbeddings(
             model=model_id
         )
@@ -77,6 +86,7 @@ def prepare_emb(provider, model_id,embedding_url,embedding_api_key=None):
         return embeddings
 
     elif provider == "gemini":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
         # LangChain的GoogleGenerativeAIEmbeddings需要"models/"前缀
         gemini_model_id = f"models/{model_id}" if not model_id.startswith("models/") else model_id
         embeddings = GoogleGenerativeAIEmbeddings(
@@ -87,6 +97,7 @@ def prepare_emb(provider, model_id,embedding_url,embedding_api_key=None):
         return embeddings
 
     else:
+        from langchain_openai import OpenAIEmbeddings
         print(f"塞给openaiembeddings的模型名{model_id}")
         embeddings = OpenAIEmbeddings(
             model=model_id,
@@ -111,6 +122,8 @@ def load(embeddings, collection_name):
     Returns:
         vector_store: 向量存储实例
     """
+    from langchain_chroma import Chroma
+
     # 直接连接到已存在的数据库
     vector_store = Chroma(
         collection_name=collection_name,
@@ -132,6 +145,8 @@ def delete_collection(collection_name):
     Returns:
         bool: 删除是否成功
     """
+    import chromadb
+
     # 使用 Chroma 的 PersistentClient 来删除集合
     client = chromadb.PersistentClient(path=DB_PATH)
     client.delete_collection(name=collection_name)
@@ -153,6 +168,8 @@ def create_collection(collection_name, provider: str, model: str, provider_url:
     Returns:
         vector_store: 向量存储实例
     """
+    from langchain_chroma import Chroma
+
     # 准备嵌入模型
     embeddings = prepare_emb(
         provider=provider,
@@ -248,6 +265,8 @@ def remove_file_from_collection(collection_name, filename):
     Returns:
         bool: 移除是否成功
     """
+    import chromadb
+
     # 创建持久化客户端（不需要嵌入模型）
     client = chromadb.PersistentClient(path=DB_PATH)
     
@@ -271,6 +290,8 @@ def get_files_in_collection(collection_name):
     Returns:
         dict: 文件名到文件信息的映射 {filename: {"chunk_count": count, "chunk_size": size, "chunk_overlap": overlap}}
     """
+    import chromadb
+
     client = chromadb.PersistentClient(path=DB_PATH)
     collection = client.get_collection(name=collection_name)
     
@@ -324,12 +345,18 @@ def search_emb(collection_name: str, search_input: str, filename_filter: Optiona
     provider = kb_config.get('provider', '')
     provider_config = settings.get_config('provider', provider)
     
-    # 准备嵌入模型
-    embeddings = prepare_emb(
+    # 准备嵌入模型（查询向量经过缓存，重复的查询不再调用嵌入模型）
+    embeddings = CachedQueryEmbeddings(
+        prepare_emb(
+            provider=provider,
+            model_id=model,
+            embedding_url=provider_config.get('url', ''),
+            embedding_api_key=settings.get_provider_key(provider)
+        ),
         provider=provider,
-        model_id=model,
-        embedding_url=provider_config.get('url', ''),
-        embedding_api_key=settings.get_provider_key(provider)
+        model=model,
+        dimensions=kb_config.get('dimensions', 0),
+        url=provider_config.get('url', '')
     )
     
     # 加载向量数据库
@@ -374,12 +401,18 @@ async def asearch_emb(collection_name: str, search_input: str, filename_filter:
     model = kb_config.get('model', '')
     provider_config = settings.get_config('provider', provider)
     
-    # 准备嵌入模型
-    embeddings = prepare_emb(
+    # 准备嵌入模型（查询向量经过缓存，重复的查询不再调用嵌入模型）
+    embeddings = CachedQueryEmbeddings(
+        prepare_emb(
+            provider=provider,
+            model_id=model,
+            embedding_url=provider_config.get('url', ''),
+            embedding_api_key=settings.get_provider_key(provider)
+        ),
         provider=provider,
-        model_id=model,
-        embedding_url=provider_config.get('url', ''),
-        embedding_api_key=settings.get_provider_key(provider)
+        model=model,
+        dimensions=kb_config.get('dimensions', 0),
+        url=provider_config.get('url', '')
     )
     
     # 加载向量数据库
@@ -1,8 +1,8 @@
 import os
+import threading
 from typing import List, Optional
 from langchain_core.embeddings import Embeddings
 from backend.settings.settings import settings
-from llama_cpp import Llama
 
 class LlamaCppEmbeddings(Embeddings):
     """
@@ -48,6 +48,12 @@ class LlamaCppEmbeddings(Embeddings):
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
         
+        # llama_cpp 体积大，只在真正创建本地模型时导入
+        from llama_cpp import Llama
+
+        # 实例会在进程内共享，llama.cpp 不支持并发推理，嵌入调用需串行
+        self._lock = threading.Lock()
+
         # 初始化模型（embedding_only 模式）
         self.client = Llama(
             model_path=model_path,
@@ -62,12 +68,14 @@ class LlamaCppEmbeddings(Embeddings):
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """批量嵌入文档"""
         embeddings = []
-        for text in texts:
-            embedding = self.client.embed(text)
-            embeddings.append(embedding)
+        with self._lock:
+            for text in texts:
+                embedding = self.client.embed(text)
+                embeddings.append(embedding)
         return embeddings
     
     def embed_query(self, text: str) -> List[float]:
         """嵌入单个查询文本"""
-        return self.client.embed(text)
+        with self._lock:
+            return self.client.embed(text)
     
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+查询向量缓存
+知识库检索时查询文本的嵌入向量按 (提供商, 接口地址, 模型, 维度, 规范化后的文本) 缓存（LRU + TTL）：
+两步RAG在同一轮对话的工具循环中会反复检索同一条用户输入，rag_search 工具也常重复相近的查询，
+命中时直接返回缓存向量，不再请求远程嵌入接口或运行本地模型。
+
+只缓存查询向量（embed_query），文档嵌入（embed_documents）原样透传
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# 缓存条数上限与有效期（秒）
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = 600.0
+
+CacheKey = Tuple[str, str, str, int, str]
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：去除首尾空白，连续空白合并为一个空格"""
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """查询向量 LRU + TTL 缓存（检索可能在线程池中执行，读写加锁）"""
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[float]]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: CacheKey):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: CacheKey, vector: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """命中/未命中次数与当前条数"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": self._hits / total if total else 0.0,
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "ttl": self.ttl,
+            }
+
+
+# 全局单例
+query_embedding_cache = QueryEmbeddingCache()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """在嵌入模型外包装查询向量缓存"""
+
+    def __init__(self, embeddings: Embeddings, provider: str, model: str, dimensions: int = 0, url: str = ""):
+        self.embeddings = embeddings
+        self.provider = provider
+        # 同一提供商改了接口地址（如换了本地服务）后向量空间可能不同，地址也计入缓存键
+        self.url = url or ""
+        self.model = model
+        self.dimensions = dimensions or 0
+
+    def _key(self, text: str) -> CacheKey:
+        return (self.provider, self.url, self.model, self.dimensions, normalize_query(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            query_embedding_cache.put(key, vector)
+        else:
+            logger.debug(f"查询向量缓存命中: {self.provider}/{self.model}")
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = query_embedding_cache.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            query_embedding_cache.put(key, vector)
+        else:
+            logger.debug(f"查询向量缓存命中: {self.provider}/{self.model}")
+        return vector
+
+
+def get_query_embedding_cache_stats() -> Dict:
+    """获取查询向量缓存的命中统计"""
+    return query_embedding_cache.stats()
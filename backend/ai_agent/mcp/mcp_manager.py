@@ -1,10 +1,14 @@
+import json
 import logging
 from pathlib import Path
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from backend.settings.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# MCP工具对象缓存: {server_id: (连接配置签名, {带前缀的工具名: 工具对象})}
+# 工具对象每次调用都会按连接配置新建会话，可安全复用；连接配置（含环境变量值）变化时自动失效
+_mcp_tools_cache: dict[str, tuple[str, dict]] = {}
+
 
 def convert_to_langchain_config(mcp_servers: dict) -> dict:
     """
@@ -142,6 +146,8 @@ async def get_mcp_server_tools(server_id: str) -> dict:
     server_config = config[server_id]
     langchain_config = convert_to_langchain_config({server_id: server_config})
     
+    from langchain_mcp_adapters.client import MultiServerMCPClient
+
     tools_list = []
     try:
         logger.info(f"开始获取服务器 {server_id} 的工具")
@@ -179,11 +185,8 @@ async def save_mcp_server(server_id: str, server_config: dict) -> dict:
         for key, value in env_values.items():
             settings.env_manager.set_api_key(key, value)
     
-    # 直接替换旧配置
-    config[server_id] = new_config
-    
-    # 持久化保存
-    settings.update_config(config, "mcpServers")
+    # 直接替换旧配置，只写入该服务器项，避免覆盖并发修改
+    settings.update_config(new_config, "mcpServers", server_id)
 
     return await get_mcp_data()
 
@@ -195,10 +198,7 @@ async def delete_mcp_server(server_id: str):
         raise ValueError(f"MCP服务器 {server_id} 不存在")
     
     # 删除配置
-    del config[server_id]
-    
-    # 持久化保存
-    settings.update_config(config, "mcpServers")
+    settings.delete_config("mcpServers", server_id)
     
     logger.info(f"已删除MCP服务器配置: {server_id}")
     return await get_mcp_data()
@@ -215,6 +215,9 @@ async def get_mcp_tools_as_objects(server_id: str | None = None):
     Returns:
         Dict[str, Any]: MCP工具对象字典（可调用的BaseTool对象）
     """
+    # langchain_mcp_adapters 会连带导入 mcp SDK，延迟到首次获取工具时导入
+    from langchain_mcp_adapters.client import MultiServerMCPClient
+
     try:
         mcp_servers_config = settings.get_config("mcpServers", default={})
         langchain_config = convert_to_langchain_config(mcp_servers_config)
@@ -231,22 +234,29 @@ async def get_mcp_tools_as_objects(server_id: str | None = None):
         # 逐个服务器获取工具，以便添加正确的命名空间前缀
         tools_dict = {}
         for srv_id, srv_config in langchain_config.items():
+            config_key = json.dumps(srv_config, sort_keys=True, ensure_ascii=False)
+            cached = _mcp_tools_cache.get(srv_id)
+            if cached and cached[0] == config_key:
+                tools_dict.update(cached[1])
+                logger.debug(f"服务器 {srv_id} 命中工具缓存，共 {len(cached[1])} 个工具")
+                continue
             try:
                 single_client = MultiServerMCPClient({srv_id: srv_config})
                 server_tools = await single_client.get_tools()
                 
-                # 从原始配置中获取服务器名称
-                server_name = mcp_servers_config.get(srv_id, {}).get("name", srv_id)
-                
+                server_tools_dict = {}
                 for tool in server_tools:
                     # 添加前缀: mcp--<server_id>--<tool_name>
                     # 使用 server_id 而不是 server_name，避免中文或非ASCII字符导致API报错
                     prefixed_name = f"mcp--{srv_id}--{tool.name}"
                     # 修改工具对象的 name 属性，使其在 bind_tools 时带前缀
                     tool.name = prefixed_name
-                    tools_dict[prefixed_name] = tool
+                    server_tools_dict[prefixed_name] = tool
                     logger.debug(f"已添加MCP工具: {prefixed_name}")
                 
+                # 只缓存成功获取的结果，失败的服务器下次重试
+                _mcp_tools_cache[srv_id] = (config_key, server_tools_dict)
+                tools_dict.update(server_tools_dict)
                 logger.info(f"服务器 {srv_id} 提供了 {len(server_tools)} 个工具")
                 # 注意：langchain-mcp-adapters 0.1.0+ 不再支持上下文管理器模式
                 # 也不需要手动调用__aexit__清理方法
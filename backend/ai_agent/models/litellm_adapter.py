@@ -4,12 +4,15 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
 from langchain_core.tools import BaseTool
 from pydantic import Field, model_validator
-from litellm import acompletion, completion
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 需要显式 cache_control 标记才会缓存提示词的提供商（LiteLLM 模型前缀）；
+# deepseek、openai、gemini 等提供商自动缓存相同前缀，标记会被去除
+CACHE_CONTROL_PROVIDERS = {"anthropic", "bedrock", "vertex_ai", "openrouter"}
+
 
 class LiteLLMAdapter(BaseChatModel):
     """
@@ -23,6 +26,9 @@ class LiteLLMAdapter(BaseChatModel):
     api_key: Optional[str] = Field(default=None)
     base_url: Optional[str] = Field(default=None)
     tools: Optional[List[BaseTool]] = Field(default=None)
+    # bind_tools 时预先生成的 OpenAI 格式工具列表，及其对应的工具标识（见 _tools_key）
+    tools_schema: Optional[List[Dict[str, Any]]] = Field(default=None, exclude=True)
+    tools_schema_key: Optional[tuple] = Field(default=None, exclude=True)
     
     @model_validator(mode='after')
     def validate_config(self):
@@ -31,6 +37,23 @@ class LiteLLMAdapter(BaseChatModel):
             raise ValueError("model参数不能为空")
         return self
     
+    def _format_content(self, content: Any) -> Any:
+        """
+        处理消息内容中的 cache_control 标记：支持的提供商原样保留，
+        其他提供商去除标记，纯文本块合并为字符串（合并结果与未分块时一致，不影响自动前缀缓存）
+        """
+        if not isinstance(content, list):
+            return content
+        if self._extract_model_provider(self.model) in CACHE_CONTROL_PROVIDERS:
+            return content
+        blocks = [
+            {key: value for key, value in block.items() if key != "cache_control"} if isinstance(block, dict) else block
+            for block in content
+        ]
+        if all(isinstance(block, dict) and block.get("type") == "text" for block in blocks):
+            return "\n\n".join(block.get("text", "") for block in blocks)
+        return blocks
+
     def _format_messages(self, messages: List[BaseMessage]) -> List[Dict[str, Any]]:
         """
         将LangChain消息格式转换为LiteLLM格式
@@ -38,11 +61,11 @@ class LiteLLMAdapter(BaseChatModel):
         formatted = []
         for msg in messages:
             if isinstance(msg, SystemMessage):
-                formatted.append({"role": "system", "content": msg.content})
+                formatted.append({"role": "system", "content": self._format_content(msg.content)})
             elif isinstance(msg, HumanMessage):
-                formatted.append({"role": "user", "content": msg.content})
+                formatted.append({"role": "user", "content": self._format_content(msg.content)})
             elif isinstance(msg, AIMessage):
-                assistant_msg = {"role": "assistant", "content": msg.content or ""}
+                assistant_msg = {"role": "assistant", "content": self._format_content(msg.content) or ""}
                 
                 # 处理reasoning_content（思维链内容）
                 reasoning_content = None
@@ -72,8 +95,35 @@ class LiteLLMAdapter(BaseChatModel):
                 
                 formatted.append(assistant_msg)
             elif isinstance(msg, ToolMessage):
-                formatted.append({"role": "tool", "content": msg.content, "tool_call_id": msg.tool_call_id})
+                formatted.append({"role": "tool", "content": self._format_content(msg.content), "tool_call_id": msg.tool_call_id})
         return formatted
+
+    @staticmethod
+    def _usage_metadata(usage: Any) -> Optional[Dict[str, Any]]:
+        """
+        将LiteLLM的usage转换为usage_metadata，包含提示词缓存的命中/写入 token 数
+        """
+        if not usage:
+            return None
+        usage_metadata = {
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens
+        }
+        # OpenAI 格式为 prompt_tokens_details.cached_tokens；Anthropic 为 cache_read/creation_input_tokens；DeepSeek 为 prompt_cache_hit_tokens
+        prompt_details = getattr(usage, "prompt_tokens_details", None)
+        cache_read = getattr(prompt_details, "cached_tokens", None) if prompt_details else None
+        if not cache_read:
+            cache_read = getattr(usage, "cache_read_input_tokens", None) or getattr(usage, "prompt_cache_hit_tokens", None)
+        cache_creation = getattr(usage, "cache_creation_input_tokens", None)
+        input_token_details = {}
+        if cache_read:
+            input_token_details["cache_read"] = cache_read
+        if cache_creation:
+            input_token_details["cache_creation"] = cache_creation
+        if input_token_details:
+            usage_metadata["input_token_details"] = input_token_details
+        return usage_metadata
     
     def _convert_tools_to_openai_format(self, tools: Optional[List[BaseTool]]) -> Optional[List[Dict[str, Any]]]:
         """
@@ -110,9 +160,29 @@ class LiteLLMAdapter(BaseChatModel):
                     }
                 }
                 openai_tools.append(tool_schema)
-        print("openai_tools:",openai_tools)
+        logger.debug(f"已生成 {len(openai_tools)} 个工具的 OpenAI 格式定义")
         return openai_tools
 
+    @staticmethod
+    def _tools_key(tools: List[BaseTool]) -> tuple:
+        """
+        工具列表的标识：工具对象身份 + 名称、描述、参数模型，任一变化都视为新版本
+        """
+        return tuple(
+            (id(tool), getattr(tool, "name", None), getattr(tool, "description", None), id(getattr(tool, "args_schema", None)))
+            for tool in tools
+        )
+
+    def _get_openai_tools(self, tools: Optional[List[BaseTool]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取OpenAI格式的工具列表，与 bind_tools 时绑定的工具一致则直接复用预生成的结果
+        """
+        if not tools:
+            return None
+        if self.tools_schema is not None and self._tools_key(tools) == self.tools_schema_key:
+            return self.tools_schema
+        return self._convert_tools_to_openai_format(tools)
+
     # 虽然用不到，但是BaseChatModel必须包含一个_generate方法
     def _generate(
         self,
@@ -129,7 +199,7 @@ class LiteLLMAdapter(BaseChatModel):
         
         # 获取tools参数
         tools = kwargs.get("tools", self.tools)
-        tools = self._convert_tools_to_openai_format(tools)
+        tools = self._get_openai_tools(tools)
         
         # 构建调用参数
         call_kwargs = {
@@ -150,7 +220,8 @@ class LiteLLMAdapter(BaseChatModel):
         if stop:
             call_kwargs["stop"] = stop
         
-        # 调用LiteLLM
+        # 调用LiteLLM（litellm 导入耗时较长，首次调用时才导入）
+        from litellm import completion
         try:
             response = completion(**call_kwargs)
         except Exception as e:
@@ -185,13 +256,7 @@ class LiteLLMAdapter(BaseChatModel):
         }
         
         # 构造usage_metadata
-        usage_metadata = None
-        if hasattr(response, 'usage') and response.usage:
-            usage_metadata = {
-                "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+        usage_metadata = self._usage_metadata(getattr(response, 'usage', None))
         
         # 构造最终消息
         final_message = AIMessage(
@@ -220,7 +285,7 @@ class LiteLLMAdapter(BaseChatModel):
         
         # 获取tools参数
         tools = kwargs.get("tools", self.tools)
-        tools = self._convert_tools_to_openai_format(tools)
+        tools = self._get_openai_tools(tools)
         
         # 构建调用参数（需要stream_options才能显示上下文开销）
         call_kwargs = {
@@ -248,9 +313,9 @@ class LiteLLMAdapter(BaseChatModel):
         finish_reason = None
         usage_info = None
         
-        # 调用LiteLLM流式API
+        # 调用LiteLLM流式API（litellm 导入耗时较长，首次调用时才导入）
+        from litellm import acompletion
         try:
-            print("api_key:",self.api_key)
             response_stream = await acompletion(**call_kwargs)
         except Exception as e:
             logger.error(f"LiteLLM流式调用失败: {e}")
@@ -314,13 +379,7 @@ class LiteLLMAdapter(BaseChatModel):
         }
         
         # 构造usage_metadata
-        usage_metadata = None
-        if usage_info:
-            usage_metadata = {
-                "input_tokens": usage_info.prompt_tokens,
-                "output_tokens": usage_info.completion_tokens,
-                "total_tokens": usage_info.total_tokens
-            }
+        usage_metadata = self._usage_metadata(usage_info)
         
         # 流式结束后，发送最终的元数据消息
         metadata_message = AIMessageChunk(
@@ -346,7 +405,12 @@ class LiteLLMAdapter(BaseChatModel):
     
     def bind_tools(self, tools, **kwargs):
         """
-        绑定工具到模型
+        绑定工具到模型，并预先生成OpenAI格式的工具列表，避免每次调用重复生成 JSON Schema
         """
-        bound_model = self.model_copy(update={"tools": tools, **kwargs})
+        bound_model = self.model_copy(update={
+            "tools": tools,
+            "tools_schema": self._convert_tools_to_openai_format(tools),
+            "tools_schema_key": self._tools_key(tools) if tools else None,
+            **kwargs
+        })
         return bound_model
@@ -68,7 +68,7 @@ class MultiModelAdapter:
         if base_url is None:
             base_url = settings.get_config("provider", provider, "url", default="")
         
-        print(f"初始化模型: {model}, 提供商: {provider}, base_url: {base_url}")
+        logger.debug(f"初始化模型: {model}, 提供商: {provider}, base_url: {base_url}")
         
         # 使用LiteLLMAdapter作为统一适配器，支持100+ LLM提供商
         # 根据提供商类型使用不同的前缀
@@ -153,7 +153,7 @@ class MultiModelAdapter:
                     if model_name.startswith("models/"):
                         model_name = model_name[7:]  # 去掉"models/"（7个字符）
                     models.append(model_name)
-                    print(f"获得的Gemini模型: {model_name}")
+                    logger.debug(f"获得的Gemini模型: {model_name}")
                 return models
             else:
                 error_detail = f"api key连接失败，请确定apikey可用 (HTTP {response.status_code})"
@@ -180,7 +180,7 @@ class MultiModelAdapter:
                 for model_data in data.get("data", []):
                     model_id = model_data.get("id", "")
                     models.append(model_id)
-                    print(f"获得的id是{model_id}")
+                    logger.debug(f"获得的模型id: {model_id}")
                 
                 # 添加嵌入模型列表
                 if provider == "dashscope":
@@ -3,6 +3,56 @@
 用于管理AI流式响应的中断状态
 """
 import asyncio
+from typing import Dict, Optional
+
+
+class _ThreadLockEntry:
+    """会话写锁及其持有/等待者数量，数量归零时从管理器中移除"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ThreadLock:
+    """会话写锁句柄：获取时才查找（或创建）会话的锁，释放后无人持有或等待时移除，锁的数量不会随会话增长"""
+
+    def __init__(self, locks: Dict[str, _ThreadLockEntry], thread_id: str):
+        self._locks = locks
+        self._thread_id = thread_id
+        self._entry: Optional[_ThreadLockEntry] = None
+
+    async def acquire(self) -> None:
+        entry = self._locks.get(self._thread_id)
+        if entry is None:
+            entry = self._locks[self._thread_id] = _ThreadLockEntry()
+        entry.users += 1
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            self._leave(entry)
+            raise
+        self._entry = entry
+
+    def release(self) -> None:
+        entry, self._entry = self._entry, None
+        entry.lock.release()
+        self._leave(entry)
+
+    def _leave(self, entry: _ThreadLockEntry) -> None:
+        entry.users -= 1
+        if entry.users == 0 and self._locks.get(self._thread_id) is entry:
+            del self._locks[self._thread_id]
+
+    async def __aenter__(self) -> "ThreadLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
 
 class StreamInterruptManager:
     """流式传输中断管理器"""
@@ -10,6 +60,9 @@ class StreamInterruptManager:
     def __init__(self):
         # 存储活跃的流式任务: {thread_id: asyncio.Event}
         self._active_tasks: dict[str, asyncio.Event] = {}
+        # 会话写锁: {thread_id: 锁及持有/等待者数量}，流式运行图与后台修改会话状态（如自动总结）互斥
+        # 无人持有或等待时移除
+        self._thread_locks: Dict[str, _ThreadLockEntry] = {}
     
     def create_task(self, thread_id: str) -> None:
         """
@@ -49,6 +102,20 @@ class StreamInterruptManager:
             return False
         return self._active_tasks[thread_id].is_set()
     
+    def thread_lock(self, thread_id: str) -> ThreadLock:
+        """
+        获取指定thread_id的会话写锁句柄（支持 acquire/release 与 async with）
+        
+        流式运行图期间持有该锁，后台任务修改会话状态前需获取该锁，避免与正在进行的流式传输互相覆盖检查点
+        
+        Args:
+            thread_id: 线程ID
+            
+        Returns:
+            会话写锁句柄（每次获取使用新的句柄）
+        """
+        return ThreadLock(self._thread_locks, thread_id)
+    
     def remove_task(self, thread_id: str) -> None:
         """
         移除指定thread_id的已完成任务
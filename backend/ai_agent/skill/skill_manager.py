@@ -1,12 +1,16 @@
 """
 Skill 统一管理器
 整合了 Skill 的数据模型、脚本执行和加载功能
+
+已解析的 Skill 缓存在内存注册表中，按名称和 SKILL.md 路径 O(1) 查找；
+每次访问只检查 skills 目录与各 SKILL.md 的 mtime，有变化时才重新读取解析对应的 Skill
 """
 
 import os
 import re
 import asyncio
 import logging
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple, Any
@@ -48,6 +52,18 @@ class SkillLoader:
     def __init__(self):
         """初始化 Skills 加载器"""
         self.skills_dir = Path(settings.SKILLS_DIR).resolve()
+        # 注册表可能在线程池与事件循环中同时访问
+        self._lock = threading.Lock()
+        # skills 目录的 mtime 与其中的 Skill 子目录（目录增删、重命名时 mtime 变化）
+        self._dir_mtime: Optional[int] = None
+        self._skill_dirs: List[Path] = []
+        # {Skill 目录: (SKILL.md mtime_ns, Skill)}
+        self._loaded: Dict[Path, Tuple[int, Skill]] = {}
+        # 注册表：{名称: Skill}、{SKILL.md 绝对路径: Skill}
+        self._by_name: Dict[str, Skill] = {}
+        self._by_path: Dict[str, Skill] = {}
+        # 注册表版本号，每次重建加一
+        self._generation = 0
     
     def _parse_frontmatter(self, content: str) -> Tuple[dict, str]:
         """解析 SKILL.md 文件的 frontmatter
@@ -114,29 +130,84 @@ class SkillLoader:
         
         return skill
     
+    def _refresh(self) -> None:
+        """按 mtime 校验注册表，只重新加载有变化的 Skill"""
+        with self._lock:
+            try:
+                dir_mtime = self.skills_dir.stat().st_mtime_ns
+            except OSError:
+                dir_mtime = None
+            if dir_mtime != self._dir_mtime:
+                # 遍历 skills 目录下的所有子目录（跳过隐藏目录）
+                self._skill_dirs = sorted(
+                    item for item in self.skills_dir.iterdir()
+                    if item.is_dir() and not item.name.startswith('.')
+                ) if dir_mtime is not None else []
+                self._dir_mtime = dir_mtime
+                for skill_dir in self._skill_dirs:
+                    if not (skill_dir / "SKILL.md").is_file():
+                        logger.warning(f"Skill 目录缺少 SKILL.md，已跳过: {skill_dir}")
+            
+            changed = False
+            loaded: Dict[Path, Tuple[int, Skill]] = {}
+            for skill_dir in self._skill_dirs:
+                try:
+                    mtime = (skill_dir / "SKILL.md").stat().st_mtime_ns
+                except OSError:
+                    continue
+                cached = self._loaded.get(skill_dir)
+                if cached is not None and cached[0] == mtime:
+                    loaded[skill_dir] = cached
+                    continue
+                # 加载 Skill
+                loaded[skill_dir] = (mtime, self._load_skill_from_file(skill_dir))
+                changed = True
+            
+            if not changed and loaded.keys() == self._loaded.keys():
+                return
+            self._loaded = loaded
+            self._by_name = {skill.name: skill for _, skill in loaded.values()}
+            self._by_path = {str(skill.file_path.resolve()): skill for _, skill in loaded.values()}
+            self._generation += 1
+            logger.info(f"加载 Skills 完成，共 {len(self._by_name)} 个")
+    
     def load_all_skills(self) -> Dict[str, Skill]:
-        """加载所有 Skills
+        """加载所有 Skills（未变化时直接返回注册表）
         
         Returns:
-            Skill 名称到 Skill 对象的映射
+            Skill 名称到 Skill 对象的映射（注册表本身，调用方不应修改）
         """
-        skills_dict = {}
+        self._refresh()
+        return self._by_name
+    
+    def get_generation(self) -> int:
+        """获取注册表版本号（会先按 mtime 校验），版本号不变时所有 Skill 内容不变"""
+        self._refresh()
+        return self._generation
+    
+    def get_skill(self, name: str) -> Optional[Skill]:
+        """按名称获取 Skill
         
-        # 遍历 skills 目录下的所有子目录
-        for item in self.skills_dir.iterdir():
-            if not item.is_dir():
-                continue
-            
-            # 跳过隐藏目录
-            if item.name.startswith('.'):
-                continue
+        Args:
+            name: Skill 名称
             
-            # 加载 Skill
-            skill = self._load_skill_from_file(item)
-            skills_dict[skill.name] = skill
+        Returns:
+            Skill 对象，不存在时返回 None
+        """
+        self._refresh()
+        return self._by_name.get(name)
+    
+    def get_skill_by_path(self, file_path: str) -> Optional[Skill]:
+        """按 SKILL.md 的绝对路径获取 Skill（mode.skillPaths 中保存的路径）
         
-        logger.info(f"加载 Skills 完成，共 {len(skills_dict)} 个")
-        return skills_dict
+        Args:
+            file_path: SKILL.md 绝对路径
+            
+        Returns:
+            Skill 对象，不存在时返回 None
+        """
+        self._refresh()
+        return self._by_path.get(file_path)
     
     def filter_skills(self, skill_names: List[str]) -> List[Skill]:
         """根据名称列表过滤 Skills
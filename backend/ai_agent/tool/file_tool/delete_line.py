@@ -1,8 +1,7 @@
 from pydantic import BaseModel, Field
 from langchain.tools import tool
-from backend.file.file_service import read_file as file_service_read_file
 from backend.file.file_service import update_file as file_service_update_file
-from backend.ai_agent.utils.file_utils import split_paragraphs, get_short_hash, parse_id
+from backend.ai_agent.utils.file_utils import get_rendered_file, invalidate_rendered_file, parse_id
 
 
 class DeleteItem(BaseModel):
@@ -33,8 +32,11 @@ async def delete_line(path: str, deletes: list[dict]) -> str:
 ==注意！空行的哈希始终为e3，如"2-e3|"，"4-e3|"==
     """
     try:
-        original_content = await file_service_read_file(path)
-        paragraphs, paragraph_ending = split_paragraphs(original_content)
+        # 与已加载文件的提示词共用渲染缓存，段落哈希不重复计算
+        rendered = await get_rendered_file(path)
+        paragraphs = list(rendered.paragraphs)
+        hashes = list(rendered.hashes)
+        paragraph_ending = rendered.paragraph_ending
 
         # 解析所有删除项，提取段落号和哈希
         parsed_deletes = []
@@ -63,8 +65,7 @@ async def delete_line(path: str, deletes: list[dict]) -> str:
                 errors.append(f"段落{paragraph}超出范围（共{len(paragraphs)}段）")
                 continue
 
-            actual = paragraphs[index]
-            actual_hash = get_short_hash(actual)
+            actual_hash = hashes[index]
 
             # 验证哈希值
             if actual_hash != hash.lower():
@@ -73,9 +74,12 @@ async def delete_line(path: str, deletes: list[dict]) -> str:
 
             # 删除段落
             del paragraphs[index]
+            del hashes[index]
             deleted_count += 1
 
         await file_service_update_file(path, paragraph_ending.join(paragraphs))
+        # 写入后立即失效渲染缓存，连续编辑不能依赖 mtime 判断文件已变化
+        invalidate_rendered_file(path)
 
         if errors:
             return f"【工具结果】：成功删除{deleted_count}个段落，但有错误：{'; '.join(errors)}"
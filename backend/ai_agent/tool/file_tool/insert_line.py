@@ -2,7 +2,7 @@ from pydantic import BaseModel, Field
 from langchain.tools import tool
 from backend.file.file_service import read_file as file_service_read_file
 from backend.file.file_service import update_file as file_service_update_file
-from backend.ai_agent.utils.file_utils import split_paragraphs
+from backend.ai_agent.utils.file_utils import invalidate_rendered_file, split_paragraphs
 
 
 class InsertItem(BaseModel):
@@ -54,6 +54,8 @@ async def insert_line(path: str, inserts: list[dict]) -> str:
             inserted_count += 1
         
         await file_service_update_file(path, paragraph_ending.join(paragraphs))
+        # 写入后立即失效渲染缓存，连续编辑不能依赖 mtime 判断文件已变化
+        invalidate_rendered_file(path)
         
         return f"【工具结果】：成功在 '{path}' 插入 {inserted_count} 个段落"
         
@@ -28,33 +28,33 @@ async def load_unload_file(file_path: str) -> str:
         # 将路径转换为绝对路径（统一存储格式）
         abs_path = normalize_to_absolute(file_path)
         
-        # 获取当前模式
-        current_mode = settings.get_config("currentMode", default="管家agent")
-        
-        # 获取当前模式的 additionalInfo 列表
-        additional_info = settings.get_config("mode", current_mode, "additionalInfo", default=[])
-        
-        # 确保 additional_info 是列表
-        if not isinstance(additional_info, list):
-            additional_info = []
-        # 检查文件是否已在 additionalInfo 中
-        if abs_path in additional_info:
-            # 文件已存在，执行卸载操作
-            additional_info.remove(abs_path)
-            
-            # 更新配置
-            settings.update_config(additional_info, "mode", current_mode, "additionalInfo")
+        # 在同一个配置事务中完成读取和修改，避免并发工具调用互相覆盖
+        with settings.config_transaction() as config:
+            # 获取当前模式
+            current_mode = config.get("currentMode", "管家agent")
+            mode_config = config.setdefault("mode", {}).setdefault(current_mode, {})
             
-            return f"【工具结果】：成功卸载文件 '{abs_path}'"
-        else:
-            # 文件不存在，执行加载操作
-            # 添加到 additionalInfo 列表
-            additional_info.append(abs_path)
-            
-            # 更新配置
-            settings.update_config(additional_info, "mode", current_mode, "additionalInfo")
+            # 获取当前模式的 additionalInfo 列表
+            additional_info = mode_config.get("additionalInfo")
             
+            # 确保 additional_info 是列表
+            if not isinstance(additional_info, list):
+                additional_info = []
+                mode_config["additionalInfo"] = additional_info
+            # 检查文件是否已在 additionalInfo 中
+            if abs_path in additional_info:
+                # 文件已存在，执行卸载操作
+                additional_info.remove(abs_path)
+                loaded = False
+            else:
+                # 文件不存在，执行加载操作
+                # 添加到 additionalInfo 列表
+                additional_info.append(abs_path)
+                loaded = True
+        
+        if loaded:
             return f"【工具结果】：成功加载文件 '{abs_path}' 到末尾附加消息"
+        return f"【工具结果】：成功卸载文件 '{abs_path}'"
             
     except Exception as e:
         return f"【工具结果】：操作失败: {str(e)}"
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Optional
 from langchain.tools import tool
 from backend.file.file_service import update_file, delete_file
+from backend.ai_agent.utils.file_utils import invalidate_rendered_file
 
 class ManageFileInput(BaseModel):
     path: str = Field(description="文件的路径（推荐.md后缀，也允许其他后缀）")
@@ -28,10 +29,13 @@ async def manage_file(path: str, content: Optional[str]) -> str:
         # 如果content为None，删除文件
         if content is None:
             await delete_file(path)
+            invalidate_rendered_file(path)
             return f"【工具结果】：文件 '{path}' 删除成功"
         
         # 写入文件内容
         await update_file(path, content)
+        # 写入后立即失效渲染缓存，连续编辑不能依赖 mtime 判断文件已变化
+        invalidate_rendered_file(path)
         return f"【工具结果】：文件 '{path}' 写入成功，内容长度: {len(content)} 字符"
     
     except Exception as e:
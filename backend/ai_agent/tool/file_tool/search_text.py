@@ -4,6 +4,7 @@ from typing import Optional
 from pydantic import BaseModel, Field
 from langchain.tools import tool
 from backend.file.file_service import search_files_for_ai, read_file as file_service_read_file, update_file as file_service_update_file
+from backend.ai_agent.utils.file_utils import invalidate_rendered_file
 
 
 class SearchTextInput(BaseModel):
@@ -97,6 +98,8 @@ async def search_text(path: Optional[str] = None, pattern: str = None, replace:
                 return f"【工具结果】：在文件 '{path}' 中未找到匹配项，无内容被替换"
             
             await file_service_update_file(path, new_content)
+            # 写入后立即失效渲染缓存，连续编辑不能依赖 mtime 判断文件已变化
+            invalidate_rendered_file(path)
             
             # 统计替换次数
             match_count = len(regex.findall(content))
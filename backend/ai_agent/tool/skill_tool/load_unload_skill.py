@@ -32,41 +32,45 @@ async def load_unload_skill(skill_name: str) -> str:
     }
     """
     try:
-        # 获取当前模式
-        current_mode = settings.get_config("currentMode", default="管家agent")
-        
-        # 获取当前模式的 skillPaths 列表（存储 SKILL.md 文件的绝对路径）
-        skill_paths = settings.get_config("mode", current_mode, "skillPaths", default=[])
-        
-        # 确保 skill_paths 是列表
-        if not isinstance(skill_paths, list):
-            skill_paths = []
-        
         # 使用 SkillLoader 获取 Skill 信息
         skill_loader = get_skill_loader()
-        all_skills = skill_loader.load_all_skills()
         
         # 检查 Skill 是否存在
-        skill = all_skills.get(skill_name)
+        skill = skill_loader.get_skill(skill_name)
         if not skill:
             return f"【工具结果】：失败 - Skill '{skill_name}' 不存在"
         
         # 获取 Skill 的 SKILL.md 文件绝对路径
         skill_md_path = str(skill.file_path.resolve())
         
-        # 检查 Skill 是否已在 skillPaths 中
-        if skill_md_path in skill_paths:
-            # Skill 已存在，执行卸载操作
-            skill_paths.remove(skill_md_path)
-            settings.update_config(skill_paths, "mode", current_mode, "skillPaths")
-            logger.info(f"卸载 Skill: {skill_name}")
-            return f"【工具结果】：成功卸载 Skill '{skill_name}'"
-        else:
-            skill_paths.append(skill_md_path)
-            settings.update_config(skill_paths, "mode", current_mode, "skillPaths")
+        # 在同一个配置事务中完成读取和修改，避免并发工具调用互相覆盖
+        with settings.config_transaction() as config:
+            # 获取当前模式
+            current_mode = config.get("currentMode", "管家agent")
+            mode_config = config.setdefault("mode", {}).setdefault(current_mode, {})
             
+            # 获取当前模式的 skillPaths 列表（存储 SKILL.md 文件的绝对路径）
+            skill_paths = mode_config.get("skillPaths")
+            
+            # 确保 skill_paths 是列表
+            if not isinstance(skill_paths, list):
+                skill_paths = []
+                mode_config["skillPaths"] = skill_paths
+            
+            # 检查 Skill 是否已在 skillPaths 中
+            if skill_md_path in skill_paths:
+                # Skill 已存在，执行卸载操作
+                skill_paths.remove(skill_md_path)
+                loaded = False
+            else:
+                skill_paths.append(skill_md_path)
+                loaded = True
+        
+        if loaded:
             logger.info(f"加载 Skill: {skill_name}")
             return f"【工具结果】：成功加载 Skill '{skill_name}'"
+        logger.info(f"卸载 Skill: {skill_name}")
+        return f"【工具结果】：成功卸载 Skill '{skill_name}'"
             
     except Exception as e:
         logger.error(f"加载/卸载 Skill 失败 {skill_name}: {e}")
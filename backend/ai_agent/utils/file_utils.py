@@ -1,9 +1,25 @@
 """
 文件工具函数
 提供统一的文件处理功能
+
+按段落渲染的结果（段落、短哈希、"段落号-短哈希|内容" 文本）按 (绝对路径, mtime_ns, 文件大小) 缓存，
+已加载文件的提示词构建与 delete_line / replace_line 的哈希校验共用，文件未变化时不重复读取和计算哈希；
+缓存按占用的字节数淘汰最久未使用的条目
 """
 
+import asyncio
 import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from backend.file.file_service import resolve_file_path, read_file
+from backend.ai_agent.utils.token_utils import estimate_text_tokens
+
+# 渲染缓存占用内存上限（字节）
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
 
 
 def split_paragraphs(content: str) -> tuple[list[str], str]:
@@ -80,14 +96,150 @@ def parse_id(item_id: str) -> tuple[int, str]:
 
 def format_file_with_hashes(content: str) -> str:
     """将文件内容格式化为 "段落号-短哈希|内容" 的形式"""
+    return render_paragraphs(content).formatted
+
+
+class RenderedFile:
+    """按段落渲染的文件内容（缓存中共享，调用方不应修改）"""
+
+    __slots__ = ("paragraphs", "paragraph_ending", "hashes", "formatted", "line_tokens", "tokens", "size", "nbytes")
+
+    def __init__(
+        self,
+        paragraphs: Tuple[str, ...],
+        paragraph_ending: str,
+        hashes: Tuple[str, ...],
+        formatted: str,
+        line_tokens: Tuple[int, ...],
+        size: int
+    ):
+        self.paragraphs = paragraphs
+        self.paragraph_ending = paragraph_ending
+        # 各段落的短哈希，与 formatted 中的ID一致
+        self.hashes = hashes
+        self.formatted = formatted
+        # formatted 中每行的估算 token 数（含换行），用于按预算截取段落窗口
+        self.line_tokens = line_tokens
+        self.tokens = sum(line_tokens) if line_tokens else estimate_text_tokens(formatted)
+        # 文件内容的字符数，为 0 表示空文件或文件不存在
+        self.size = size
+        # 缓存占用的内存估算
+        self.nbytes = (
+            sys.getsizeof(formatted) + sys.getsizeof(line_tokens)
+            + sum(sys.getsizeof(paragraph) for paragraph in paragraphs)
+        )
+
+
+def render_paragraphs(content: str) -> RenderedFile:
+    """分割段落并计算每段的短哈希"""
+    paragraphs, paragraph_ending = split_paragraphs(content)
+    hashes = tuple(get_short_hash(paragraph) for paragraph in paragraphs)
+
     if not content or not content.strip():
-        return "(空文件)"
+        return RenderedFile(tuple(paragraphs), paragraph_ending, hashes, "(空文件)", (), len(content))
+
+    lines = [
+        f"{i}-{short_hash}|{paragraph}"
+        for i, (short_hash, paragraph) in enumerate(zip(hashes, paragraphs), start=1)
+    ]
+    line_tokens = tuple(estimate_text_tokens(line) + 1 for line in lines)
+    return RenderedFile(tuple(paragraphs), paragraph_ending, hashes, "\n".join(lines), line_tokens, len(content))
+
+
+_render_lock = threading.Lock()
+# {绝对路径: ((mtime_ns, 文件大小), 渲染结果)}
+_render_cache: "OrderedDict[str, Tuple[Tuple[int, int], RenderedFile]]" = OrderedDict()
+_render_cache_bytes = 0
+# 主动失效次数，写入方每次写入文件后加一（供依赖文件内容的快照判断是否失效）
+_render_generation = 0
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    获取文件的 (mtime_ns, 大小) 签名，与渲染缓存的失效依据一致
+
+    Args:
+        file_path: 文件路径（相对 DATA_DIR 或绝对路径）
+
+    Returns:
+        签名元组，文件不存在时返回 None
+    """
+    return _file_signature(os.path.abspath(resolve_file_path(file_path)))
+
+
+def _cache_put(path: str, signature: Tuple[int, int], rendered: RenderedFile) -> None:
+    global _render_cache_bytes
+    with _render_lock:
+        previous = _render_cache.pop(path, None)
+        if previous is not None:
+            _render_cache_bytes -= previous[1].nbytes
+        if rendered.nbytes > RENDER_CACHE_MAX_BYTES:
+            return
+        _render_cache[path] = (signature, rendered)
+        _render_cache_bytes += rendered.nbytes
+        while _render_cache_bytes > RENDER_CACHE_MAX_BYTES:
+            _, (_, evicted) = _render_cache.popitem(last=False)
+            _render_cache_bytes -= evicted.nbytes
 
-    paragraphs, _ = split_paragraphs(content)
-    lines = []
 
-    for i, para in enumerate(paragraphs, start=1):
-        item_id = make_id(i, para)
-        lines.append(f"{item_id}|{para}")
+def invalidate_rendered_file(file_path: str) -> None:
+    """
+    移除文件的渲染缓存，写入文件后调用
+
+    mtime 精度较粗的文件系统（FAT/exFAT 等）上，快速连续的等长修改可能不改变 (mtime_ns, 大小)，
+    写入方必须主动失效，不能只依赖签名判断
+
+    Args:
+        file_path: 文件路径（相对 DATA_DIR 或绝对路径）
+    """
+    global _render_cache_bytes, _render_generation
+    path = os.path.abspath(resolve_file_path(file_path))
+    with _render_lock:
+        _render_generation += 1
+        previous = _render_cache.pop(path, None)
+        if previous is not None:
+            _render_cache_bytes -= previous[1].nbytes
+
 
-    return "\n".join(lines)
+def get_render_generation() -> int:
+    """获取渲染缓存的主动失效次数，不变时说明期间没有写入方写入文件"""
+    with _render_lock:
+        return _render_generation
+
+
+async def get_rendered_file(file_path: str) -> RenderedFile:
+    """
+    读取文件并按段落渲染，文件未变化（mtime_ns 与大小相同）时直接返回缓存结果
+
+    Args:
+        file_path: 文件路径（相对 DATA_DIR 或绝对路径）
+
+    Returns:
+        渲染结果；文件不存在时返回空结果（与 read_file 一致）
+    """
+    path = os.path.abspath(resolve_file_path(file_path))
+    signature = _file_signature(path)
+    if signature is None:
+        return render_paragraphs("")
+
+    with _render_lock:
+        cached = _render_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            _render_cache.move_to_end(path)
+            return cached[1]
+
+    content = await read_file(path)
+    # 长文件的段落哈希计算较慢，放到线程中执行
+    rendered = await asyncio.to_thread(render_paragraphs, content)
+    # 读取期间文件被修改时不写入缓存，下次调用重新读取
+    if _file_signature(path) == signature:
+        _cache_put(path, signature, rendered)
+    return rendered
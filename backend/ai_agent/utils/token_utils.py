@@ -0,0 +1,206 @@
+"""
+token 估算与消息修剪
+按字符类型估算 token（中日韩字符约 1 字/token，其余约 4 字符/token），每条消息只估算一次；
+会话内维护消息 token 前缀和，新增消息时增量追加，修剪时二分查找保留起点；
+可用模型返回的 usage_metadata 校准估算值
+"""
+import bisect
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, ToolMessage
+
+# 中日韩文字、假名、谚文及全角标点
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_CHARS_PER_TOKEN = 4.0
+# 每条消息的角色、分隔符等固定开销
+TOKENS_PER_MESSAGE = 4
+
+# 校准系数范围与平滑因子（实际 token / 估算 token）
+CALIBRATION_MIN = 0.5
+CALIBRATION_MAX = 3.0
+CALIBRATION_ALPHA = 0.3
+
+# 单条消息 token 缓存上限与会话前缀和缓存上限
+MESSAGE_CACHE_SIZE = 20000
+THREAD_INDEX_SIZE = 32
+
+_lock = threading.Lock()
+# {消息ID: (内容哈希, token 数)}
+_message_tokens: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+# {模型名: 校准系数}
+_calibration: Dict[str, float] = {}
+# {thread_id: 会话消息前缀和}
+_thread_indexes: "OrderedDict[str, _ThreadTokenIndex]" = OrderedDict()
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return int(cjk_count * CJK_TOKENS_PER_CHAR + other_count / OTHER_CHARS_PER_TOKEN + 0.999)
+
+
+def _message_text(message: BaseMessage) -> str:
+    """提取消息中参与计数的文本（内容 + 工具调用）"""
+    content = message.content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        content = "".join(parts)
+    text = str(content or "")
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps(
+            [{"name": call["name"], "args": call["args"]} for call in message.tool_calls],
+            ensure_ascii=False
+        )
+    return text
+
+
+def _content_signature(message: BaseMessage) -> int:
+    """消息内容签名；str 的哈希值会缓存在对象上，重复计算为 O(1)"""
+    content = message.content
+    signature = hash(content) if isinstance(content, str) else hash(repr(content))
+    if isinstance(message, AIMessage) and message.tool_calls:
+        signature ^= hash(repr(message.tool_calls))
+    return signature
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """估算单条消息的 token 数，按消息ID缓存（内容变化时重新估算）"""
+    message_id = message.id
+    signature = _content_signature(message)
+    if message_id:
+        with _lock:
+            cached = _message_tokens.get(message_id)
+            if cached and cached[0] == signature:
+                _message_tokens.move_to_end(message_id)
+                return cached[1]
+
+    tokens = estimate_text_tokens(_message_text(message)) + TOKENS_PER_MESSAGE
+
+    if message_id:
+        with _lock:
+            _message_tokens[message_id] = (signature, tokens)
+            while len(_message_tokens) > MESSAGE_CACHE_SIZE:
+                _message_tokens.popitem(last=False)
+    return tokens
+
+
+def count_messages_tokens(messages: Sequence[BaseMessage]) -> int:
+    """估算消息列表的 token 总数（未校准）"""
+    return sum(count_message_tokens(message) for message in messages)
+
+
+def get_calibration(model: str) -> float:
+    """获取模型的校准系数（无记录时为 1.0）"""
+    return _calibration.get(model, 1.0)
+
+
+def record_usage(model: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+    """
+    用模型返回的实际输入 token 数校准估算值（指数平滑）
+
+    Args:
+        model: 模型名
+        estimated_tokens: 本次请求的估算输入 token 数（未校准）
+        actual_tokens: usage_metadata 中的 input_tokens
+    """
+    if not actual_tokens or estimated_tokens <= 0:
+        return
+    ratio = min(max(actual_tokens / estimated_tokens, CALIBRATION_MIN), CALIBRATION_MAX)
+    with _lock:
+        previous = _calibration.get(model)
+        _calibration[model] = ratio if previous is None else previous + CALIBRATION_ALPHA * (ratio - previous)
+
+
+class _ThreadTokenIndex:
+    """单个会话的消息 token 前缀和，消息只追加时增量更新"""
+
+    def __init__(self):
+        self.ids: List[Optional[str]] = []
+        self.signatures: List[int] = []
+        self.prefix: List[int] = [0]
+
+    def sync(self, messages: Sequence[BaseMessage]) -> List[int]:
+        """与当前消息列表同步，返回前缀和（prefix[i] 为前 i 条消息的 token 总数）"""
+        known = len(self.ids)
+        # 已记录部分未变化（首尾消息的ID与内容都一致）时只追加新消息，否则重建
+        unchanged = (
+            known <= len(messages)
+            and known > 0
+            and self.ids[0] == messages[0].id
+            and self.ids[-1] == messages[known - 1].id
+            and self.signatures[-1] == _content_signature(messages[known - 1])
+        )
+        if not unchanged:
+            self.ids, self.signatures, self.prefix = [], [], [0]
+            known = 0
+        for message in messages[known:]:
+            self.ids.append(message.id)
+            self.signatures.append(_content_signature(message))
+            self.prefix.append(self.prefix[-1] + count_message_tokens(message))
+        return self.prefix
+
+
+def _get_prefix_sums(messages: Sequence[BaseMessage], thread_id: Optional[str]) -> List[int]:
+    if not thread_id:
+        return _ThreadTokenIndex().sync(messages)
+    with _lock:
+        index = _thread_indexes.get(thread_id)
+        if index is None:
+            index = _ThreadTokenIndex()
+            _thread_indexes[thread_id] = index
+        _thread_indexes.move_to_end(thread_id)
+        while len(_thread_indexes) > THREAD_INDEX_SIZE:
+            _thread_indexes.popitem(last=False)
+    return index.sync(messages)
+
+
+def trim_messages_to_budget(
+    messages: Sequence[BaseMessage],
+    max_tokens: Optional[int],
+    thread_id: Optional[str] = None,
+    model: Optional[str] = None,
+) -> List[BaseMessage]:
+    """
+    保留最新的消息使其总 token 不超过预算（等价于 trim_messages 的 strategy="last"、
+    start_on="human"、end_on=("human", "tool")）
+
+    Args:
+        messages: 会话消息（不含系统提示词）
+        max_tokens: token 预算，为空时不修剪
+        thread_id: 会话ID，用于复用该会话的前缀和
+        model: 模型名，用于应用校准系数
+
+    Returns:
+        修剪后的消息列表
+    """
+    if max_tokens is None or not messages:
+        return list(messages)
+
+    # 末尾必须是 human 或 tool 消息
+    end = len(messages)
+    while end > 0 and not isinstance(messages[end - 1], (HumanMessage, ToolMessage)):
+        end -= 1
+    if end == 0:
+        return []
+
+    prefix = _get_prefix_sums(messages, thread_id)
+    budget = max_tokens / get_calibration(model) if model else max_tokens
+    # 找到最小的起点 start，使 prefix[end] - prefix[start] <= budget
+    start = bisect.bisect_left(prefix, prefix[end] - budget, 0, end + 1)
+    # 起点必须是 human 消息
+    while start < end and not isinstance(messages[start], HumanMessage):
+        start += 1
+    return list(messages[start:end])
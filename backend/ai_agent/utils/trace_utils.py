@@ -0,0 +1,161 @@
+"""
+调用链调试输出
+热路径上的大对象（完整 state、发送给AI的消息、模型响应）只在需要时才格式化：
+
+- 调试转储受日志级别（DEBUG）或按会话开启的调试开关（tracing.debugThreads）控制，
+  未开启时不会对消息做任何字符串化；开启后按 tracing.sampleRate 采样，并截断到 tracing.maxChars
+- 完整提示词快照（tracing.promptSnapshot）由后台线程写入日志目录（数据目录之外）的滚动日志文件 prompt_snapshots.log，
+  序列化与写盘都不占用事件循环
+"""
+import json
+import logging
+import queue
+import random
+import threading
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from backend.settings.settings import settings
+
+logger = logging.getLogger("backend.trace")
+
+# 默认截断长度、快照文件大小与保留份数
+DEFAULT_MAX_CHARS = 2000
+DEFAULT_SNAPSHOT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_SNAPSHOT_BACKUPS = 3
+
+
+def _tracing_config() -> Dict[str, Any]:
+    config = settings.get_config("tracing", default={}) or {}
+    return {
+        "debugThreads": config.get("debugThreads") or [],
+        "sampleRate": float(config.get("sampleRate", 1.0)),
+        "maxChars": int(config.get("maxChars", DEFAULT_MAX_CHARS)),
+        "promptSnapshot": bool(config.get("promptSnapshot", False)),
+    }
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """截断过长文本，保留首尾并注明省略的字符数"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]} …（省略 {len(text) - max_chars} 字符）… {text[-tail:]}"
+
+
+class LazyText:
+    """延迟格式化：只有日志记录真正输出时才调用 repr 并截断"""
+
+    __slots__ = ("value", "max_chars")
+
+    def __init__(self, value: Any, max_chars: int):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        return truncate(repr(self.value) if not isinstance(self.value, str) else self.value, self.max_chars)
+
+
+def describe_messages(messages: Sequence[Any]) -> str:
+    """消息列表的简要描述（条数、各条类型与长度），开销与消息内容大小无关"""
+    parts = []
+    for message in messages:
+        content = getattr(message, "content", "")
+        size = len(content) if isinstance(content, str) else sum(len(str(block)) for block in content)
+        tool_calls = len(getattr(message, "tool_calls", None) or [])
+        parts.append(f"{getattr(message, 'type', '?')}:{size}" + (f"+{tool_calls}tc" if tool_calls else ""))
+    return f"{len(messages)} 条 [{', '.join(parts)}]"
+
+
+def trace_level(thread_id: Optional[str]) -> Optional[int]:
+    """
+    获取本次调试转储应使用的日志级别，不需要转储时返回 None
+
+    全局 DEBUG 时按 DEBUG 级别输出；会话在 tracing.debugThreads 中时按 INFO 级别输出（不受全局级别影响）；
+    之后再按 sampleRate 采样
+    """
+    config = _tracing_config()
+    if logger.isEnabledFor(logging.DEBUG):
+        level = logging.DEBUG
+    elif thread_id and thread_id in config["debugThreads"]:
+        level = logging.INFO
+    else:
+        return None
+    if config["sampleRate"] < 1.0 and random.random() >= config["sampleRate"]:
+        return None
+    return level
+
+
+def trace(thread_id: Optional[str], label: str, value: Any) -> None:
+    """
+    输出调试转储（未开启时不做任何格式化）
+
+    Args:
+        thread_id: 会话ID
+        label: 转储内容说明
+        value: 要转储的对象，输出时才 repr 并截断
+    """
+    level = trace_level(thread_id)
+    if level is None:
+        return
+    logger.log(level, "[%s] %s: %s", thread_id, label, LazyText(value, _tracing_config()["maxChars"]))
+
+
+class PromptSnapshotWriter:
+    """提示词快照写入器：调用方只入队，后台线程负责序列化并写入滚动日志文件"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=64)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file_logger: Optional[logging.Logger] = None
+
+    def record(self, thread_id: Optional[str], model: str, messages: Sequence[Any]) -> None:
+        """记录一次完整提示词（未开启 tracing.promptSnapshot 时直接返回）"""
+        if not _tracing_config()["promptSnapshot"]:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait({"thread_id": thread_id, "model": model, "messages": list(messages)})
+        except queue.Full:
+            logger.warning("提示词快照队列已满，丢弃本次快照")
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            # 写入数据目录之外：快照包含完整章节内容，不能进入工作区文件树、文件监控和回档
+            log_dir = Path(settings.LOG_DIR)
+            log_dir.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                log_dir / "prompt_snapshots.log",
+                maxBytes=DEFAULT_SNAPSHOT_MAX_BYTES,
+                backupCount=DEFAULT_SNAPSHOT_BACKUPS,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            file_logger = logging.getLogger("backend.trace.prompt_snapshot")
+            file_logger.setLevel(logging.INFO)
+            file_logger.propagate = False
+            file_logger.addHandler(handler)
+            self._file_logger = file_logger
+            self._thread = threading.Thread(target=self._run, name="prompt-snapshot-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            snapshot = self._queue.get()
+            try:
+                snapshot["messages"] = [
+                    message.model_dump() if hasattr(message, "model_dump") else repr(message)
+                    for message in snapshot["messages"]
+                ]
+                self._file_logger.info(json.dumps(snapshot, ensure_ascii=False, default=str))
+            except Exception as e:
+                logger.warning(f"写入提示词快照失败: {type(e).__name__}: {e}")
+
+
+# 全局单例
+prompt_snapshot_writer = PromptSnapshotWriter()
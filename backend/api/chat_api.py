@@ -1,11 +1,13 @@
 import json
 import logging
 import asyncio
+from typing import Dict
 from pydantic import BaseModel, Field
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 from backend.settings.settings import settings
 from backend.ai_agent.core.graph_builder import with_graph_builder
+from backend.ai_agent.core.system_prompt_builder import get_context_section_stats
 # 小写的时全局实例，导入实例能确保唯一，导入类名则每个文件都不同
 from backend.ai_agent.models.stream_interrupt_manager import stream_interrupt_manager
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
@@ -46,7 +48,7 @@ class InterruptResponseRequest(BaseModel):
     interrupt_id: str = Field(..., description="中断ID")
     choice: str = Field(..., description="用户选择 ('1'=恢复, '2'=取消)")
     additional_data: str = Field(default="", description="附加信息")
-    user_diff: str = Field(default=None, description="用户对AI建议内容的修改diff")
+    user_diffs: Dict[str, str] = Field(default_factory=dict, description="用户对AI建议内容的修改diff，{tool_call_id: diff}")
 
 class NewThreadRequest(BaseModel):
     """创建新会话请求"""
@@ -87,6 +89,9 @@ async def send_chat_message(request: ChatMessageRequest):
     @with_graph_builder
     async def generate_response(graph):
         """处理消息并返回生成器"""
+        # 持有会话写锁，避免后台任务（如自动总结）在流式传输期间修改会话状态
+        thread_lock = stream_interrupt_manager.thread_lock(thread_id)
+        await thread_lock.acquire()
         try:
             config = {
                 "configurable": {
@@ -107,10 +112,6 @@ async def send_chat_message(request: ChatMessageRequest):
                     yield json.dumps({"interrupted": True}, ensure_ascii=False) + "\n"
                     break
                 
-                # 在控制台打印流式传输信息
-                if message_chunk.content:
-                    print(message_chunk.content, end="|", flush=True)
-                
                 # 使用model_dump方法序列化完整的消息对象
                 # 添加分隔符，避免被多个json对象被拼接到一起，进而造成前端消息显示不全，隔三岔五缺几个字符的问题
                 serialized_chunk = message_chunk.model_dump()
@@ -120,6 +121,7 @@ async def send_chat_message(request: ChatMessageRequest):
             # 清理任务
             stream_interrupt_manager.remove_task(thread_id)
             logger.info(f"清理流式传输任务: {thread_id}")
+            thread_lock.release()
     
     return StreamingResponse(generate_response(), media_type="text/event-stream")
 
@@ -150,16 +152,17 @@ async def send_interrupt_response(request: InterruptResponseRequest):
     - **interrupt_id**: 中断ID
     - **choice**: 用户选择 ('1'=恢复, '2'=取消)
     - **additional_data**: 附加信息
+    - **user_diffs**: 用户对各工具调用建议内容的修改diff，{tool_call_id: diff}
     """
     interrupt_id = request.interrupt_id
     choice = request.choice
     additional_data = request.additional_data
-    user_diff = request.user_diff
-    print(f"api处的用户修改:{user_diff}")
+    user_diffs = request.user_diffs
+    logger.debug(f"用户修改了 {len(user_diffs or {})} 个调用的建议内容")
     thread_id = settings.get_config("thread_id")
     logger.info(f"收到中断响应: interrupt_id={interrupt_id}, choice={choice}, thread_id: {thread_id}")
-    if user_diff:
-        logger.info(f"用户对AI建议内容的diff长度: {len(user_diff)}")
+    for tool_call_id, user_diff in user_diffs.items():
+        logger.info(f"用户对AI建议内容的diff长度: {tool_call_id} -> {len(user_diff)}")
     
     # 为thread_id创建流式传输任务
     stream_interrupt_manager.create_task(thread_id)
@@ -168,6 +171,9 @@ async def send_interrupt_response(request: InterruptResponseRequest):
     @with_graph_builder
     async def remove_interrupt_response(graph):
         """处理中断响应并返回生成器"""
+        # 持有会话写锁，避免后台任务（如自动总结）在流式传输期间修改会话状态
+        thread_lock = stream_interrupt_manager.thread_lock(thread_id)
+        await thread_lock.acquire()
         try:
             config = {"configurable": {"thread_id": thread_id}}
             
@@ -177,8 +183,8 @@ async def send_interrupt_response(request: InterruptResponseRequest):
                 "choice_data": additional_data
             }
             # 如果有用户diff，一并发送给AI
-            if user_diff:
-                resume_data["user_diff"] = user_diff
+            if user_diffs:
+                resume_data["user_diffs"] = user_diffs
                 
             human_response = Command(resume=resume_data)
             
@@ -191,9 +197,6 @@ async def send_interrupt_response(request: InterruptResponseRequest):
                     yield json.dumps({"interrupted": True}, ensure_ascii=False) + "\n"
                     break
                 
-                if message_chunk.content:
-                    print(message_chunk.content, end="/", flush=True)
-                
                 # 使用model_dump方法序列化完整的消息对象
                 serialized_chunk = message_chunk.model_dump()
                 yield json.dumps(serialized_chunk, ensure_ascii=False) + "\n"
@@ -202,6 +205,7 @@ async def send_interrupt_response(request: InterruptResponseRequest):
             # 清理任务
             stream_interrupt_manager.remove_task(thread_id)
             logger.info(f"清理流式传输任务: {thread_id}")
+            thread_lock.release()
     
     return StreamingResponse(remove_interrupt_response(), media_type="text/event-stream")
 
@@ -282,6 +286,17 @@ async def get_current_state():
     return result
 
 
+@router.get("/context-stats", summary="获取上下文快照统计")
+async def get_context_stats():
+    """
+    获取上下文各部分的本轮快照命中统计
+    
+    返回:
+    - {部分名称: {hits, misses, hitRate}}，hits 为同一轮对话中因依赖未变化而直接复用的次数
+    """
+    return get_context_section_stats()
+
+
 @router.get("/selected-model", summary="获取选中的模型")
 async def get_selected_model():
     """
@@ -313,8 +328,10 @@ async def set_selected_model(request: SelectedModelRequest):
     返回:
     - success: 是否成功
     """
-    settings.update_config(request.selectedModel, "selectedModel")
-    settings.update_config(request.selectedProvider, "selectedProvider")
+    settings.update_configs({
+        ("selectedModel",): request.selectedModel,
+        ("selectedProvider",): request.selectedProvider,
+    })
     
     logger.info(f"设置选中的模型: {request.selectedModel}, 提供商: {request.selectedProvider}")
     
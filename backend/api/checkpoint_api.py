@@ -5,10 +5,14 @@ from typing import Optional, List
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, HTTPException
 
-from backend.git.checkpoint_service import get_checkpoint_service
-
 logger = logging.getLogger(__name__)
 
+
+def _get_service():
+    """获取检查点服务（延迟导入 GitPython，避免拖慢后端启动）"""
+    from backend.git.checkpoint_service import get_checkpoint_service
+    return get_checkpoint_service()
+
 # 创建路由
 checkpoint_router = APIRouter(prefix="/api/checkpoints", tags=["checkpoints"])
 
@@ -26,7 +30,7 @@ async def get_status():
     获取当前Git状态。
     """
     try:
-        service = get_checkpoint_service()
+        service = _get_service()
         status = service.get_status()
         return status
     except Exception as e:
@@ -40,7 +44,7 @@ async def list_checkpoints():
     列出所有检查点。
     """
     try:
-        service = get_checkpoint_service()
+        service = _get_service()
         checkpoints = service.list_checkpoints()
         return {
             "success": True,
@@ -58,7 +62,7 @@ async def save_checkpoint(request: SaveCheckpointRequest):
     将当前状态保存为检查点。
     """
     try:
-        service = get_checkpoint_service()
+        service = _get_service()
         result = service.save_checkpoint(message=request.message)
         return result
     except Exception as e:
@@ -72,7 +76,7 @@ async def restore_checkpoint(request: RestoreCheckpointRequest):
     将工作区恢复到指定检查点。
     """
     try:
-        service = get_checkpoint_service()
+        service = _get_service()
         result = service.restore_checkpoint(commit_hash=request.commit_hash)
         return result
     except Exception as e:
@@ -86,7 +90,7 @@ async def get_checkpoint_diff(commit_hash: str):
     获取检查点与上一个检查点之间的差异。
     """
     try:
-        service = get_checkpoint_service()
+        service = _get_service()
         result = service.get_checkpoint_diff(commit_hash=commit_hash)
         return result
     except Exception as e:
@@ -100,7 +104,7 @@ async def get_working_diff(file_path: str):
     获取当前工作区中指定文件与最新提交之间的差异。
     """
     try:
-        service = get_checkpoint_service()
+        service = _get_service()
         result = service.get_working_diff(file_path=file_path)
         return result
     except Exception as e:
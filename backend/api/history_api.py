@@ -74,7 +74,7 @@ async def get_checkpoints(request: GetCheckpointsRequest):
         config = {"configurable": {"thread_id": thread_id}}
         checkpoints = []
         async for state in graph.aget_state_history(config):
-            print(f"next={state.next}, checkpoint_id={state.config['configurable']['checkpoint_id']}")
+            logger.debug(f"next={state.next}, checkpoint_id={state.config['configurable']['checkpoint_id']}")
             checkpoints.append({
                 "next": state.next,
                 "values": state.values,
@@ -102,15 +102,17 @@ async def operate_messages(request: OperateMessagesRequest):
         """处理操作历史消息"""
         config: RunnableConfig = {"configurable": {"thread_id": thread_id}}
         
-        if target_ids is None:
-            # 删除所有消息
-            await graph.aupdate_state(config, {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)]})
-            return {"message": "已删除所有消息"}
-        else:
-            # 删除指定ID的消息（支持多个）
-            remove_messages = [RemoveMessage(id=target_id) for target_id in target_ids]
-            await graph.aupdate_state(config, {"messages": remove_messages})
-            return {"message": f"已删除消息ID: {', '.join(target_ids)}"}
+        # 持有会话写锁，避免与流式传输或后台自动总结同时修改会话状态
+        async with stream_interrupt_manager.thread_lock(thread_id):
+            if target_ids is None:
+                # 删除所有消息
+                await graph.aupdate_state(config, {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)]})
+                return {"message": "已删除所有消息"}
+            else:
+                # 删除指定ID的消息（支持多个）
+                remove_messages = [RemoveMessage(id=target_id) for target_id in target_ids]
+                await graph.aupdate_state(config, {"messages": remove_messages})
+                return {"message": f"已删除消息ID: {', '.join(target_ids)}"}
     
     # 使用async for遍历生成器并获取结果
     result = None
@@ -135,17 +137,16 @@ async def summarize_conversation(request: SummarizeRequest):
         # 直接传入总结消息，触发图执行
         summarize_message = HumanMessage(content="@summarize")
         
-        # 流式处理 - 传入消息列表触发图执行
-        async for message_chunk, metadata in graph.astream({"messages": [summarize_message]}, config, stream_mode="messages"):
-            # 在控制台打印流式传输信息
-            if message_chunk.content:
-                print(f"{message_chunk.content}", end="|", flush=True)
-            
-            # 使用model_dump方法序列化完整的消息对象
-            # 添加分隔符，避免被多个json对象被拼接到一起
-            serialized_chunk = message_chunk.model_dump()
-            yield json.dumps(serialized_chunk, ensure_ascii=False) + "\n"
-            await asyncio.sleep(0)
+        # 持有会话写锁，避免与后台自动总结同时修改摘要
+        async with stream_interrupt_manager.thread_lock(thread_id):
+            # 流式处理 - 传入消息列表触发图执行
+            async for message_chunk, metadata in graph.astream({"messages": [summarize_message]}, config, stream_mode="messages"):
+                
+                # 使用model_dump方法序列化完整的消息对象
+                # 添加分隔符，避免被多个json对象被拼接到一起
+                serialized_chunk = message_chunk.model_dump()
+                yield json.dumps(serialized_chunk, ensure_ascii=False) + "\n"
+                await asyncio.sleep(0)
     
     return StreamingResponse(generate_summary(), media_type="text/event-stream")
 
@@ -430,6 +431,9 @@ async def regenerate_from_checkpoint_stream(request: RegenerateRequest):
     @with_graph_builder
     async def process_regenerate_stream(graph):
         """处理重新生成操作并流式返回"""
+        # 持有会话写锁，避免后台任务（如自动总结）在流式传输期间修改会话状态
+        thread_lock = stream_interrupt_manager.thread_lock(thread_id)
+        await thread_lock.acquire()
         try:
             # 通过消息ID找到对应的checkpoint（匹配最后一个消息的ID）
             target_checkpoint = await find_checkpoint_by_message_id(graph, thread_id, message_id)
@@ -468,9 +472,6 @@ async def regenerate_from_checkpoint_stream(request: RegenerateRequest):
                     yield json.dumps({"interrupted": True}, ensure_ascii=False) + "\n"
                     break
                 
-                if message_chunk.content:
-                    print(message_chunk.content, end="|", flush=True)
-                
                 # 使用model_dump方法序列化完整的消息对象
                 serialized_chunk = message_chunk.model_dump()
                 yield json.dumps(serialized_chunk, ensure_ascii=False) + "\n"
@@ -479,5 +480,6 @@ async def regenerate_from_checkpoint_stream(request: RegenerateRequest):
             # 清理任务
             stream_interrupt_manager.remove_task(thread_id)
             logger.info(f"清理流式传输任务: {thread_id}")
+            thread_lock.release()
     
     return StreamingResponse(process_regenerate_stream(), media_type="text/event-stream")
\ No newline at end of file
@@ -15,7 +15,8 @@ from backend.ai_agent.embedding import (
     asearch_emb,
     get_all_knowledge_bases,
     get_two_step_rag_config,
-    set_two_step_rag_config
+    set_two_step_rag_config,
+    get_query_embedding_cache_stats
 )
 
 logger = logging.getLogger(__name__)
@@ -118,10 +119,9 @@ async def add_knowledge_base(request: AddKnowledgeBaseRequest):
         "returnDocs": request.returnDocs
     }
     
-    # 获取当前知识库配置并添加新的
+    # 只写入新增的知识库项，避免覆盖并发修改
+    settings.update_config(kb_config, "knowledgeBase", kb_id)
     knowledge_base = settings.get_config("knowledgeBase", default={})
-    knowledge_base[kb_id] = kb_config
-    settings.update_config(knowledge_base, "knowledgeBase")
     
     logger.info(f"添加知识库: {kb_id} - {request.name}")
     
@@ -154,7 +154,7 @@ async def update_knowledge_base(kb_id: str, request: UpdateKnowledgeBaseRequest)
         updated_config[key] = value
     
     knowledge_base[kb_id] = updated_config
-    settings.update_config(knowledge_base, "knowledgeBase")
+    settings.update_config(updated_config, "knowledgeBase", kb_id)
     
     logger.info(f"更新知识库: {kb_id}")
     
@@ -168,12 +168,9 @@ async def delete_knowledge_base(kb_id: str):
     
     - **kb_id**: 知识库ID（路径参数）
     """
-    # 获取当前知识库配置
-    knowledge_base = settings.get_config("knowledgeBase", default={})
-    
     # 先删除知识库配置（即使集合删除失败，配置也能清理干净）
-    del knowledge_base[kb_id]
-    settings.update_config(knowledge_base, "knowledgeBase")
+    settings.delete_config("knowledgeBase", kb_id)
+    knowledge_base = settings.get_config("knowledgeBase", default={})
     
     # 再删除向量集合（忽略不存在的错误）
     try:
@@ -341,6 +338,17 @@ async def search_knowledge_base_async(kb_id: str, request: SearchKnowledgeBaseRe
     }
 
 
+@router.get("/query-cache/stats", summary="获取查询向量缓存统计")
+def get_query_cache_stats():
+    """
+    获取知识库检索的查询向量缓存统计
+    
+    Returns:
+        Dict: 命中次数、未命中次数、命中率、当前条数、条数上限与有效期（秒）
+    """
+    return get_query_embedding_cache_stats()
+
+
 @router.get("/two-step-rag", summary="获取两步RAG配置")
 def get_two_step_rag():
     """
@@ -26,6 +26,7 @@ class UpdateModeRequest(BaseModel):
     temperature: Optional[float] = Field(None, description="温度参数")
     top_p: Optional[float] = Field(None, description="top_p参数")
     max_tokens: Optional[int] = Field(None, description="最大token数")
+    contextBudget: Optional[Dict[str, Any]] = Field(None, description="环境信息预算")
     additionalInfo: Optional[List[str]] = Field(None, description="额外信息")
     tools: Optional[List[str]] = Field(None, description="工具列表")
 
@@ -99,6 +100,7 @@ async def update_custom_mode(mode_id: str, request: UpdateModeRequest):
     - **temperature**: 温度参数（可选）
     - **top_p**: top_p参数（可选）
     - **max_tokens**: 最大token数（可选）
+    - **contextBudget**: 环境信息预算（可选）
     - **additionalInfo**: 额外信息（可选）
     - **tools**: 工具列表（可选）
     """
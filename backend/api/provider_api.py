@@ -128,27 +128,25 @@ async def add_favorite_model(request: AddFavoriteModelRequest):
     - **context**: 上下文长度（chat模型）或max-tokens（embedding模型）
     - **dimensions**: 嵌入维度（仅embedding模型）
     """
-    # 获取当前provider的favoriteModels配置
-    provider_config = settings.get_config("provider", request.provider, default={})
-    favorite_models = provider_config.get("favoriteModels")
-    
     # 根据模型类型添加模型
     if request.modelType == "chat":
         # chat模型存储上下文长度
-        favorite_models["chat"][request.modelId] = request.context
+        model_value = request.context
     elif request.modelType == "embedding":
         # embedding模型存储维度和max-tokens信息
-        favorite_models["embedding"][request.modelId] = {
+        model_value = {
             "dimensions": request.dimensions,
             "max-tokens": request.context,
             "per-max-tokens": False
         }
     elif request.modelType == "other":
         # other模型只存储模型ID
-        favorite_models["other"][request.modelId] = {}
+        model_value = {}
+    else:
+        return settings.get_config("provider", default={})
     
-    # 更新配置
-    settings.update_config(favorite_models, "provider", request.provider, "favoriteModels")
+    # 只写入该模型项，避免覆盖并发修改
+    settings.update_config(model_value, "provider", request.provider, "favoriteModels", request.modelType, request.modelId)
     return settings.get_config("provider", default={})
     
 
@@ -161,13 +159,8 @@ async def remove_favorite_model(request: RemoveFavoriteModelRequest):
     - **provider**: 提供商ID
     - **modelType**: 模型类型（chat/embedding/other）
     """
-    # 获取提供商的favoriteModels配置
-    model_dict = settings.get_config("provider", request.provider, "favoriteModels", request.modelType, default={})
-    
     # 如果模型存在，删除它
-    if request.modelId in model_dict:
-        del model_dict[request.modelId]
-        settings.update_config(model_dict, "provider", request.provider, "favoriteModels", request.modelType)
+    settings.delete_config("provider", request.provider, "favoriteModels", request.modelType, request.modelId)
     return settings.get_config("provider", default={})
 
 @router.post("/custom-providers", summary="添加自定义提供商", response_model=Dict[str, Any])
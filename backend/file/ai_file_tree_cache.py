@@ -0,0 +1,94 @@
+"""
+AI 文件树缓存
+进程级缓存格式化后的 AI 文件树文本（提示词中的工作区文件结构），由文件监控服务精确失效：
+
+- 文件/文件夹的创建、删除、移动会改变文件树，使缓存失效；文件内容修改不影响文件树，只有 .aiignore 被修改时才失效
+- 文件监控未运行时无法感知变化，不使用缓存，每次重新生成
+- 生成期间发生变化（版本号改变）时，本次结果只返回不写入缓存
+
+文件监控忽略的目录（.git、db、chromadb）默认也在 .aiignore 中，其中的变化不影响 AI 文件树
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+AI_IGNORE_FILENAME = ".aiignore"
+
+
+class AiFileTreeCache:
+    """AI 文件树缓存（watchdog 线程负责失效，事件循环负责读取和生成）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._enabled = False
+        self._version = 0
+        self._text: Optional[str] = None
+        # 并发的提示词构建共享同一次生成
+        self._build_lock = asyncio.Lock()
+
+    def set_enabled(self, enabled: bool) -> None:
+        """文件监控启动/停止时调用，停止后不再信任缓存"""
+        with self._lock:
+            self._enabled = enabled
+            self._version += 1
+            self._text = None
+        logger.info(f"AI文件树缓存已{'启用' if enabled else '停用'}")
+
+    def on_file_event(self, event_type: str, path: str) -> None:
+        """
+        处理文件监控事件
+
+        Args:
+            event_type: created / modified / deleted / moved
+            path: 事件路径
+        """
+        if event_type == "modified" and os.path.basename(path) != AI_IGNORE_FILENAME:
+            return
+        self.invalidate()
+
+    def generation(self) -> Optional[int]:
+        """当前版本号，文件树可能变化时改变；文件监控未运行（无法感知变化）时返回 None"""
+        with self._lock:
+            return self._version if self._enabled else None
+
+    def invalidate(self) -> None:
+        """使缓存失效"""
+        with self._lock:
+            self._version += 1
+            self._text = None
+
+    async def get(self, build: Callable[[], Awaitable[str]]) -> str:
+        """
+        获取 AI 文件树文本，缓存无效时调用 build 生成
+
+        Args:
+            build: 生成格式化文件树文本的协程函数（出错时应抛出异常，避免缓存错误结果）
+
+        Returns:
+            格式化的文件树文本
+        """
+        with self._lock:
+            if self._text is not None:
+                return self._text
+            enabled = self._enabled
+        if not enabled:
+            return await build()
+
+        async with self._build_lock:
+            with self._lock:
+                if self._text is not None:
+                    return self._text
+                version = self._version
+            text = await build()
+            with self._lock:
+                if self._enabled and self._version == version:
+                    self._text = text
+            return text
+
+
+# 全局单例
+ai_file_tree_cache = AiFileTreeCache()
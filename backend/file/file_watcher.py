@@ -8,6 +8,7 @@ from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 from backend.settings.settings import settings
+from backend.file.ai_file_tree_cache import ai_file_tree_cache
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +31,8 @@ class FileWatcherService(FileSystemEventHandler):
         return any(p in Path(path).parts for p in self._ignore_patterns)
 
     def _notify(self, event: FileSystemEvent, event_type: str):
-        """通知回调"""
+        """使AI文件树缓存失效并通知回调"""
+        ai_file_tree_cache.on_file_event(event_type, event.src_path)
         if self._callback is None:
             return
 
@@ -88,11 +90,14 @@ class FileWatcherService(FileSystemEventHandler):
             logger.warning(f"监控路径不存在: {settings.DATA_DIR}")
 
         self._observer.start()
+        # 监控目录存在时才能感知文件树变化，AI文件树缓存才可信
+        ai_file_tree_cache.set_enabled(os.path.exists(settings.DATA_DIR))
         logger.info("文件监控服务已启动")
 
     def stop(self):
         """停止监控"""
         if self._observer:
+            ai_file_tree_cache.set_enabled(False)
             self._observer.stop()
             self._observer.join()
             self._observer = None
@@ -5,8 +5,9 @@
 import logging
 import os
 import re
+import threading
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -115,56 +116,92 @@ class EnvManager:
     """
     环境变量管理器
     封装了对 .env 文件的操作
+    
+    .env 内容在内存中缓存为字典，以文件的 mtime/size 判断是否需要重新读取，
+    通过本管理器写入时同步更新缓存，因此查询只是字典命中，文件 I/O 只在变化时发生。
     """
     
     def __init__(self, env_file_path: Path):
         self.env_file_path = env_file_path
+        # .env 内容缓存及其对应的 (mtime_ns, size) 签名
+        self._env_vars: Dict[str, str] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.RLock()
         # 启动时自动加载 .env 文件到环境变量
         self._load_env_on_startup()
     
     def _load_env_on_startup(self):
         """启动时将 .env 文件中的所有变量加载到 os.environ"""
         if self.env_file_path.exists():
-            load_env_file(self.env_file_path)
+            self._refresh()
             logger.info(f"启动时加载环境变量文件: {self.env_file_path}")
     
+    def _stat_signature(self) -> Optional[Tuple[int, int]]:
+        """获取 .env 文件的 (mtime_ns, size) 签名，文件不存在时返回 None"""
+        try:
+            stat = self.env_file_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _refresh(self) -> Dict[str, str]:
+        """文件发生变化时重新加载 .env，返回最新的缓存字典"""
+        with self._lock:
+            signature = self._stat_signature()
+            if signature is None:
+                self._env_vars = {}
+                self._signature = None
+            elif signature != self._signature:
+                self._env_vars = load_env_file(self.env_file_path)
+                self._signature = signature
+            return self._env_vars
+    
+    def _save(self, env_vars: Dict[str, str]) -> bool:
+        """保存到文件并同步缓存"""
+        with self._lock:
+            success = save_env_file(self.env_file_path, env_vars)
+            if success:
+                self._env_vars = env_vars
+                self._signature = self._stat_signature()
+            return success
+    
     def get_api_key(self, env_key: str) -> Optional[str]:
         """从环境变量获取值"""
         # 首先检查 os.environ
         if env_key in os.environ:
             return os.environ[env_key]
         
-        # 尝试从 .env 文件加载
-        env_vars = load_env_file(self.env_file_path)
-        
-        return env_vars.get(env_key)
+        # 从 .env 缓存中查找（文件变化时才会重新读取）
+        return self._refresh().get(env_key)
     
     def set_api_key(self, env_key: str, api_key: str) -> bool:
         """设置值到环境变量"""
-        # 加载现有的环境变量
-        env_vars = load_env_file(self.env_file_path)
-        
-        # 更新环境变量
-        env_vars[env_key] = api_key
-        
-        # 同时更新当前进程的环境变量
-        os.environ[env_key] = api_key
-        
-        # 保存到文件
-        return save_env_file(self.env_file_path, env_vars)
+        with self._lock:
+            # 基于缓存的现有环境变量
+            env_vars = dict(self._refresh())
+            
+            # 更新环境变量
+            env_vars[env_key] = api_key
+            
+            # 同时更新当前进程的环境变量
+            os.environ[env_key] = api_key
+            
+            # 保存到文件
+            return self._save(env_vars)
     
     def remove_api_key(self, env_key: str) -> bool:
         """从环境变量移除值"""
-        # 加载现有的环境变量
-        env_vars = load_env_file(self.env_file_path)
-        
-        # 如果存在则移除
-        if env_key in env_vars:
-            del env_vars[env_key]
+        with self._lock:
+            # 基于缓存的现有环境变量
+            env_vars = dict(self._refresh())
             
-            # 同时移除当前进程的环境变量
-            if env_key in os.environ:
-                del os.environ[env_key]
-        
-        # 保存到文件
-        return save_env_file(self.env_file_path, env_vars)
+            # 如果存在则移除
+            if env_key in env_vars:
+                del env_vars[env_key]
+                
+                # 同时移除当前进程的环境变量
+                if env_key in os.environ:
+                    del os.environ[env_key]
+            
+            # 保存到文件
+            return self._save(env_vars)
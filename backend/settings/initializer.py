@@ -2,7 +2,6 @@ import os
 import time
 import logging
 from pathlib import Path
-from git import Repo
 
 from backend.settings.settings import settings
 
@@ -22,6 +21,9 @@ def _initialize_git(base_dir: Path):
         
         logger.info(f"正在初始化Git仓库: {base_dir}")
         
+        # 仓库已存在时无需加载 GitPython，只在真正初始化时导入
+        from git import Repo
+        
         # 初始化Git仓库
         repo = Repo.init(base_dir)
         
@@ -28,6 +28,17 @@ def get_data_dir():
         return Path('backend/data')
 
 
+def get_log_dir():
+    """获取日志目录路径（位于数据目录之外，不会进入工作区文件树、文件监控和回档）"""
+    if getattr(sys, 'frozen', False):
+        # 打包后，日志放在 exe 同级目录的 logs/ 文件夹
+        exe_dir = Path(sys.executable).parent
+        return exe_dir / 'logs'
+    else:
+        # 开发环境，logs 在项目根目录
+        return Path(__file__).parent.parent.parent / 'logs'
+
+
 def get_bin_dir():
     """获取可执行文件目录路径"""
     if getattr(sys, 'frozen', False):
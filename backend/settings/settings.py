@@ -1,13 +1,18 @@
+import atexit
+import copy
 import json
 import logging
 import os
 import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, TypedDict, Optional
+from typing import Dict, Any, TypedDict, Optional, Tuple, Iterator
 
 import yaml
 
-from backend.settings.paths import get_model_dir, get_data_dir, get_bin_dir, get_env_file_path
+from backend.settings.paths import get_model_dir, get_data_dir, get_bin_dir, get_env_file_path, get_log_dir
 from backend.settings.env import EnvManager
 from backend.settings.tools import ALL_AVAILABLE_TOOLS
 
@@ -19,12 +24,16 @@ class Settings:
     统一配置系统
     """
     ALL_AVAILABLE_TOOLS: dict = ALL_AVAILABLE_TOOLS
+    # 写入合并窗口（秒）：窗口内的多次写入只落盘一次，设为 0 则每次写入立即落盘
+    CONFIG_FLUSH_DELAY: float = 0.2
     
     def __init__(self):
         # 先初始化路径
         self.DATA_DIR: str = str(get_data_dir())
         self.MODEL_DIR: str = get_model_dir()
         self.ENV_FILE_PATH: Path = get_env_file_path()
+        # 日志目录（在数据目录之外）
+        self.LOG_DIR: str = str(get_log_dir())
         
         # 配置文件目录
         self.CONFIG_DIR = str(Path(self.DATA_DIR) / "config")
@@ -50,6 +59,20 @@ class Settings:
         # 初始化环境变量管理器
         self.env_manager = EnvManager(self.ENV_FILE_PATH)
         
+        # 已解析配置缓存: {config_file: ((mtime_ns, size), config_dict)}
+        self._config_cache: Dict[str, Tuple[Optional[Tuple[int, int]], Dict[str, Any]]] = {}
+        # 可重入锁：保护缓存以及 读取-修改-写入 的完整过程
+        self._config_cache_lock = threading.RLock()
+        # 已修改但尚未落盘的配置文件，及其延迟落盘定时器
+        self._dirty_configs: set[str] = set()
+        self._flush_timers: Dict[str, threading.Timer] = {}
+        # 进程退出前确保未落盘的配置写入磁盘
+        atexit.register(self.flush_config)
+        # YAML 解析次数统计，用于基准测试观察缓存效果
+        self.config_parse_count: int = 0
+        # 配置版本号：每次写入或从磁盘重新解析时加一，供依赖配置的缓存判断是否失效
+        self._config_versions: Dict[str, int] = {}
+        
         # 加载应用配置（必须在路径初始化之后）
         self.LOG_LEVEL: str = self.get_config("log_level", default="INFO")
         self.HOST: str = self.get_config("host", default="127.0.0.1")
@@ -74,22 +97,158 @@ class Settings:
         logger.info(f"使用系统 {cmd_name}")
         return cmd_name
         
+    def _get_config_path(self, config_file: str) -> Path:
+        return Path(self.CONFIG_DIR) / config_file
+
+    def _stat_signature(self, config_path: Path) -> Optional[Tuple[int, int]]:
+        """获取配置文件的 (mtime_ns, size) 签名，文件不存在时返回 None"""
+        try:
+            stat = config_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
     def _load_config(self, config_file: str = "store.yaml") -> Dict[str, Any]:
-        """加载配置，每次都会创建全新的字典对象
+        """加载配置，优先命中进程内缓存
+        
+        缓存以文件的 mtime/size 作为失效依据，外部修改配置文件后会自动重新解析。
+        存在尚未落盘的修改时，缓存即为最新配置，不会从磁盘重新读取。
+        返回的是缓存对象本身，仅供 settings 内部使用，对外必须经过 get_config 的拷贝。
         
         Args:
             config_file: 配置文件名，如 'store.yaml' 或 'skills_config.yaml'
         """
-        try:
-            config_path = Path(self.CONFIG_DIR) / config_file
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f) or {}
-        except Exception as e:
-            logger.error(f"加载配置文件失败 {config_path}: {e}")
-            return {}
+        config_path = self._get_config_path(config_file)
+        
+        with self._config_cache_lock:
+            cached = self._config_cache.get(config_file)
+            if cached is not None and config_file in self._dirty_configs:
+                return cached[1]
+            
+            signature = self._stat_signature(config_path)
+            if cached is not None and signature is not None and cached[0] == signature:
+                return cached[1]
+            
+            try:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = yaml.safe_load(f) or {}
+                self.config_parse_count += 1
+                self._config_versions[config_file] = self._config_versions.get(config_file, 0) + 1
+            except Exception as e:
+                logger.error(f"加载配置文件失败 {config_path}: {e}")
+                return {}
+            
+            if signature is not None:
+                self._config_cache[config_file] = (signature, config)
+            return config
+
+    def _write_config(self, config: Dict[str, Any], config_file: str = "store.yaml") -> None:
+        """更新缓存并安排落盘
+        
+        缓存立即生效；磁盘写入在 CONFIG_FLUSH_DELAY 秒后合并执行，
+        窗口内的连续写入只会产生一次落盘。
+        """
+        with self._config_cache_lock:
+            self._config_cache[config_file] = (None, config)
+            self._dirty_configs.add(config_file)
+            self._config_versions[config_file] = self._config_versions.get(config_file, 0) + 1
+            
+            if self.CONFIG_FLUSH_DELAY <= 0:
+                self._flush_config_file(config_file)
+                return
+            
+            # 已有待执行的落盘任务时不再重新计时，保证最大延迟不超过一个窗口
+            if config_file not in self._flush_timers:
+                timer = threading.Timer(self.CONFIG_FLUSH_DELAY, self._flush_config_file, args=(config_file,))
+                timer.daemon = True
+                self._flush_timers[config_file] = timer
+                timer.start()
+
+    def _flush_config_file(self, config_file: str) -> None:
+        """将缓存中的配置原子地写入磁盘（临时文件 + 重命名）"""
+        with self._config_cache_lock:
+            timer = self._flush_timers.pop(config_file, None)
+            if timer is not None:
+                timer.cancel()
+            if config_file not in self._dirty_configs:
+                return
+            
+            config = self._config_cache[config_file][1]
+            config_path = self._get_config_path(config_file)
+            fd, temp_path = tempfile.mkstemp(prefix=f".{config_file}.", suffix=".tmp", dir=config_path.parent)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    yaml.dump(config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, config_path)
+            except Exception as e:
+                logger.error(f"写入配置文件失败 {config_path}: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return
+            
+            self._dirty_configs.discard(config_file)
+            self._config_cache[config_file] = (self._stat_signature(config_path), config)
+
+    def flush_config(self, config_file: Optional[str] = None) -> None:
+        """立即将尚未落盘的配置写入磁盘
+        
+        Args:
+            config_file: 指定配置文件名，为 None 时写入全部待落盘配置
+        """
+        with self._config_cache_lock:
+            targets = [config_file] if config_file else list(self._dirty_configs)
+            for target in targets:
+                self._flush_config_file(target)
+
+    def invalidate_config_cache(self, config_file: Optional[str] = None) -> None:
+        """使配置缓存失效（会先落盘尚未写入的修改）
+        
+        Args:
+            config_file: 指定配置文件名，为 None 时清空全部缓存
+        """
+        with self._config_cache_lock:
+            self.flush_config(config_file)
+            if config_file is None:
+                self._config_cache.clear()
+            else:
+                self._config_cache.pop(config_file, None)
+
+    @contextmanager
+    def config_transaction(self, config_file: str = "store.yaml") -> Iterator[Dict[str, Any]]:
+        """配置事务：在锁内完成 读取-修改-写入
+        
+        产出完整配置的可修改副本，正常退出时一次性提交，出现异常则丢弃全部修改。
+        事务体内不能 await，避免长时间持有锁。
+        
+        用法：
+            with settings.config_transaction() as config:
+                config["selectedModel"] = model
+                config["selectedProvider"] = provider
+        """
+        with self._config_cache_lock:
+            original = self._load_config(config_file)
+            config = copy.deepcopy(original)
+            yield config
+            # 没有实际修改时不触发写入
+            if config != original:
+                self._write_config(config, config_file)
+
+    def get_config_version(self, config_file: str = "store.yaml") -> int:
+        """获取配置版本号（会先检查配置文件是否被外部修改），版本号不变时配置内容不变
+        
+        Args:
+            config_file: 配置文件名，如 'store.yaml' 或 'skills_config.yaml'
+        """
+        with self._config_cache_lock:
+            self._load_config(config_file)
+            return self._config_versions.get(config_file, 0)
 
     def get_config(self, *keys: str, default: Any = None, config_file: str = "store.yaml") -> Any:
-        """获取指定配置值，支持多层嵌套。返回临时字典的引用，必须使用update_config更新，才能保存到磁盘
+        """获取指定配置值，支持多层嵌套。返回缓存的深拷贝，修改后必须使用update_config更新，才能保存到磁盘
         
         Args:
             *keys: 嵌套的键路径，如 get_config('level1', 'level2', 'level3')
@@ -103,9 +262,10 @@ class Settings:
             # 遍历所有键
             for key in keys:
                 current = current[key]
-            return current
         except (KeyError, TypeError):
             return default
+        # 写时不共享：返回拷贝，避免调用方修改污染缓存
+        return copy.deepcopy(current)
     
     def update_config(self, value: Any, *keys: str, config_file: str = "store.yaml") -> bool:
         """更新配置，支持多层嵌套
@@ -115,23 +275,28 @@ class Settings:
             *keys: 嵌套的键路径，如 update_config(new_value, 'level1', 'level2', 'level3')
             config_file: 配置文件名，如 'store.yaml' 或 'skills_config.yaml'
         """
+        return self.update_configs({keys: value}, config_file=config_file)
+    
+    def update_configs(self, updates: Dict[Tuple[str, ...], Any], config_file: str = "store.yaml") -> bool:
+        """在一次事务中更新多个配置项，只产生一次写入
+        
+        Args:
+            updates: 键路径元组到值的映射，如 {("selectedModel",): "m", ("selectedProvider",): "p"}
+            config_file: 配置文件名，如 'store.yaml' 或 'skills_config.yaml'
+        """
         try:
-            config = self._load_config(config_file)
-            current = config
-            
-            # 遍历到最后一层的前一个
-            for key in keys[:-1]:
-                if key not in current:
-                    current[key] = {}
-                current = current[key]
-                
-            # 设置最后一层的值
-            current[keys[-1]] = value
-            
-            # 保存配置
-            config_path = Path(self.CONFIG_DIR) / config_file
-            with open(config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+            with self.config_transaction(config_file) as config:
+                for keys, value in updates.items():
+                    current = config
+                    
+                    # 遍历到最后一层的前一个
+                    for key in keys[:-1]:
+                        if key not in current:
+                            current[key] = {}
+                        current = current[key]
+                    
+                    # 设置最后一层的值
+                    current[keys[-1]] = copy.deepcopy(value)
             return True
         except (KeyError, TypeError, IndexError) as e:
             logger.error(f"更新配置失败: {e}")
@@ -148,25 +313,24 @@ class Settings:
             bool: 删除成功返回True，失败返回False
         """
         try:
-            config = self._load_config(config_file)
-            current = config
-            
-            # 遍历到最后一层的前一个
-            for key in keys[:-1]:
-                if key not in current:
+            with self._config_cache_lock:
+                current = self._load_config(config_file)
+                
+                # 先在缓存上检查路径是否存在，不存在则无需写入
+                for key in keys[:-1]:
+                    if key not in current:
+                        return False
+                    current = current[key]
+                if keys[-1] not in current:
                     return False
-                current = current[key]
-            
-            # 删除最后一层的键
-            if keys[-1] in current:
-                del current[keys[-1]]
                 
-                # 保存配置
-                config_path = Path(self.CONFIG_DIR) / config_file
-                with open(config_path, 'w', encoding='utf-8') as f:
-                    yaml.dump(config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+                with self.config_transaction(config_file) as config:
+                    current = config
+                    for key in keys[:-1]:
+                        current = current[key]
+                    # 删除最后一层的键
+                    del current[keys[-1]]
                 return True
-            return False
         except (KeyError, TypeError, IndexError) as e:
             logger.error(f"删除配置失败: {e}")
             return False
@@ -1,68 +1,48 @@
-import asyncio
 import logging
 from typing import Optional
 from backend.websocket.manager import ws_manager
 
 logger = logging.getLogger(__name__)
 
-# 用于等待前端响应的 Future 对象
-_pending_future: Optional[asyncio.Future] = None
+# 前端最近一次推送的标签栏状态（已解析），由 tab_state_changed 消息更新
+_latest_state: Optional[dict] = None
+# 状态版本号，每收到一次推送加一
+_version = 0
 
-# 超时时间（秒）
-REQUEST_TIMEOUT = 2.0
 
-
-async def request_tab_state() -> Optional[dict]:
+def get_tab_state() -> Optional[dict]:
     """
-    请求前端标签栏状态
-    
-    发送请求并等待前端响应，带超时机制
+    获取前端最近推送的标签栏状态（同步读取内存，无需等待前端）
     
     Returns:
-        标签栏状态字典，超时或失败返回 None
+        标签栏状态字典，WebSocket 未连接或尚未收到推送时返回 None
         {
+            "version": 3,           # 状态版本号
             "activeTabIds": [...],  # 活跃标签ID列表（去重）
-            "allTabIds": [...]      # 所有标签ID列表（去重）
+            "allTabIds": [...],     # 所有标签ID列表（去重）
+            "tabCount": 5
         }
     """
-    global _pending_future
-    
     if not ws_manager.is_connected():
-        logger.debug("WebSocket 未连接，无法请求标签栏状态")
         return None
-    
-    # 创建新的 Future
-    _pending_future = asyncio.get_event_loop().create_future()
-    
-    try:
-        # 发送请求
-        await ws_manager.send({
-            "type": "request_tab_state",
-            "payload": {}
-        })
-        
-        # 等待响应（带超时）
-        result = await asyncio.wait_for(_pending_future, timeout=REQUEST_TIMEOUT)
-        return result
-        
-    except asyncio.TimeoutError:
-        logger.debug("请求标签栏状态超时")
-        return None
-    except Exception as e:
-        logger.error(f"请求标签栏状态失败: {e}")
+    return _latest_state
+
+
+def get_tab_state_version() -> Optional[int]:
+    """获取标签栏状态版本号，WebSocket 未连接时返回 None（与 get_tab_state 的可见状态一致）"""
+    if not ws_manager.is_connected():
         return None
-    finally:
-        _pending_future = None
+    return _version
 
 
-@ws_manager.handler("tab_state_response")
-async def handle_tab_state_response(payload: dict) -> None:
+@ws_manager.handler("tab_state_changed")
+async def handle_tab_state_changed(payload: dict) -> None:
     """
-    处理前端返回的标签栏状态
+    处理前端推送的标签栏状态（标签变化及连接建立时推送）
     
     消息格式:
     {
-        "type": "tab_state_response",
+        "type": "tab_state_changed",
         "payload": {
             "tabBars": {
                 "bar1": {"tabs": ["file1.md", "file2.md"], "activeTabId": "file1.md"},
@@ -72,45 +52,26 @@ async def handle_tab_state_response(payload: dict) -> None:
         }
     }
     """
-    global _pending_future
+    global _latest_state, _version
     
-    try:
-        tab_bars = payload.get("tabBars", {})
-        
-        if not tab_bars:
-            logger.debug("收到空的标签栏状态响应")
-            if _pending_future and not _pending_future.done():
-                _pending_future.set_result(None)
-            return
-        
-        # 解析标签栏状态
-        all_tabs = set()
-        active_tabs = set()
-        
-        for bar_id, bar in tab_bars.items():
-            tabs = bar.get("tabs", [])
-            bar_active_tab = bar.get("activeTabId")
-            
-            all_tabs.update(tabs)
-            if bar_active_tab:
-                active_tabs.add(bar_active_tab)
-        
-        result = {
-            "activeTabIds": sorted(list(active_tabs)),
-            "allTabIds": sorted(list(all_tabs)),
-            "tabCount": len(all_tabs)
-        }
-        
-        logger.debug(f"收到标签栏状态: {result['tabCount']} 个标签")
-        
-        # 设置结果
-        if _pending_future and not _pending_future.done():
-            _pending_future.set_result(result)
-        
-    except Exception as e:
-        logger.error(f"处理标签栏状态响应失败: {e}")
-        if _pending_future and not _pending_future.done():
-            _pending_future.set_result(None)
+    # 解析标签栏状态
+    all_tabs = set()
+    active_tabs = set()
+    
+    for bar in (payload.get("tabBars") or {}).values():
+        all_tabs.update(bar.get("tabs", []))
+        bar_active_tab = bar.get("activeTabId")
+        if bar_active_tab:
+            active_tabs.add(bar_active_tab)
+    
+    _version += 1
+    _latest_state = {
+        "version": _version,
+        "activeTabIds": sorted(active_tabs),
+        "allTabIds": sorted(all_tabs),
+        "tabCount": len(all_tabs)
+    }
+    logger.debug(f"标签栏状态已更新: 版本 {_version}，{len(all_tabs)} 个标签")
 
 
 def format_tab_state_for_prompt(tab_state: Optional[dict]) -> str:
@@ -148,4 +109,4 @@ def format_tab_state_for_prompt(tab_state: Optional[dict]) -> str:
     return "\n".join(lines)
 
 
-logger.info("标签栏状态处理器已注册（请求-响应模式）")
+logger.info("标签栏状态处理器已注册（推送模式）")
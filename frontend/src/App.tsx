@@ -18,8 +18,11 @@ function App() {
   const store = useStore();
 
   useEffect(() => {
-    // 初始化标签栏状态处理器
-    initTabStateHandler(() => store.getState() as EditorSliceRootState);
+    // 初始化标签栏状态处理器（标签变化时推送给后端）
+    const cleanupTabState = initTabStateHandler(
+      () => store.getState() as EditorSliceRootState,
+      store.subscribe,
+    );
 
     // 初始化文件内容同步处理器
     initFileSyncHandler(() => store.getState() as EditorSliceRootState, dispatch);
@@ -37,6 +40,7 @@ function App() {
 
     return () => {
       cleanupFileWatcher();
+      cleanupTabState();
       wsClient.disconnect();
     };
   }, [dispatch, store]);
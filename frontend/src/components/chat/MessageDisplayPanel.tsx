@@ -535,6 +535,7 @@ const MessageDisplayPanel = () => {
     const usageMetadata = msg.type === 'ai' ? (msg as AIMessage).usage_metadata : null;
     const inputTokens = usageMetadata?.input_tokens || 0;
     const outputTokens = usageMetadata?.output_tokens || 0;
+    const cachedTokens = usageMetadata?.input_token_details?.cache_read || 0;
     
     return (
       <div
@@ -710,7 +711,7 @@ const MessageDisplayPanel = () => {
             {/* 右侧上下文信息 */}
             {usageMetadata && (inputTokens > 0 || outputTokens > 0) && (
               <div className="text-xs text-theme-gray3">
-                ↑ {inputTokens} ↓ {outputTokens}
+                ↑ {inputTokens}{cachedTokens > 0 && ` (缓存 ${cachedTokens})`} ↓ {outputTokens}
               </div>
             )}
           </div>
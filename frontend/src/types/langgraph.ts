@@ -24,6 +24,7 @@ export interface UsageMetadata {
   input_token_details?: {
     cache_read?: number;
     cached_tokens?: number;
+    cache_creation?: number;
   };
   output_token_details?: Record<string, unknown>;
 }
@@ -67,13 +68,21 @@ export interface ToolMessage extends BaseMessage {
 // 消息联合类型
 export type Message = HumanMessage | AIMessage | ToolMessage;
 
-// 中断值
+// 中断中待确认的单个工具调用
+export interface InterruptToolCall {
+  id: string;
+  tool_name: string;
+  parameters?: Record<string, unknown>;
+}
+
+// 中断值（tool_name/parameters 为首个工具调用，tool_calls 为本次需确认的全部调用）
 export interface InterruptValue {
   tool_name: string;
   tool_display_name?: string;
   description?: string;
   question?: string;
   parameters?: Record<string, unknown>;
+  tool_calls?: InterruptToolCall[];
 }
 
 // 中断信息
@@ -15,8 +15,7 @@ export type MessageType =
   | 'error'
   | 'ping'
   | 'pong'
-  | 'request_tab_state'
-  | 'tab_state_response';
+  | 'tab_state_changed';
 
 /** WebSocket 消息结构 */
 export interface WSMessage {
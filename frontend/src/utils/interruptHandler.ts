@@ -1,4 +1,4 @@
-import type { ToolCall, StreamChunk, InterruptResponse } from '../types/langgraph';
+import type { ToolCall, StreamChunk, InterruptResponse, InterruptToolCall } from '../types/langgraph';
 import httpClient from './httpClient';
 import wsClient from './wsClient';
 import { tryCompleteJSON } from './jsonUtils';
@@ -21,13 +21,20 @@ export const handleInterruptResponse = async (
   console.log('处理中断响应:', response);
   
   try {
-    // 处理所有文件工具的差异对比模式，计算用户diff
-    const toolName = interrupt?.value?.tool_name;
-    let userDiff: string | null = null;
+    // 处理所有文件工具的差异对比模式，计算用户diff（一次中断可能包含多个工具调用）
+    const pendingCalls: InterruptToolCall[] = interrupt?.value?.tool_calls ?? [];
+    const userDiffs: Record<string, string> = {};
+    // 同一文件的多个调用共用一份建议内容，只处理一次（diff 归到该文件的第一个调用）
+    const handledPaths = new Set<string>();
     
-    if (toolName && FILE_TOOLS.includes(toolName)) {
-      const path = interrupt.value.parameters?.path as string | undefined;
-      if (path && currentData && aiSuggestContent) {
+    for (const call of pendingCalls) {
+      const toolName = call.tool_name;
+      if (!toolName || !FILE_TOOLS.includes(toolName)) {
+        continue;
+      }
+      const path = call.parameters?.path as string | undefined;
+      if (path && !handledPaths.has(path) && currentData && aiSuggestContent) {
+        handledPaths.add(path);
         const aiContent = aiSuggestContent[path];
         const currentContent = currentData[path];
         
@@ -37,15 +44,15 @@ export const handleInterruptResponse = async (
         if (response.action === 'approve') {
           // 批准：计算用户diff（如果有修改）
           if (aiContent !== undefined && currentContent !== undefined && hasDiff(aiContent, currentContent)) {
-            userDiff = computeDiff(aiContent, currentContent);
-            console.log('用户修改了AI建议内容，diff:', userDiff);
+            userDiffs[call.id] = computeDiff(aiContent, currentContent);
+            console.log('用户修改了AI建议内容，diff:', userDiffs[call.id]);
           }
           
           // 同步 currentData 到 backUp
           dispatch(saveTabContent({ id: path }));
           
           // 处理删除文件操作（manage_file 且 content 为 null）
-          const content = interrupt.value.parameters?.content;
+          const content = call.parameters?.content;
           if (toolName === 'manage_file' && content === null) {
             dispatch(decreaseTab({ tabId: path }));
           }
@@ -66,7 +73,7 @@ export const handleInterruptResponse = async (
       interruptId: interrupt.id,
       choice: response.choice || (response.action === 'approve' ? '1' : '2'),
       additionalData: response.additionalData || '',
-      user_diff: userDiff || undefined  // 如果有用户diff，一并发送
+      user_diffs: userDiffs  // 用户对各工具调用的修改diff，{tool_call_id: diff}
     };
     
     if (response.additionalData && response.additionalData.trim()) {
@@ -88,7 +95,7 @@ export const handleInterruptResponse = async (
         interrupt_id: interruptResponse.interruptId,
         choice: interruptResponse.choice,
         additional_data: interruptResponse.additionalData,
-        user_diff: interruptResponse.user_diff
+        user_diffs: interruptResponse.user_diffs
       }
     } as any);
     
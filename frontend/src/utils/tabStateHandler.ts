@@ -1,56 +1,52 @@
 /**
  * 标签栏状态 WebSocket 处理器
- * 
- * 处理后端请求，返回当前标签栏状态
+ *
+ * 标签栏状态变化时主动推送给后端（tab_state_changed），连接建立时推送一次完整状态，
+ * 后端构建提示词时直接读取最新状态，无需等待前端响应
  * 在应用启动时注册到 wsClient
  */
 
 import wsClient from './wsClient';
-import type { WSMessage } from '../types/websocket';
-import type { EditorSliceRootState } from '../types/store';
-
-// 获取 store 的函数，将在初始化时注入
-let getStoreState: (() => EditorSliceRootState) | null = null;
+import type { EditorSliceRootState, EditorState } from '../types/store';
 
 /**
  * 初始化标签栏状态处理器
  * @param storeGetter 获取 Redux store 状态的函数
+ * @param subscribe 订阅 Redux store 变化的函数
+ * @returns 清理函数
  */
-export function initTabStateHandler(storeGetter: () => EditorSliceRootState): void {
-  getStoreState = storeGetter;
-  
-  // 注册 WebSocket 消息处理器
-  wsClient.onMessage(handleWebSocketMessage);
-  
+export function initTabStateHandler(
+  storeGetter: () => EditorSliceRootState,
+  subscribe: (listener: () => void) => () => void,
+): () => void {
+  let lastTabBars: EditorState['tabBars'] | null = null;
+  let lastActiveTabBarId: string | null = null;
+
+  const pushTabState = (): void => {
+    const { tabBars, activeTabBarId } = storeGetter().tabSlice;
+    lastTabBars = tabBars;
+    lastActiveTabBarId = activeTabBarId;
+    wsClient.send('tab_state_changed', { tabBars, activeTabBarId });
+  };
+
+  // 只在标签栏相关状态变化时推送（编辑文件内容不会触发）
+  const unsubscribeStore = subscribe(() => {
+    const { tabBars, activeTabBarId } = storeGetter().tabSlice;
+    if (tabBars === lastTabBars && activeTabBarId === lastActiveTabBarId) {
+      return;
+    }
+    if (wsClient.isConnected) {
+      pushTabState();
+    }
+  });
+
+  // 连接建立（含重连）时推送完整状态，后端重启后也能立即拿到
+  const unsubscribeConnect = wsClient.onConnect(pushTabState);
+
   console.log('[TabStateHandler] 标签栏状态处理器已初始化');
-}
 
-/**
- * 处理 WebSocket 消息
- */
-function handleWebSocketMessage(message: WSMessage): void {
-  if (message.type !== 'request_tab_state') {
-    return;
-  }
-  
-  if (!getStoreState) {
-    console.warn('[TabStateHandler] Store 未初始化');
-    return;
-  }
-  
-  try {
-    // 获取当前标签栏状态
-    const state = getStoreState();
-    const { tabBars, activeTabBarId } = state.tabSlice;
-    
-    // 发送响应
-    wsClient.send('tab_state_response', {
-      tabBars,
-      activeTabBarId
-    });
-    
-    console.log('[TabStateHandler] 标签栏状态已发送');
-  } catch (error) {
-    console.error('[TabStateHandler] 获取标签栏状态失败:', error);
-  }
+  return () => {
+    unsubscribeStore();
+    unsubscribeConnect();
+  };
 }
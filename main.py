@@ -67,6 +67,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -74,6 +75,23 @@ from fastapi.responses import JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 
 from backend import chat_router, history_router, file_router, config_router, knowledge_router, model_router, mode_router, mcp_router, checkpoint_router, ws_router
+from backend.ai_agent.core.warmup import warmup_manager
+from backend.ai_agent.core.persistence import sqlite_persistence
+from backend.ai_agent.core.auto_summarizer import auto_summarizer
+from backend.ai_agent.core.memory import memory_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：打开共享的SQLite连接，启动后在后台预热重型组件（需在配置中开启 warmup）；
+    关闭时取消未完成的预热和自动总结、写入排队中的长期记忆并关闭连接"""
+    await sqlite_persistence.open()
+    warmup_manager.start()
+    yield
+    await warmup_manager.stop()
+    await auto_summarizer.stop()
+    await memory_service.stop()
+    await sqlite_persistence.close()
 
 # 创建FastAPI应用，禁用默认文档，使用自定义离线文档
 app = FastAPI(
@@ -86,6 +104,7 @@ app = FastAPI(
     version="0.1.0",
     docs_url=None,  # 禁用默认的 Swagger UI，使用自定义路由
     redoc_url=None,  # 禁用默认的 ReDoc
+    lifespan=lifespan,
 )
 
 # 配置CORS中间件
@@ -145,7 +164,8 @@ async def health_check():
         "status": "healthy",
         "message": "AI Novelist Python Backend is running",
         "host": settings.HOST,
-        "port": settings.PORT
+        "port": settings.PORT,
+        "warmup": warmup_manager.status()
     }
 
 # 全局异常处理
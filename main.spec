@@ -20,6 +20,7 @@ data_packages = [
     'langchain_google_genai',
     'watchdog',
     'llama_cpp',  # 需要打包 DLL 库文件
+    'sqlite_vec',  # 长期记忆向量检索的 sqlite 扩展库
 ]
 for package in data_packages:
     try:
@@ -0,0 +1,90 @@
+"""
+配置缓存基准测试
+统计一次聊天轮次中 store.yaml 的 YAML 解析次数与耗时（缓存前 vs 缓存后）
+
+用法（在项目根目录执行）：
+    python scripts/bench_config_cache.py --llm-calls 5 --turns 20
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.settings.settings import settings
+
+# 每次构建图时读取的配置（chat_api + with_graph_builder + import_tools + 两次 create_model）
+GRAPH_BUILD_READS = [
+    ("thread_id",),
+    ("user_id",),
+    ("currentMode",),
+    ("mcpServers",),
+    ("mode", "{mode}", "tools"),
+    ("selectedModel",),
+    ("selectedProvider",),
+    ("mode", "{mode}", "temperature"),
+    ("mode", "{mode}", "max_tokens"),
+    ("provider", "{provider}", "env_key"),
+    ("provider", "{provider}", "url"),
+    ("provider", "{provider}", "env_key"),
+    ("provider", "{provider}", "url"),
+]
+
+# 工具循环中每次调用 LLM 时读取的配置（SystemPromptBuilder 各部分）
+LLM_CALL_READS = [
+    ("mode", "{mode}", "prompt"),
+    ("mode", "{mode}", "skills"),
+    ("knowledgeBase",),
+    ("mode", "{mode}", "additionalInfo"),
+    ("mode", "{mode}", "skillPaths"),
+    ("two-step-rag",),
+]
+
+
+def simulate_turn(llm_calls: int, cached: bool) -> None:
+    """模拟一次聊天轮次的配置读取"""
+    mode = settings.get_config("currentMode", default="管家agent")
+    provider = settings.get_config("selectedProvider", default="deepseek")
+    reads = GRAPH_BUILD_READS + LLM_CALL_READS * llm_calls
+    for keys in reads:
+        if not cached:
+            # 模拟旧行为：每次读取都重新解析文件
+            settings.invalidate_config_cache()
+        settings.get_config(*(k.format(mode=mode, provider=provider) for k in keys))
+
+
+def run(llm_calls: int, turns: int, cached: bool) -> tuple[float, float]:
+    settings.invalidate_config_cache()
+    start_count = settings.config_parse_count
+    start = time.perf_counter()
+    for _ in range(turns):
+        simulate_turn(llm_calls, cached)
+    elapsed = time.perf_counter() - start
+    parses = settings.config_parse_count - start_count
+    return parses / turns, elapsed / turns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="store.yaml 配置缓存基准测试")
+    parser.add_argument("--llm-calls", type=int, default=5, help="每轮的 LLM 调用次数（工具循环迭代数）")
+    parser.add_argument("--turns", type=int, default=20, help="模拟的聊天轮次数")
+    args = parser.parse_args()
+
+    # 使用临时目录中的配置副本，避免影响真实配置
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shutil.copy(Path(settings.CONFIG_DIR) / "store.yaml", Path(tmp_dir) / "store.yaml")
+        settings.CONFIG_DIR = tmp_dir
+
+        before_parses, before_ms = run(args.llm_calls, args.turns, cached=False)
+        after_parses, after_ms = run(args.llm_calls, args.turns, cached=True)
+
+    print(f"每轮 LLM 调用次数: {args.llm_calls}, 模拟轮次: {args.turns}")
+    print(f"缓存前: 每轮 YAML 解析 {before_parses:.1f} 次, 耗时 {before_ms:.2f} ms")
+    print(f"缓存后: 每轮 YAML 解析 {after_parses:.1f} 次, 耗时 {after_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+后端启动导入耗时检查
+基于 python -X importtime 统计导入 main.py 的耗时，超出预算或提前导入了应延迟加载的重型依赖时返回非零退出码
+
+导入 main.py 会初始化数据目录（首次运行时 git init 并提交初始版本），结果会随数据目录状态变化。
+因此检查在临时目录中进行：复制随项目分发的配置与 Skill，先初始化一次，再统计导入耗时，不触碰项目自身的数据目录
+
+用法（在项目根目录执行）：
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --budget-ms 2500 --top 30
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 启动阶段不应导入的重型依赖（应在首次使用时才导入）
+LAZY_MODULES = [
+    "chromadb",
+    "langchain_chroma",
+    "llama_cpp",
+    "langchain_openai",
+    "langchain_ollama",
+    "langchain_google_genai",
+    "dashscope",
+    "git",
+    "langchain_mcp_adapters",
+    "litellm",
+]
+
+# 默认启动预算（毫秒）
+DEFAULT_BUDGET_MS = 3000
+
+# 复制到临时数据目录时跳过的运行时目录（向量库、数据库、上传、临时文件、版本库）
+RUNTIME_DATA_DIRS = {"chromadb", "db", "uploads", "temp", ".git"}
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def run_python(args: list[str], work_dir: Path) -> subprocess.CompletedProcess:
+    """在 work_dir 中运行 Python（数据目录相对于工作目录），项目根目录加入导入路径"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=work_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+
+
+def prepare_data_dir(work_dir: Path) -> None:
+    """在 work_dir 中准备已初始化的数据目录，使导入时不再执行首次初始化"""
+    data_dir = PROJECT_ROOT / "backend" / "data"
+    shutil.copytree(
+        data_dir,
+        work_dir / "backend" / "data",
+        ignore=lambda directory, names: RUNTIME_DATA_DIRS.intersection(names) if Path(directory) == data_dir else set(),
+    )
+    result = run_python(
+        ["-c", "from backend.settings.initializer import initialize_directories_and_files; initialize_directories_and_files()"],
+        work_dir,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        raise SystemExit(f"初始化临时数据目录失败 (退出码: {result.returncode})")
+
+
+def collect_import_times(target: str, work_dir: Path) -> list[tuple[str, int, int, int]]:
+    """运行 -X importtime 并解析输出
+
+    Returns:
+        (模块名, 自身耗时us, 累计耗时us, 嵌套层级) 列表
+    """
+    result = run_python(["-X", "importtime", "-c", f"import {target}"], work_dir)
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        raise SystemExit(f"导入 {target} 失败 (退出码: {result.returncode})")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        # importtime 用缩进表示嵌套层级，每层两个空格（第一层前有一个空格）
+        level = (len(indent) - 1) // 2
+        entries.append((module, int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端启动导入耗时检查")
+    parser.add_argument("--target", default="main", help="要导入的入口模块")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="启动导入耗时预算（毫秒）")
+    parser.add_argument("--top", type=int, default=20, help="报告中显示的最耗时模块数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import-time-") as temp_dir:
+        work_dir = Path(temp_dir)
+        prepare_data_dir(work_dir)
+        entries = collect_import_times(args.target, work_dir)
+    imported = {module for module, _, _, _ in entries}
+    total_ms = sum(cumulative for _, _, cumulative, level in entries if level == 0) / 1000
+
+    # 按顶层包汇总自身耗时
+    package_ms: dict[str, float] = {}
+    for module, self_us, _, _ in entries:
+        package = module.split(".")[0]
+        package_ms[package] = package_ms.get(package, 0) + self_us / 1000
+
+    print(f"导入 {args.target} 总耗时: {total_ms:.1f} ms (预算 {args.budget_ms:.0f} ms)")
+    print(f"\n耗时最多的 {args.top} 个顶层包：")
+    for package, ms in sorted(package_ms.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {ms:9.1f} ms  {package}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"启动导入耗时 {total_ms:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        failures.append(f"以下重型依赖在启动时被导入，应改为首次使用时导入: {', '.join(eager)}")
+
+    if failures:
+        print("\n[FAIL]")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\n[OK] 启动导入耗时在预算内")
+
+
+if __name__ == "__main__":
+    main()